@@ -0,0 +1,89 @@
+import time
+from rich.console import Console
+
+# Initialize Rich Console
+console = Console()
+
+
+class BatchScheduler:
+    """
+    Collects deliveries that arrive close together and hands them to
+    `on_flush` as one batch.
+
+    The collection window adapts to the queue depth: when nothing is waiting
+    in the queue the batch is flushed right away (no added latency under light
+    traffic), and as the backlog grows the window opens up to `max_wait_ms`
+    so a full batch of `max_batch_size` can be gathered.
+    """
+
+    def __init__(self, connection, channel, queue, on_flush, max_batch_size=8, max_wait_ms=50, depth_probe_interval_ms=500):
+        self.connection = connection
+        self.channel = channel
+        self.queue = queue
+        self.on_flush = on_flush
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.depth_probe_interval = depth_probe_interval_ms / 1000.0
+        self.buffer = []
+        self.timer = None
+        self.flushing = False
+        self._depth = 0
+        self._depth_checked_at = 0.0
+
+    def queue_depth(self) -> int:
+        """Messages ready in the queue (cached, refreshed every probe interval)"""
+        now = time.monotonic()
+        if now - self._depth_checked_at >= self.depth_probe_interval:
+            try:
+                declare = self.channel.queue_declare(queue=self.queue, passive=True)
+                self._depth = declare.method.message_count
+            except Exception as e:
+                console.print(f"[bold yellow]BATCH[/bold yellow] | Queue depth probe failed: {e}")
+                self._depth = 0
+            self._depth_checked_at = now
+        return self._depth
+
+    def window(self) -> float:
+        """Seconds to wait for more messages before flushing"""
+        depth = self.queue_depth()
+        if depth == 0:
+            return 0.0
+        return self.max_wait * min(1.0, depth / self.max_batch_size)
+
+    def on_message(self, ch, method, props, body):
+        """pika consumer callback: buffer the delivery and maybe flush"""
+        self.buffer.append((ch, method, props, body))
+
+        if len(self.buffer) >= self.max_batch_size:
+            self.flush()
+        elif len(self.buffer) == 1 and not self.flushing:
+            delay = self.window()
+            if delay <= 0:
+                self.flush()
+            else:
+                self.timer = self.connection.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self.timer = None
+        self.flush()
+
+    def flush(self):
+        if self.flushing or not self.buffer:
+            return
+        if self.timer is not None:
+            self.connection.remove_timeout(self.timer)
+            self.timer = None
+
+        batch, self.buffer = self.buffer, []
+        self.flushing = True
+        try:
+            console.print(f"[bold blue]BATCH[/bold blue] | Processing {len(batch)} message(s)")
+            self.on_flush(batch)
+        finally:
+            self.flushing = False
+
+        # Deliveries that arrived while the batch was running
+        if len(self.buffer) >= self.max_batch_size or (self.buffer and self.window() <= 0):
+            self.flush()
+        elif self.buffer and self.timer is None:
+            self.timer = self.connection.call_later(self.window(), self._on_timer)
@@ -0,0 +1,145 @@
+import os
+import glob
+import argparse
+import time
+import yaml
+import cv2
+import numpy as np
+
+from rich.console import Console
+from rich.table import Table
+
+from func.detectors import BACKENDS, AutoDetector, DetectorRegistry
+
+# Initialize Rich Console
+console = Console()
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def find_images(images_dir, limit=None):
+    """Input images under the directory, without the *_aligned.png outputs"""
+    paths = sorted(
+        path for path in glob.iglob(os.path.join(images_dir, "**", "*"), recursive=True)
+        if path.lower().endswith(IMAGE_EXTENSIONS) and not path.endswith("_aligned.png")
+    )
+    return paths[:limit] if limit else paths
+
+
+def iou(a, b):
+    """Intersection over union of two relative boxes"""
+    x0, y0 = max(a.xmin, b.xmin), max(a.ymin, b.ymin)
+    x1 = min(a.xmin + a.width, b.xmin + b.width)
+    y1 = min(a.ymin + a.height, b.ymin + b.height)
+    inter = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    union = a.width * a.height + b.width * b.height - inter
+    return inter / union if union > 0 else 0.0
+
+
+def largest(boxes):
+    return max(boxes, key=lambda b: b.width * b.height) if boxes else None
+
+
+def main():
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Compare face detector backends on a directory of images")
+    parser.add_argument("--config", default=os.path.join(base_dir, "config", "config.yml"), help="config.yml")
+    parser.add_argument("--images", default=os.path.join(base_dir, "uploads"), help="Directory of input images (searched recursively)")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), help="Backends to compare")
+    parser.add_argument("--reference", default="mediapipe_full", help="Backend the others are compared against")
+    parser.add_argument("--detection-size", type=int, default=None, help="Longer side the frame is reduced to (defaults to detection.detection_size)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N images")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU from which two boxes count as the same face")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+    detection_config = config.get("detection", {})
+    detection_size = args.detection_size or detection_config.get("detection_size", 640)
+    confidence = detection_config.get("min_detection_confidence", 0.5)
+
+    paths = find_images(args.images, args.limit)
+    if not paths:
+        console.print(f"[bold yellow]BENCHMARK[/bold yellow] | No images under {args.images}")
+        return
+
+    registry = DetectorRegistry(config.get("detectors", {}), base_dir)
+    names = [args.reference] + [name for name in args.backends if name != args.reference]
+    detectors = {}
+    for name in names:
+        detector = registry.get(name, confidence)
+        # Unavailable backends fall back to mediapipe_full in the registry: leave them out here
+        if detector.name != name:
+            console.print(f"[bold yellow]BENCHMARK[/bold yellow] | Skipping {name}")
+            continue
+        detectors[name] = detector
+    if args.reference not in detectors:
+        console.print(f"[bold red]BENCHMARK[/bold red] | Reference backend {args.reference} is unavailable")
+        return
+
+    # Build the graphs before timing anything
+    warmup = np.zeros((64, 64, 3), dtype=np.uint8)
+    for detector in detectors.values():
+        detector.detect(warmup)
+
+    timings = {name: [] for name in detectors}
+    found = {name: [] for name in detectors}
+    short_choices = 0
+    started = time.perf_counter()
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        # Image order is kept, so the auto mode sees the corpus as the service would
+        for name, detector in detectors.items():
+            if isinstance(detector, AutoDetector):
+                short_choices += detector.choose(*image.shape[:2]) is detector.short
+            t = time.perf_counter()
+            boxes = detector.detect(image, detection_size)
+            timings[name].append((time.perf_counter() - t) * 1000)
+            detector.observe(boxes, *image.shape[:2])
+            found[name].append(boxes)
+
+    total = len(found[args.reference])
+    reference = found[args.reference]
+    reference_ms = np.mean(timings[args.reference])
+    table = Table(title=f"Detectors over {total:,} images at {detection_size}px (reference: {args.reference})")
+    table.add_column("Backend")
+    table.add_column("Face found %", justify="right")
+    table.add_column("Multiple %", justify="right")
+    table.add_column("Agree %", justify="right")
+    table.add_column("Mean IoU", justify="right")
+    table.add_column("Mean ms", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("p95 ms", justify="right")
+    table.add_column("Speedup", justify="right")
+
+    for name in detectors:
+        boxes = found[name]
+        overlaps = [iou(largest(b), largest(r)) for b, r in zip(boxes, reference) if b and r]
+        # Agreement: same verdict as the reference, and the same face when both found one
+        agree = sum(
+            (not b and not r) or (bool(b) and bool(r) and iou(largest(b), largest(r)) >= args.iou)
+            for b, r in zip(boxes, reference)
+        )
+        ms = np.array(timings[name])
+        table.add_row(
+            name,
+            f"{np.mean([bool(b) for b in boxes]) * 100:.1f}",
+            f"{np.mean([len(b) > 1 for b in boxes]) * 100:.1f}",
+            f"{agree / total * 100:.1f}",
+            f"{np.mean(overlaps):.3f}" if overlaps else "n/a",
+            f"{ms.mean():.1f}",
+            f"{np.percentile(ms, 50):.1f}",
+            f"{np.percentile(ms, 95):.1f}",
+            f"{reference_ms / ms.mean():.2f}x",
+        )
+
+    console.print(table)
+    if "auto" in detectors:
+        console.print(f"[bold blue]BENCHMARK[/bold blue] | auto chose short-range for {short_choices / total * 100:.1f}% of images")
+    console.print(f"[bold green]BENCHMARK[/bold green] | Finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
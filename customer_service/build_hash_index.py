@@ -0,0 +1,102 @@
+import os
+import glob
+import argparse
+import time
+import yaml
+import cv2
+
+from rich.console import Console
+from rich.table import Table
+
+from func.perceptual_hash import perceptual_hash
+from hash_index import HashIndex
+
+# Initialize Rich Console
+console = Console()
+
+ALIGNED_SUFFIX = "_aligned.png"
+
+
+def find_aligned(uploads_dir):
+    """request_id -> path of every aligned face under the uploads directory"""
+    pattern = os.path.join(uploads_dir, "**", f"*{ALIGNED_SUFFIX}")
+    return {
+        os.path.basename(path)[:-len(ALIGNED_SUFFIX)]: path
+        for path in glob.iglob(pattern, recursive=True)
+    }
+
+
+def duplicate_groups(index, max_distance):
+    """Connected groups of near-duplicates, found with one index search per entry"""
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for request_id, phash in index.all_hashes():
+        for other, _ in index.search(phash, max_distance, exclude=request_id):
+            parent[find(other)] = find(request_id)
+
+    groups = {}
+    for request_id in parent:
+        groups.setdefault(find(request_id), []).append(request_id)
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+def main():
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Index perceptual hashes of existing aligned faces")
+    parser.add_argument("--config", default=os.path.join(base_dir, "config", "config.yml"), help="config.yml")
+    parser.add_argument("--uploads", default=os.path.join(base_dir, "uploads"), help="Directory holding the *_aligned.png files")
+    parser.add_argument("--db", default=None, help="Hash index (defaults to dedup.path from the config)")
+    parser.add_argument("--rebuild", action="store_true", help="Re-hash faces that are already indexed")
+    parser.add_argument("--report", action="store_true", help="Print the groups of near-duplicates afterwards")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per insert transaction")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as file:
+        dedup_config = (yaml.safe_load(file) or {}).get("dedup", {})
+    db_path = args.db or os.path.join(base_dir, dedup_config.get("path", "metrics/hashes.db"))
+    max_distance = dedup_config.get("max_distance", 6)
+
+    index = HashIndex(db_path)
+    started = time.perf_counter()
+    aligned = find_aligned(args.uploads)
+    if not args.rebuild:
+        indexed = index.indexed_ids()
+        aligned = {request_id: path for request_id, path in aligned.items() if request_id not in indexed}
+    console.print(f"[bold green]DEDUP[/bold green] | Hashing {len(aligned):,} aligned faces from [cyan]{args.uploads}[/cyan]")
+
+    rows, unreadable = [], 0
+    for request_id, path in aligned.items():
+        image = cv2.imread(path)
+        if image is None:
+            unreadable += 1
+            continue
+        rows.append((request_id, perceptual_hash(image), path))
+        if len(rows) >= args.chunk_size:
+            index.add_many(rows)
+            rows = []
+    index.add_many(rows)
+    elapsed = time.perf_counter() - started
+    console.print(f"[bold green]DEDUP[/bold green] | Indexed {len(aligned) - unreadable:,} faces in {elapsed:.1f}s into [cyan]{db_path}[/cyan]"
+                  + (f", {unreadable} unreadable" if unreadable else ""))
+
+    if args.report:
+        started = time.perf_counter()
+        groups = duplicate_groups(index, max_distance)
+        elapsed = time.perf_counter() - started
+        table = Table(title=f"Near-duplicate groups (distance <= {max_distance}), found in {elapsed:.1f}s")
+        table.add_column("Size", justify="right")
+        table.add_column("request_ids")
+        for group in groups:
+            table.add_row(str(len(group)), ", ".join(group))
+        console.print(table)
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import time
+from collections import deque
+
+import numpy as np
+from rich.console import Console
+
+# Initialize Rich Console
+console = Console()
+
+
+class DegradationController:
+    """
+    Decides when the worker switches to the cheaper `degraded` profile.
+
+    Turns on when the queue depth or the p95 processing latency of the
+    recent window reaches its `enter_*` limit. Turns off only once both are
+    back under the lower `exit_*` limits and the mode has been on for at
+    least `min_dwell_seconds`, so it does not flap around one threshold
+    (the degraded pipeline is faster, which alone would pull p95 back down).
+
+    `mode: on` / `mode: off` force the profile regardless of load. It is off
+    unless configured: the degraded profile skips checks, which callers
+    must opt into.
+    """
+
+    def __init__(self, config):
+        self.active = False
+        self.changed_at = 0.0
+        self.latencies = deque()
+        self.configure(config)
+
+    def configure(self, config):
+        mode = config.get('mode', 'off')
+        # Unquoted on/off in YAML reads as a boolean
+        self.mode = {True: 'on', False: 'off'}.get(mode, mode)
+        self.enter_depth = config.get('enter_queue_depth')
+        self.exit_depth = config.get('exit_queue_depth', 0)
+        self.enter_p95_ms = config.get('enter_p95_ms')
+        self.exit_p95_ms = config.get('exit_p95_ms', 0)
+        self.window = config.get('latency_window_seconds', 60)
+        self.min_dwell = config.get('min_dwell_seconds', 30)
+        self.min_samples = config.get('min_samples', 20)
+
+    def observe(self, duration_ms, now=None):
+        """Record the processing time of one request"""
+        if duration_ms is not None:
+            self.latencies.append((now or time.monotonic(), duration_ms))
+
+    def p95(self, now=None):
+        now = now or time.monotonic()
+        while self.latencies and self.latencies[0][0] < now - self.window:
+            self.latencies.popleft()
+        if len(self.latencies) < self.min_samples:
+            return None
+        return float(np.percentile([ms for _, ms in self.latencies], 95))
+
+    def update(self, depth, now=None):
+        """Re-evaluate the mode for the current queue depth; returns whether it is on"""
+        if self.mode in ('on', 'off'):
+            self.active = self.mode == 'on'
+            return self.active
+
+        now = now or time.monotonic()
+        p95 = self.p95(now)
+        if not self.active:
+            overloaded = (
+                (self.enter_depth is not None and depth >= self.enter_depth) or
+                (self.enter_p95_ms is not None and p95 is not None and p95 >= self.enter_p95_ms)
+            )
+            if overloaded:
+                self._switch(True, now, depth, p95)
+        elif now - self.changed_at >= self.min_dwell:
+            recovered = depth <= self.exit_depth and (p95 is None or p95 <= self.exit_p95_ms)
+            if recovered:
+                self._switch(False, now, depth, p95)
+        return self.active
+
+    def _switch(self, active, now, depth, p95):
+        self.active = active
+        self.changed_at = now
+        # Latencies of the other profile say nothing about this one
+        self.latencies.clear()
+        state = "[bold yellow]entering[/bold yellow]" if active else "[bold green]leaving[/bold green]"
+        p95_text = f"{p95:.0f} ms" if p95 is not None else "n/a"
+        console.print(f"[bold blue]DEGRADED[/bold blue] | {state} degraded mode (depth={depth}, p95={p95_text})")
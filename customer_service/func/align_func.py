@@ -1,12 +1,7 @@
-import PIL
 import cv2
 import numpy as np
-import scipy
-import PIL.Image
 
-import numpy as np
-import PIL.Image
-import scipy.ndimage
+from func.buffer_arena import get_arena
 
 def ffhq_align(img, landmarks, output_size=1024):
     lm = landmarks
@@ -38,8 +33,8 @@ def ffhq_align(img, landmarks, output_size=1024):
     quad = np.stack([c - x - y, c - x + y, c + x + y, c + x - y])
     qsize = np.hypot(*x) * 2
 
-    # แปลงเป็น PIL.Image
-    pil_img = PIL.Image.fromarray(img)
+    arena = get_arena()
+    img_h, img_w = img.shape[:2]
 
     transform_size = 4096
     enable_padding = True
@@ -47,41 +42,60 @@ def ffhq_align(img, landmarks, output_size=1024):
     # Shrink
     shrink = int(np.floor(qsize / output_size * 0.5))
     if shrink > 1:
-        rsize = (int(np.rint(float(pil_img.size[0]) / shrink)), int(np.rint(float(pil_img.size[1]) / shrink)))
-        pil_img = pil_img.resize(rsize, PIL.Image.LANCZOS)
+        rsize = (int(np.rint(float(img_w) / shrink)), int(np.rint(float(img_h) / shrink)))
+        img = cv2.resize(img, rsize, dst=arena.get("align_shrink", (rsize[1], rsize[0], 3)), interpolation=cv2.INTER_AREA)
+        img_h, img_w = img.shape[:2]
         quad /= shrink
         qsize /= shrink
 
     # Crop
     border = max(int(np.rint(qsize * 0.1)), 3)
     crop = (int(np.floor(min(quad[:,0]))), int(np.floor(min(quad[:,1]))), int(np.ceil(max(quad[:,0]))), int(np.ceil(max(quad[:,1]))))
-    crop = (max(crop[0] - border, 0), max(crop[1] - border, 0), min(crop[2] + border, pil_img.size[0]), min(crop[3] + border, pil_img.size[1]))
-    if crop[2] - crop[0] < pil_img.size[0] or crop[3] - crop[1] < pil_img.size[1]:
-        pil_img = pil_img.crop(crop)
+    crop = (max(crop[0] - border, 0), max(crop[1] - border, 0), min(crop[2] + border, img_w), min(crop[3] + border, img_h))
+    if crop[2] - crop[0] < img_w or crop[3] - crop[1] < img_h:
+        img = img[crop[1]:crop[3], crop[0]:crop[2]]
+        img_h, img_w = img.shape[:2]
         quad -= crop[0:2]
 
     # Pad (ปรับส่วนนี้)
     pad = (int(np.floor(min(quad[:,0]))), int(np.floor(min(quad[:,1]))), int(np.ceil(max(quad[:,0]))), int(np.ceil(max(quad[:,1]))))
-    pad = (max(-pad[0] + border, 0), max(-pad[1] + border, 0), max(pad[2] - pil_img.size[0] + border, 0), max(pad[3] - pil_img.size[1] + border, 0))
+    pad = (max(-pad[0] + border, 0), max(-pad[1] + border, 0), max(pad[2] - img_w + border, 0), max(pad[3] - img_h + border, 0))
     if enable_padding and max(pad) > border - 4:
         # แทนที่การเติมแบบสะท้อนด้วยสีดำ
         pad = np.maximum(pad, int(np.rint(qsize * 0.3)))
-        # แปลง PIL เป็น NumPy เพื่อใช้ np.pad
-        img_array = np.array(pil_img)
-        # เติมด้วยสีดำ (constant_values=0)
-        padded_img = np.pad(img_array, ((pad[1], pad[3]), (pad[0], pad[2]), (0, 0)), mode='constant', constant_values=0)
-        # แปลงกลับเป็น PIL
-        pil_img = PIL.Image.fromarray(padded_img)
+        # เติมด้วยสีดำลงใน buffer ที่จองไว้แล้ว (แทน np.pad ที่จองหน่วยความจำใหม่ทุกครั้ง)
+        padded_img = arena.get("align_padded", (img_h + pad[1] + pad[3], img_w + pad[0] + pad[2], 3), zero=True)
+        padded_img[pad[1]:pad[1] + img_h, pad[0]:pad[0] + img_w] = img
+        img = padded_img
         quad += pad[:2]
     # ถ้าไม่เข้าเงื่อนไข padding จะไม่มีการเติม
 
-    # Transform
-    pil_img = pil_img.transform((transform_size, transform_size), PIL.Image.QUAD, (quad + 0.5).flatten(), PIL.Image.BILINEAR)
+    # Transform: quad เป็นสี่เหลี่ยมด้านขนาน จึงใช้ affine แทน PIL QUAD ได้
+    # map จุดกึ่งกลางพิกเซล output (u + 0.5, v + 0.5) -> source = q0 + u * (q3 - q0) / size + v * (q1 - q0) / size
+    axis_u = (quad[3] - quad[0]) / transform_size
+    axis_v = (quad[1] - quad[0]) / transform_size
+    origin = quad[0] + 0.5 * (axis_u + axis_v)
+    warp = np.array([
+        [axis_u[0], axis_v[0], origin[0]],
+        [axis_u[1], axis_v[1], origin[1]],
+    ])
+    transformed = cv2.warpAffine(
+        img, warp, (transform_size, transform_size),
+        dst=arena.get("align_transform", (transform_size, transform_size, 3)),
+        flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+        borderMode=cv2.BORDER_CONSTANT, borderValue=0
+    )
+    # ย่อด้วย INTER_AREA แทน PIL LANCZOS: ที่อัตราย่อ 4-16 เท่า INTER_LANCZOS4 ใช้ kernel คงที่จึงเกิด aliasing
+    # ส่วน INTER_AREA เฉลี่ยทั้งพื้นที่เหมือน LANCZOS ของ PIL (ต่างจากเดิมเฉลี่ย < 1.5 ระดับสี, ดู tests/test_align_func.py)
     if output_size < transform_size:
-        pil_img = pil_img.resize((output_size, output_size), PIL.Image.LANCZOS)
+        transformed = cv2.resize(
+            transformed, (output_size, output_size),
+            dst=arena.get("align_output", (output_size, output_size, 3)),
+            interpolation=cv2.INTER_AREA
+        )
 
-    # คืนค่าเป็น NumPy array
-    return np.array(pil_img)
+    # คืนค่าเป็น NumPy array (buffer ของ arena ใช้ได้จนถึง request ถัดไป)
+    return transformed
 
 # ตัวอย่างการเรียกใช้ (ถ้าต้องการทดสอบ)
 # img = np.random.randint(0, 255, (512, 512, 3), dtype=np.uint8)  # ตัวอย่างภาพ
@@ -2,57 +2,64 @@ import os
 import cv2
 import numpy as np
 from func.align_func import ffhq_align
+from func.buffer_arena import get_arena
 
-def align_face(image_path, output_crop_face_dir, mp_face_mesh):
+def align_face(image_path, output_crop_face_dir, mp_face_mesh, landmarks=None, output_size=1024, png_params=None):
     # ตรวจสอบว่าโฟลเดอร์สำหรับบันทึกมีอยู่หรือไม่ ถ้าไม่ให้สร้างใหม่
     if not os.path.exists(output_crop_face_dir):
         os.makedirs(output_crop_face_dir)
 
     # ตรวจสอบว่า image_path เป็น string และไฟล์มีอยู่จริง
     if not isinstance(image_path, str) or not os.path.exists(image_path):
-        return False, f"Error: Invalid or non-existent image path: {image_path}"
+        return False, f"Error: Invalid or non-existent image path: {image_path}", None
 
     # ตรวจสอบนามสกุลไฟล์
     if not image_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-        return False, f"Error: Skipping non-image file: {image_path}"
+        return False, f"Error: Skipping non-image file: {image_path}", None
 
     # อ่านภาพจาก path
     frame = cv2.imread(image_path)
     if frame is None:
-        return False, f"Error: Could not read image from {image_path}"
+        return False, f"Error: Could not read image from {image_path}", None
 
-    # ตรวจหาใบหน้าภายในภาพ
-    results = mp_face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    if landmarks is not None:
+        # ใช้ landmarks ที่ get_lm หาไว้แล้ว ไม่ต้องรัน face mesh ซ้ำ
+        points = np.array([lm[:2] for lm in landmarks])
+    else:
+        # ตรวจหาใบหน้าภายในภาพ
+        results = mp_face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
 
-    # ตรวจสอบว่าพบใบหน้าหรือไม่
-    if not results.multi_face_landmarks:
-        return False, f"Error: No face detected in {image_path}"
+        # ตรวจสอบว่าพบใบหน้าหรือไม่
+        if not results.multi_face_landmarks:
+            return False, f"Error: No face detected in {image_path}", None
 
-    # ควรมีใบหน้าเดียว ดึง landmarks จากใบหน้าแรก
-    face_landmarks = results.multi_face_landmarks[0]
-    points = []
-    for landmark in face_landmarks.landmark:
-        points.append([int(landmark.x * frame.shape[1]), int(landmark.y * frame.shape[0])])
+        # ควรมีใบหน้าเดียว ดึง landmarks จากใบหน้าแรก
+        face_landmarks = results.multi_face_landmarks[0]
+        points = []
+        for landmark in face_landmarks.landmark:
+            points.append([int(landmark.x * frame.shape[1]), int(landmark.y * frame.shape[0])])
 
-    # แปลง points เป็น array 2D
-    points = np.array(points)
+        # แปลง points เป็น array 2D
+        points = np.array(points)
 
-    # แปลงภาพเป็น RGB เพื่อส่งให้ ffhq_align
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    # แปลงภาพเป็น RGB เพื่อส่งให้ ffhq_align (เขียนลง buffer ของ arena)
+    arena = get_arena()
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=arena.get("rgb", frame.shape))
 
     # เรียก ffhq_align โดยส่ง landmarks เข้าไป
-    aligned_face = ffhq_align(frame_rgb, points)
+    aligned_face = ffhq_align(frame_rgb, points, output_size=output_size)
 
     # ตรวจสอบว่ามีการ align ได้หรือไม่
     if aligned_face is None:
-        return False, f"Error: Alignment failed for {image_path}"
+        return False, f"Error: Alignment failed for {image_path}", None
 
     # สร้างชื่อไฟล์สำหรับบันทึก
     image_filename = f"{os.path.basename(image_path).split('.')[0]}_aligned.png"
     image_save_path = os.path.join(output_crop_face_dir, image_filename)
 
     # แปลง aligned_face กลับเป็น BGR เพื่อบันทึกด้วย cv2
-    aligned_face_bgr = cv2.cvtColor(aligned_face, cv2.COLOR_RGB2BGR)
-    cv2.imwrite(image_save_path, aligned_face_bgr)
+    aligned_face_bgr = cv2.cvtColor(aligned_face, cv2.COLOR_RGB2BGR, dst=arena.get("aligned_bgr", aligned_face.shape))
+    cv2.imwrite(image_save_path, aligned_face_bgr, png_params or [])
 
-    return True, f"Success: Aligned face saved to {image_save_path}"
\ No newline at end of file
+    # คืนภาพที่ align แล้วด้วย (buffer ของ arena ใช้ได้จนกว่าจะเรียกครั้งถัดไปใน thread เดียวกัน)
+    return True, f"Success: Aligned face saved to {image_save_path}", aligned_face_bgr
\ No newline at end of file
@@ -0,0 +1,109 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+# Upper bound for the scratch memory held by all arenas of the process together
+# (resources.buffer_arena_mb in config.yml)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ArenaBudget:
+    """
+    Byte budget shared by every thread's arena. When an allocation takes the
+    process over `max_bytes`, the allocating arena gives up its least
+    recently used buffers first, then the other arenas give up theirs.
+
+    Taking a buffer out of another thread's arena never invalidates it: a
+    thread still holding it keeps the array alive until it is done, and its
+    next `get` allocates a fresh one.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.arenas = weakref.WeakSet()
+
+    def nbytes(self):
+        return sum(arena.nbytes for arena in list(self.arenas))
+
+    def configure(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict(None)
+
+    def _evict(self, owner, keep=None):
+        """Called with the lock held"""
+        total = self.nbytes()
+        arenas = list(self.arenas)
+        if owner is not None:
+            arenas.remove(owner)
+            arenas.insert(0, owner)
+        for arena in arenas:
+            while total > self.max_bytes and arena.buffers:
+                key, buf = next(iter(arena.buffers.items()))
+                if arena is owner and key == keep:
+                    break
+                del arena.buffers[key]
+                arena.nbytes -= buf.nbytes
+                total -= buf.nbytes
+            if total <= self.max_bytes:
+                return
+
+
+class BufferArena:
+    """
+    Hands out preallocated scratch arrays keyed by (name, shape, dtype).
+
+    The func/ modules ask for their intermediates here (RGB/HSV copies, masks,
+    padded images, the alignment transform buffer) and write into them with
+    OpenCV `dst=` outputs, so a long-running worker reuses the same memory
+    instead of allocating full-resolution arrays for every request.
+
+    A buffer is only valid until the next `get` with the same name: callers
+    must not keep references to it across requests.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget if budget is not None else ArenaBudget()
+        self.buffers = OrderedDict()
+        self.nbytes = 0
+        self.budget.arenas.add(self)
+
+    def get(self, name, shape, dtype=np.uint8, zero=False):
+        key = (name, tuple(int(s) for s in shape), np.dtype(dtype).str)
+        with self.budget.lock:
+            buf = self.buffers.get(key)
+            if buf is None:
+                buf = np.empty(key[1], dtype=dtype)
+                self.buffers[key] = buf
+                self.nbytes += buf.nbytes
+                self.budget._evict(self, keep=key)
+            else:
+                self.buffers.move_to_end(key)
+        if zero:
+            buf.fill(0)
+        return buf
+
+    def clear(self):
+        with self.budget.lock:
+            self.buffers.clear()
+            self.nbytes = 0
+
+
+_budget = ArenaBudget()
+_local = threading.local()
+
+
+def configure(max_bytes):
+    """Set the process-wide budget, trimming the arenas if they are over it"""
+    _budget.configure(max_bytes)
+
+
+def get_arena() -> BufferArena:
+    """Arena of the calling thread (each worker thread gets its own)"""
+    arena = getattr(_local, "arena", None)
+    if arena is None:
+        arena = _local.arena = BufferArena(_budget)
+    return arena
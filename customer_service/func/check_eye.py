@@ -40,7 +40,7 @@ def calculate_ear(landmarks: List[Tuple[int, int, float]], eye_indices: List[int
     except Exception as e:
         return 0.0
 
-def check_eye_status(landmarks, success, message,EAR_THRESHOLD) -> Tuple[bool, str]:
+def check_eye_status(landmarks, success, message,EAR_THRESHOLD) -> Tuple[bool, str, dict]:
     """
     Check if both eyes are open or closed using landmarks from get_lm function.
     
@@ -50,9 +50,10 @@ def check_eye_status(landmarks, success, message,EAR_THRESHOLD) -> Tuple[bool, s
         message: Status or error message from get_lm
     
     Returns:
-        Tuple[bool, str]: (success, message)
+        Tuple[bool, str, dict]: (success, message, metrics)
         - success: True if both eyes are open, False otherwise
         - message: Status or error message
+        - metrics: Dict with the raw ear_left / ear_right values
     """
     
     # Eye landmark indices (from MediaPipe Face Mesh)
@@ -64,20 +65,21 @@ def check_eye_status(landmarks, success, message,EAR_THRESHOLD) -> Tuple[bool, s
 
     if not success or landmarks is None:
         console.print(f"[bold red]\t- EYE[/bold red] | Cannot process: {message}")
-        return (False, message)
+        return (False, message, {})
     
     try:
         # Calculate EAR for both eyes
         left_ear = calculate_ear(landmarks, LEFT_EYE_INDICES)
         right_ear = calculate_ear(landmarks, RIGHT_EYE_INDICES)
+        metrics = {"ear_left": float(left_ear), "ear_right": float(right_ear)}
 
         # Check if both eyes are open
         if left_ear > EAR_THRESHOLD and right_ear > EAR_THRESHOLD:
-            return (True, "Both eyes are open")
+            return (True, "Both eyes are open", metrics)
         else:
             console.print(f"[bold red]\t- EYE[/bold red] | Eyes closed (L:{left_ear:.2f}, R:{right_ear:.2f} <= {EAR_THRESHOLD})")
-            return (False, "One or both eyes are closed")
+            return (False, "One or both eyes are closed", metrics)
 
     except Exception as e:
         console.print(f"[bold red]\t- EYE[/bold red] | Error: {str(e)}")
-        return (False, f"Error during eye status detection: {str(e)}")
\ No newline at end of file
+        return (False, f"Error during eye status detection: {str(e)}", {})
\ No newline at end of file
@@ -1,15 +1,14 @@
 import cv2
 import numpy as np
-import mediapipe as mp
 from rich.console import Console
 
+from func.buffer_arena import get_arena
+from func.detectors import MediaPipeDetector, detect_faces
+
 # Initialize Rich Console
 console = Console()
 
 def _patch_from_contour(img, contour):
-    mask = np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)
-    cv2.fillPoly(mask, [contour.astype(np.int32)], 255)
-
     xmin = max(0, int(np.min(contour[:, 0])))
     xmax = min(img.shape[1], int(np.max(contour[:, 0])))
     ymin = max(0, int(np.min(contour[:, 1])))
@@ -18,21 +17,27 @@ def _patch_from_contour(img, contour):
     if xmax <= xmin or ymax <= ymin:
         return None, (0, 0)
 
-    out = img.copy()
-    out[mask == 0] = (255, 255, 255)
+    # ทำงานเฉพาะบริเวณ crop: mask และภาพผลลัพธ์ใช้ buffer ของ arena แทนการ copy ภาพเต็ม
+    arena = get_arena()
+    roi = img[ymin:ymax, xmin:xmax]
+    mask = arena.get("blur_mask", roi.shape[:2], zero=True)
+    cv2.fillPoly(mask, [contour.astype(np.int32)], 255, offset=(-xmin, -ymin))
+
+    cropped_img = arena.get("blur_patch", roi.shape)
+    cropped_img.fill(255)
+    cv2.copyTo(roi, mask, dst=cropped_img)
 
-    cropped_img = out[ymin:ymax, xmin:xmax]
     if cropped_img.size == 0:
         return None, (0, 0)
     if len(cropped_img.shape) == 3:
-        cropped_img = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY)
+        cropped_img = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY, dst=arena.get("blur_gray", roi.shape[:2]))
 
     return cropped_img, (xmin, ymin)
 
 
-def check_face_blur(image, threshold):
+def check_face_blur(image, threshold, detector=None, detection_size=None, fallback=None):
     """
-    ตรวจสอบว่าบริเวณใบหน้าในภาพเบลอหรือไม่ โดยใช้ MediaPipe และ Laplacian variance
+    ตรวจสอบว่าบริเวณใบหน้าในภาพเบลอหรือไม่ โดยใช้ face detector และ Laplacian variance
     
     Parameters
     ----------
@@ -40,61 +45,64 @@ def check_face_blur(image, threshold):
         path ของภาพ หรืออาเรย์ภาพแบบ BGR
     threshold : float
         ค่า threshold ที่ใช้ตัดสินความเบลอ
+    detector : FaceDetector, optional
+        backend ที่ใช้หาใบหน้า (ค่าเริ่มต้น MediaPipe full-range)
+    detection_size : int, optional
+        ย่อภาพให้ด้านยาวไม่เกินค่านี้ก่อนหาใบหน้า (None = ใช้ภาพเต็ม)
+    fallback : FaceDetector, optional
+        backend ที่ลองอีกครั้งเมื่อ detector หาใบหน้าไม่พบ
     
     Returns
     -------
-    variance : float หรือ None
-        ค่าความแปรปรวนของ Laplacian หรือ None ถ้ามีปัญหา
+    success : bool หรือ None
+        ผลการตรวจ หรือ None ถ้ามีปัญหา
     message : str
         ข้อความแจ้งผลลัพธ์
+    metrics : dict
+        ค่าดิบ laplacian_var (ว่างถ้ามีปัญหา)
     """
     
     if threshold <= 0:
         console.print("[bold red]\t- BLUR[/bold red] | Invalid threshold")
-        return None, "Threshold must be positive"
+        return None, "Threshold must be positive", {}
 
     if isinstance(image, str):
         img = cv2.imread(image)
         if img is None:
             console.print("[bold red]\t- BLUR[/bold red] | Cannot read image")
-            return None, "Cannot read image"
+            return None, "Cannot read image", {}
     else:
         img = image
 
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-    # ย้ายการสร้าง face_detection เข้าในฟังก์ชัน
-    with mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5) as face_detection:
-        results = face_detection.process(img_rgb)
-
-        if not results.detections:
-            console.print("[bold red]\t- BLUR[/bold red] | No face detected")
-            return None, "No face detected"
-
-        detection = results.detections[0]
-        bbox = detection.location_data.relative_bounding_box
-        h, w, _ = img.shape
-
-        xmin = int(bbox.xmin * w)
-        ymin = int(bbox.ymin * h)
-        width = int(bbox.width * w)
-        height = int(bbox.height * h)
-
-        contour = np.array([
-            [xmin, ymin],
-            [xmin + width, ymin],
-            [xmin + width, ymin + height],
-            [xmin, ymin + height]
-        ], dtype=np.int32)
-
-        face_img, _ = _patch_from_contour(img, contour)
-        if face_img is None:
-            console.print("[bold red]\t- BLUR[/bold red] | Invalid face region")
-            return None, "Invalid face region"
-
-        variance = cv2.Laplacian(face_img, cv2.CV_64F).var()
-
-        if variance < threshold:
-            console.print(f"[bold red]\t- BLUR[/bold red] | Blurry ({variance:.1f} < {threshold})")
-            return False, "Image is blurry"
-        return True, "Image isn't blurry"
\ No newline at end of file
+    boxes = detect_faces(img, detector or MediaPipeDetector(1), detection_size, fallback)
+    if not boxes:
+        console.print("[bold red]\t- BLUR[/bold red] | No face detected")
+        return None, "No face detected", {}
+
+    bbox = boxes[0]
+    h, w, _ = img.shape
+
+    xmin = int(bbox.xmin * w)
+    ymin = int(bbox.ymin * h)
+    width = int(bbox.width * w)
+    height = int(bbox.height * h)
+
+    contour = np.array([
+        [xmin, ymin],
+        [xmin + width, ymin],
+        [xmin + width, ymin + height],
+        [xmin, ymin + height]
+    ], dtype=np.int32)
+
+    face_img, _ = _patch_from_contour(img, contour)
+    if face_img is None:
+        console.print("[bold red]\t- BLUR[/bold red] | Invalid face region")
+        return None, "Invalid face region", {}
+
+    variance = cv2.Laplacian(face_img, cv2.CV_64F).var()
+    metrics = {"laplacian_var": float(variance)}
+
+    if variance < threshold:
+        console.print(f"[bold red]\t- BLUR[/bold red] | Blurry ({variance:.1f} < {threshold})")
+        return False, "Image is blurry", metrics
+    return True, "Image isn't blurry", metrics
\ No newline at end of file
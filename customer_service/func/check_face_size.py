@@ -12,19 +12,21 @@ def check_face_min_size(bbox, min_size):
         bbox: Tuple of (x, y, w, h) representing the bounding box
         min_size: Minimum size (in pixels) for width and height
     Returns:
-        (success, message)
+        (success, message, metrics)
         - success: Boolean indicating if the face size meets the criteria
         - message: String with status message
+        - metrics: Dict with the raw face_w / face_h values
     """
     
     if bbox is None:
         console.print("[bold red]\t- SIZE[/bold red] | No bounding box")
-        return (False, "No bounding box provided")
+        return (False, "No bounding box provided", {})
 
     x, y, w, h = bbox
+    metrics = {"face_w": w, "face_h": h}
     
     if w > min_size and h > min_size:
-        return (True, "The face size passes the specified criteria.")
+        return (True, "The face size passes the specified criteria.", metrics)
     else:
         console.print(f"[bold red]\t- SIZE[/bold red] | Too small ({w}x{h} <= {min_size})")
-        return (False, "The face size does not meet the specified criteria.")
\ No newline at end of file
+        return (False, "The face size does not meet the specified criteria.", metrics)
\ No newline at end of file
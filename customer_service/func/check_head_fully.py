@@ -1,6 +1,8 @@
 import cv2
 import mediapipe as mp
 
+from func.buffer_arena import get_arena
+
 def is_top_of_head_cut(landmarks, image_height, head_fully_th):
     top_y = landmarks[10].y * image_height
     return top_y < head_fully_th
@@ -16,10 +18,10 @@ def analyze_single_image(image_path, head_fully_th):
 
     image = cv2.imread(image_path)
     if image is None:
-        return False, "Failed to read image"
+        return False, "Failed to read image", {}
 
     h, w, _ = image.shape
-    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=get_arena().get("rgb", image.shape))
 
     with mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1) as face_mesh:
         results = face_mesh.process(rgb)
@@ -28,14 +30,19 @@ def analyze_single_image(image_path, head_fully_th):
         face_landmarks = results.multi_face_landmarks[0].landmark
         top_cut = is_top_of_head_cut(face_landmarks, h, head_fully_th)
         chin_cut = is_chin_cut(face_landmarks, h, head_fully_th)
+        # Distance (px) from the top of the head / chin to the image border
+        metrics = {
+            "head_top_margin": float(face_landmarks[10].y * h),
+            "head_chin_margin": float(h - face_landmarks[152].y * h),
+        }
 
         if top_cut and chin_cut:
-            return False, "Top of head and chin might be cut"
+            return False, "Top of head and chin might be cut", metrics
         elif top_cut:
-            return False, "Top of head might be cut"
+            return False, "Top of head might be cut", metrics
         elif chin_cut:
-            return False, "Chin might be cut"
+            return False, "Chin might be cut", metrics
         else:
-            return True, "Head is fully visible"
+            return True, "Head is fully visible", metrics
     else:
-        return False, "No face detected"
\ No newline at end of file
+        return False, "No face detected", {}
\ No newline at end of file
@@ -4,6 +4,8 @@ import numpy as np
 import os
 from rich.console import Console
 
+from func.buffer_arena import get_arena
+
 # Initialize Rich Console
 console = Console()
 
@@ -15,18 +17,21 @@ def check_head_pose(image_path, left_th, right_th, down_th, up_th, til_left_th,
     # อ่านภาพจาก path
     if not os.path.exists(image_path):
         console.print("[bold red]\t- POSE[/bold red] | Image path does not exist")
-        return "Error: Image path does not exist"
+        return (False, "Error: Image path does not exist", {})
     
     image = cv2.imread(image_path)
     if image is None:
         console.print("[bold red]\t- POSE[/bold red] | Cannot read image")
-        return "Error: Cannot read image"
+        return (False, "Error: Cannot read image", {})
 
     # เตรียมภาพ: แปลงเป็น RGB
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=get_arena().get("rgb", image.shape))
     image.flags.writeable = False
-    results = face_mesh.process(image)
-    image.flags.writeable = True
+    try:
+        results = face_mesh.process(image)
+    finally:
+        # บัฟเฟอร์ "rgb" ของ arena ถูกใช้ซ้ำโดย check อื่น ต้องคืนสถานะเขียนได้เสมอ
+        image.flags.writeable = True
 
     # เก็บขนาดภาพ
     img_h, img_w, img_c = image.shape
@@ -64,7 +69,8 @@ def check_head_pose(image_path, left_th, right_th, down_th, up_th, til_left_th,
             success, rot_vec, tran_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
             if not success:
                 console.print("[bold red]\t- POSE[/bold red] | solvePnP failed")
-                return "Error: solvePnP failed"
+                face_mesh.close()
+                return (False, "Error: solvePnP failed", {})
 
             # แปลงเวกเตอร์การหมุนเป็นเมทริกซ์
             rmat, _ = cv2.Rodrigues(rot_vec)
@@ -74,6 +80,7 @@ def check_head_pose(image_path, left_th, right_th, down_th, up_th, til_left_th,
             pitch = angles[0] * 360
             yaw = angles[1] * 360
             roll = angles[2] * 360
+            metrics = {"yaw": float(yaw), "pitch": float(pitch), "roll": float(roll)}
 
             # ตรวจสอบทิศทางศีรษะ
             if yaw < left_th:
@@ -105,10 +112,10 @@ def check_head_pose(image_path, left_th, right_th, down_th, up_th, til_left_th,
                 direction = "Forward"
 
             # สร้างข้อความผลลัพธ์
-            result = (success,direction)
+            result = (success,direction,metrics)
             face_mesh.close()
             return result
 
     face_mesh.close()
     console.print("[bold red]\t- POSE[/bold red] | No face detected")
-    return "Error: No face detected"
\ No newline at end of file
+    return (False, "Error: No face detected", {})
\ No newline at end of file
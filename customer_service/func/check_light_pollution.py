@@ -1,33 +1,34 @@
 import cv2
 import numpy as np
-import mediapipe as mp
+
+from func.buffer_arena import get_arena
+from func.detectors import MediaPipeDetector, detect_faces
 
 def check_lightpol(
     image_path: str, 
     dark_threshold, 
     bright_threshold, 
     diff_threshold,
-    margin  # ตัดขอบหน้า 10%
-) -> tuple[bool, str]:
+    margin,  # ตัดขอบหน้า 10%
+    detector=None,  # face detector backend (ค่าเริ่มต้น MediaPipe full-range)
+    detection_size=None,  # ย่อภาพก่อนหาใบหน้า (None = ใช้ภาพเต็ม)
+    fallback=None  # backend ที่ลองอีกครั้งเมื่อหาใบหน้าไม่พบ
+) -> tuple[bool, str, dict]:
     print(f"[FUNC] check_lightpol: image={image_path}, dark_th={dark_threshold}, bright_th={bright_threshold}, diff_th={diff_threshold}, margin={margin}")
     
     image = cv2.imread(image_path)
     if image is None:
-        return False, "invalid_image"
-
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-
-    mp_face_detection = mp.solutions.face_detection
+        return False, "invalid_image", {}
 
-    with mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5) as detector:
-        result = detector.process(rgb_image)
+    h, w, _ = image.shape
+    arena = get_arena()
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=arena.get("hsv", image.shape))
 
-    if not result.detections:
-        return False, "no_face"
+    boxes = detect_faces(image, detector or MediaPipeDetector(1), detection_size, fallback)
+    if not boxes:
+        return False, "no_face", {}
 
-    h, w, _ = image.shape
-    bbox = result.detections[0].location_data.relative_bounding_box
+    bbox = boxes[0]
 
     # แปลงเป็นพิกัด pixel
     x_min = int(bbox.xmin * w)
@@ -43,22 +44,31 @@ def check_lightpol(
 
     # ตรวจสอบขนาดว่ามีข้อมูลหรือไม่
     if x_end <= x_start or y_end <= y_start:
-        return False, "invalid_face_crop"
+        return False, "invalid_face_crop", {}
 
     face_region_v = hsv_image[y_start:y_end, x_start:x_end, 2]
     if face_region_v.size == 0:
-        return False, "empty_face_region"
+        return False, "empty_face_region", {}
 
     # Mask สำหรับ background
-    mask = np.ones((h, w), dtype=np.uint8) * 255
+    mask = arena.get("lightpol_mask", (h, w))
+    mask.fill(255)
     mask[y_min:y_min + box_height, x_min:x_min + box_width] = 0
 
-    background_v = cv2.bitwise_and(hsv_image[:, :, 2], hsv_image[:, :, 2], mask=mask)
-    background_values = background_v[background_v > 0]
+    value = cv2.extractChannel(hsv_image, 2, dst=arena.get("lightpol_value", (h, w)))
+    background_v = arena.get("lightpol_background", (h, w), zero=True)
+    cv2.bitwise_and(value, value, dst=background_v, mask=mask)
+    # ค่าเฉลี่ยของพิกเซล background ที่มากกว่า 0 (ไม่ต้องสร้าง array ใหม่)
+    background_count = cv2.countNonZero(background_v)
 
     face_brightness = float(np.mean(face_region_v))
-    background_brightness = float(np.mean(background_values)) if background_values.size > 0 else None
+    background_brightness = float(cv2.sumElems(background_v)[0] / background_count) if background_count > 0 else None
     brightness_diff = abs(face_brightness - background_brightness) if background_brightness is not None else None
+    metrics = {
+        "face_brightness": face_brightness,
+        "background_brightness": background_brightness,
+        "brightness_diff": brightness_diff,
+    }
 
     # สถานะตามเกณฑ์
     if face_brightness < dark_threshold:
@@ -70,4 +80,4 @@ def check_lightpol(
     else:
         status = "normal"
 
-    return (status == "normal"), status
+    return (status == "normal"), status, metrics
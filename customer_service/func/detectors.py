@@ -0,0 +1,285 @@
+import os
+import threading
+from collections import namedtuple
+
+import cv2
+import mediapipe as mp
+from rich.console import Console
+
+from func.buffer_arena import get_arena
+
+# Initialize Rich Console
+console = Console()
+
+# Face box relative to the image size, same fields as MediaPipe's relative_bounding_box
+Box = namedtuple("Box", ["xmin", "ymin", "width", "height", "score"])
+
+
+def downscale(image, detection_size):
+    """BGR image resized so its longer side is at most `detection_size` (None: unchanged)"""
+    height, width = image.shape[:2]
+    if not detection_size or max(height, width) <= detection_size:
+        return image
+    scale = detection_size / max(height, width)
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, dst=get_arena().get("detect_small", (size[1], size[0], 3)), interpolation=cv2.INTER_AREA)
+
+
+def face_scale(box, height, width):
+    """Longer side of the face box as a fraction of the longer side of the image"""
+    return max(box.width * width, box.height * height) / max(height, width)
+
+
+class FaceDetector:
+    """
+    A face detection backend. `detect` takes a BGR image and returns the
+    faces found as relative Boxes, so they apply to the full image whatever
+    resolution the backend looked at.
+    """
+    name = None
+    # Whether a miss is final, i.e. the full-range model already had its look
+    covers_full_range = False
+
+    def detect(self, image, detection_size=None) -> list:
+        return self._detect(downscale(image, detection_size))
+
+    def observe(self, boxes, height, width):
+        """Feedback on the faces found in one image (used by the auto mode)"""
+
+    def _detect(self, image) -> list:
+        raise NotImplementedError
+
+
+class MediaPipeDetector(FaceDetector):
+    """
+    MediaPipe FaceDetection. Model 0 (short-range) is the faster one and
+    covers faces within about 2 m of the camera, i.e. selfies and close-up
+    uploads; model 1 (full-range) also finds faces up to about 5 m away.
+
+    The graph is built once per thread and reused, instead of once per call.
+    """
+
+    def __init__(self, model_selection, min_detection_confidence=0.5):
+        self.name = "mediapipe_short" if model_selection == 0 else "mediapipe_full"
+        self.covers_full_range = model_selection == 1
+        self.model_selection = model_selection
+        self.min_detection_confidence = min_detection_confidence
+        self.local = threading.local()
+
+    def _graph(self):
+        graph = getattr(self.local, "graph", None)
+        if graph is None:
+            graph = mp.solutions.face_detection.FaceDetection(
+                model_selection=self.model_selection,
+                min_detection_confidence=self.min_detection_confidence
+            )
+            self.local.graph = graph
+        return graph
+
+    def _detect(self, image):
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=get_arena().get("detect_rgb", image.shape))
+        results = self._graph().process(rgb)
+        boxes = []
+        for detection in results.detections or ():
+            box = detection.location_data.relative_bounding_box
+            boxes.append(Box(box.xmin, box.ymin, box.width, box.height, detection.score[0]))
+        return boxes
+
+
+class CascadeDetector(FaceDetector):
+    """
+    OpenCV Haar cascade: the cheapest backend, a fast gate for frontal faces.
+    Its boxes are tighter than MediaPipe's and it has no confidence score.
+    """
+    name = "opencv_cascade"
+
+    def __init__(self, path=None, scale_factor=1.1, min_neighbors=5, min_face_scale=0.1):
+        if not path:
+            # Bundled with the opencv-python wheels
+            haarcascades = getattr(getattr(cv2, "data", None), "haarcascades", "")
+            path = os.path.join(haarcascades, "haarcascade_frontalface_default.xml")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Haar cascade not found: {path} (set detectors.cascade_path)")
+        self.path = path
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_face_scale = min_face_scale
+        self.local = threading.local()
+
+    def _detect(self, image):
+        classifier = getattr(self.local, "classifier", None)
+        if classifier is None:
+            classifier = self.local.classifier = cv2.CascadeClassifier(self.path)
+        height, width = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=get_arena().get("detect_gray", (height, width)))
+        min_side = max(1, int(min(height, width) * self.min_face_scale))
+        faces = classifier.detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=(min_side, min_side))
+        return [Box(x / width, y / height, w / width, h / height, 1.0) for x, y, w, h in faces]
+
+
+class YuNetDetector(FaceDetector):
+    """
+    OpenCV DNN face detector (YuNet, cv2.FaceDetectorYN). Close to MediaPipe
+    full-range in recall and cheaper on large frames. The ONNX model is not
+    shipped with OpenCV: point detectors.yunet_model at it.
+    """
+    name = "opencv_yunet"
+
+    def __init__(self, model_path, score_threshold=0.6, nms_threshold=0.3):
+        if not model_path or not os.path.isfile(model_path):
+            raise FileNotFoundError(f"YuNet model not found: {model_path or '(unset)'} (set detectors.yunet_model)")
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.local = threading.local()
+
+    def _detect(self, image):
+        height, width = image.shape[:2]
+        net = getattr(self.local, "net", None)
+        if net is None:
+            net = self.local.net = cv2.FaceDetectorYN.create(
+                self.model_path, "", (width, height), self.score_threshold, self.nms_threshold)
+        net.setInputSize((width, height))
+        _, faces = net.detect(image)
+        if faces is None:
+            return []
+        return [Box(f[0] / width, f[1] / height, f[2] / width, f[3] / height, float(f[-1])) for f in faces]
+
+
+class AutoDetector(FaceDetector):
+    """
+    Picks the short- or full-range model per image. Short-range is used when
+    the faces of the recent images were large (a moving average of their
+    `face_scale` at least `min_face_scale`), or, before any face was seen,
+    when the image is no larger than `small_image_size`. A short-range miss
+    gets a second look with the full-range model, whose detection then pulls
+    the average down, so a stream of distant faces moves to full-range.
+
+    `detect` does not update the average: the caller reports each image once
+    through `observe` (get_lm does), so repeated lookups on the same image
+    cannot skew it.
+    """
+    name = "auto"
+    covers_full_range = True
+
+    def __init__(self, short, full, small_image_size=1280, min_face_scale=0.2, smoothing=0.1):
+        self.short = short
+        self.full = full
+        self.small_image_size = small_image_size
+        self.min_face_scale = min_face_scale
+        self.smoothing = smoothing
+        self.recent_scale = None
+        self.lock = threading.Lock()
+
+    def choose(self, height, width):
+        with self.lock:
+            recent_scale = self.recent_scale
+        if recent_scale is None:
+            return self.short if max(height, width) <= self.small_image_size else self.full
+        return self.short if recent_scale >= self.min_face_scale else self.full
+
+    def observe(self, boxes, height, width):
+        if not boxes:
+            return
+        scale = max(face_scale(box, height, width) for box in boxes)
+        with self.lock:
+            if self.recent_scale is None:
+                self.recent_scale = scale
+            else:
+                self.recent_scale += self.smoothing * (scale - self.recent_scale)
+
+    def detect(self, image, detection_size=None):
+        detector = self.choose(*image.shape[:2])
+        small = downscale(image, detection_size)
+        boxes = detector._detect(small)
+        if not boxes and detector is self.short:
+            boxes = self.full._detect(small)
+        return boxes
+
+
+BACKENDS = ("auto", "mediapipe_short", "mediapipe_full", "opencv_cascade", "opencv_yunet")
+
+
+class DetectorRegistry:
+    """
+    Builds the backends named in config.yml (`detection.detector`, and the
+    `detector` of the degraded profile) from the `detectors` section and
+    keeps them for the life of the worker, so MediaPipe graphs and the auto
+    mode's face-scale history survive the per-batch config reload.
+
+    A backend that cannot be built (unknown name, missing model file) is
+    reported once and replaced by mediapipe_full, the previous behaviour.
+    """
+
+    def __init__(self, config, base_dir):
+        self.base_dir = base_dir
+        self.detectors = {}
+        self.failed = set()
+        self.lock = threading.RLock()
+        self.config = None
+        self.configure(config)
+
+    def configure(self, config):
+        with self.lock:
+            if config != self.config:
+                self.config = config
+                self.detectors.clear()
+                self.failed.clear()
+
+    def _path(self, path):
+        return os.path.join(self.base_dir, path) if path and not os.path.isabs(path) else path
+
+    def _build(self, name, min_detection_confidence):
+        config = self.config
+        if name == "mediapipe_short":
+            return MediaPipeDetector(0, min_detection_confidence)
+        if name == "mediapipe_full":
+            return MediaPipeDetector(1, min_detection_confidence)
+        if name == "auto":
+            auto_config = config.get('auto', {})
+            return AutoDetector(
+                self.get("mediapipe_short", min_detection_confidence),
+                self.get("mediapipe_full", min_detection_confidence),
+                small_image_size=auto_config.get('small_image_size', 1280),
+                min_face_scale=auto_config.get('min_face_scale', 0.2),
+                smoothing=auto_config.get('smoothing', 0.1),
+            )
+        if name == "opencv_cascade":
+            return CascadeDetector(
+                self._path(config.get('cascade_path')),
+                scale_factor=config.get('cascade_scale_factor', 1.1),
+                min_neighbors=config.get('cascade_min_neighbors', 5),
+                min_face_scale=config.get('cascade_min_face_scale', 0.1),
+            )
+        if name == "opencv_yunet":
+            return YuNetDetector(self._path(config.get('yunet_model')), score_threshold=min_detection_confidence)
+        raise ValueError(f"Unknown detector backend '{name}' (expected one of {', '.join(BACKENDS)})")
+
+    def get(self, name, min_detection_confidence=0.5) -> FaceDetector:
+        key = (name, min_detection_confidence)
+        with self.lock:
+            detector = self.detectors.get(key)
+            if detector is not None:
+                return detector
+            try:
+                detector = self._build(name, min_detection_confidence)
+            except (ValueError, OSError) as e:
+                if name not in self.failed:
+                    self.failed.add(name)
+                    console.print(f"[bold red]DETECTOR[/bold red] | {e}; using mediapipe_full")
+                detector = self.get("mediapipe_full", min_detection_confidence)
+            self.detectors[key] = detector
+            return detector
+
+
+def detect_faces(image, detector, detection_size=None, fallback=None):
+    """
+    Faces in a BGR image with the given backend. When it finds nothing,
+    `fallback` (normally the full-range model) gets a look at the same frame
+    before the image is rejected, unless the backend already covers it.
+    """
+    boxes = detector.detect(image, detection_size)
+    if not boxes and fallback is not None and not detector.covers_full_range:
+        boxes = fallback.detect(image, detection_size)
+    return boxes
@@ -3,18 +3,39 @@ import cv2
 import numpy as np
 from rich.console import Console
 
+from func.buffer_arena import get_arena
+from func.detectors import MediaPipeDetector, detect_faces
+
 # Initialize Rich Console
 console = Console()
 
-def get_lm(img_path):
+def _padded_crop(box, width, height, crop_padding):
+    """Pixel crop (x0, y0, x1, y1) around a relative bounding box, padded on every side"""
+    pad_x = box.width * crop_padding
+    pad_y = box.height * crop_padding
+    x0 = max(0, int((box.xmin - pad_x) * width))
+    y0 = max(0, int((box.ymin - pad_y) * height))
+    x1 = min(width, int(np.ceil((box.xmin + box.width + pad_x) * width)))
+    y1 = min(height, int(np.ceil((box.ymin + box.height + pad_y) * height)))
+    return x0, y0, x1, y1
+
+def get_lm(img_path, max_faces=1, detection_size=640, crop_padding=0.5, min_detection_confidence=0.5, detector=None, fallback=None):
     """
-    Detects face landmarks using MediaPipe Face Mesh, extracts landmarks and bounding box.
-    Returns: (success, message, landmarks, bbox, num_landmarks)
+    Detects face landmarks, extracts landmarks and bounding box.
+
+    Runs as a cascade: a face detector (`detector`, MediaPipe short-range by
+    default) on a downscaled frame first rejects images with no face or more
+    than `max_faces` faces, then FaceMesh runs only on a padded crop around
+    the largest face and the landmarks are mapped back to full-image
+    coordinates. When the detector finds nothing, `fallback` (typically the
+    full-range model) gets a second look at the same small frame.
+
+    Returns: (success, message, landmarks, bbox, norm_box)
     - success: Boolean indicating if detection was successful
     - message: String with status or error message
     - landmarks: List of landmark coordinates [(x, y, z), ...] or None
     - bbox: Tuple of (x, y, w, h) or None
-    - num_landmarks: Integer indicating the number of landmarks detected
+    - norm_box: Tuple of (x, y, w, h) relative to the image size or None
     """
     # Initialize MediaPipe Face Mesh
     mp_face_mesh = mp.solutions.face_mesh
@@ -24,26 +45,44 @@ def get_lm(img_path):
         image = cv2.imread(img_path)
         if image is None:
             console.print("[bold red]\t- LANDMARKS[/bold red] | Failed to load image")
-            return (False, "Failed to load image", None, None, 0)
+            return (False, "Failed to load image", None, None, None)
 
-        # Convert to RGB as MediaPipe expects RGB images
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         height, width, _ = image.shape
 
-        # Initialize face mesh model
+        # Stage 1: count faces on a small frame
+        detector = detector or MediaPipeDetector(0, min_detection_confidence)
+        detections = detect_faces(image, detector, detection_size, fallback)
+        detector.observe(detections, height, width)
+        if not detections:
+            console.print("[bold red]\t- LANDMARKS[/bold red] | No faces detected")
+            return (False, "No faces detected", None, None, None)
+        if len(detections) > max_faces:
+            console.print(f"[bold red]\t- LANDMARKS[/bold red] | Too many faces ({len(detections)} > {max_faces})")
+            return (False, "Multiple faces detected", None, None, None)
+
+        # Select the largest face and crop around it
+        box = max(detections, key=lambda b: b.width * b.height)
+        x0, y0, x1, y1 = _padded_crop(box, width, height, crop_padding)
+        crop = image[y0:y1, x0:x1]
+        crop_h, crop_w, _ = crop.shape
+
+        # Convert to RGB as MediaPipe expects RGB images
+        crop_rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB, dst=get_arena().get("mesh_crop_rgb", crop.shape))
+
+        # Stage 2: face mesh on the crop only
         with mp_face_mesh.FaceMesh(
             static_image_mode=True,
-            max_num_faces=10,
-            min_detection_confidence=0.5,
+            max_num_faces=1,
+            min_detection_confidence=min_detection_confidence,
             refine_landmarks=True
         ) as face_mesh:
             # Process the image
-            results = face_mesh.process(image_rgb)
+            results = face_mesh.process(crop_rgb)
 
             # Check if faces are detected
             if not results.multi_face_landmarks:
                 console.print("[bold red]\t- LANDMARKS[/bold red] | No faces detected")
-                return (False, "No faces detected", None, None)
+                return (False, "No faces detected", None, None, None)
 
             # Get the first detected face
             face_landmarks = results.multi_face_landmarks[0]
@@ -52,10 +91,10 @@ def get_lm(img_path):
             landmarks = []
             console.print(f"[bold blue][LANDMARKS] 📍 Extracting {len(face_landmarks.landmark)} landmarks...[/bold blue]")
             for landmark in face_landmarks.landmark:
-                # Convert relative coordinates to pixel coordinates
-                landmark_x = int(landmark.x * width)
-                landmark_y = int(landmark.y * height)
-                landmark_z = landmark.z  # Keep z in relative units (depth)
+                # Convert crop-relative coordinates to full-image pixel coordinates
+                landmark_x = int(x0 + landmark.x * crop_w)
+                landmark_y = int(y0 + landmark.y * crop_h)
+                landmark_z = landmark.z * crop_w / width  # Keep z in relative units of the full image width
                 landmarks.append((landmark_x, landmark_y, landmark_z))
 
             # Calculate bounding box from landmarks with margin
@@ -65,7 +104,7 @@ def get_lm(img_path):
             y_min, y_max = min(y_coords), max(y_coords)
             w = x_max - x_min
             h = y_max - y_min
-            
+
             console.print(f"[bold cyan][LANDMARKS] 📦 Initial bounding box:[/bold cyan] [yellow]({x_min}, {y_min}, {w}, {h})[/yellow]")
 
             # Add margin (10% of width/height) to ensure bbox covers the entire face
@@ -77,9 +116,9 @@ def get_lm(img_path):
             y_max = min(height, y_max + margin_y)
             w = x_max - x_min
             h = y_max - y_min
-            bbox = (x_min, y_min, w, h) 
+            bbox = (x_min, y_min, w, h)
             norm_box = (x_min/width, y_min/height, w/width, h/height)
-            
+
             console.print(f"[bold green][LANDMARKS] 📦 Final bounding box (with margin):[/bold green] [yellow]({x_min}, {y_min}, {w}, {h})[/yellow]")
             console.print(f"[bold green][LANDMARKS] 📏 Normalized box:[/bold green] [cyan]{norm_box}[/cyan]")
 
@@ -87,4 +126,4 @@ def get_lm(img_path):
 
     except Exception as e:
         console.print(f"[bold red]\t- LANDMARKS[/bold red] | Error: {str(e)}")
-        return (False, f"Error during face detection: {str(e)}", None,None)
\ No newline at end of file
+        return (False, f"Error during face detection: {str(e)}", None, None, None)
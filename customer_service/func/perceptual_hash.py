@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+
+HASH_BITS = 64
+
+
+def perceptual_hash(image, hash_size=8, highfreq_factor=4):
+    """
+    64-bit DCT perceptual hash (pHash) of an aligned face.
+
+    The crop is reduced to 32x32 grey, and the 8x8 lowest DCT frequencies are
+    compared to their median. Re-encoding, resizing and mild colour or contrast
+    changes flip only a few bits, so near-duplicates sit at a small Hamming
+    distance.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    size = hash_size * highfreq_factor
+    small = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size]
+    bits = (low > np.median(low)).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import time
+from itertools import combinations
+from rich.console import Console
+
+from func.perceptual_hash import hamming_distance
+
+# Initialize Rich Console
+console = Console()
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def _signed(value):
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def _chunks(phash):
+    return [(phash >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+def _neighbours(chunk, radius):
+    """Every 16-bit value within `radius` bit flips of `chunk`"""
+    values = [chunk]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flips):
+            value = chunk
+            for bit in bits:
+                value ^= 1 << bit
+            values.append(value)
+    return values
+
+
+class HashIndex:
+    """
+    Persistent multi-index hashing over 64-bit perceptual hashes.
+
+    Each hash is split into 4 chunks of 16 bits, and each chunk column is
+    indexed. Two hashes within Hamming distance r must agree to within
+    r // 4 bits on at least one chunk (pigeonhole). A search therefore looks up
+    only the chunk values near the query's chunks through the indexes, then
+    checks the full distance on that small candidate set, instead of
+    comparing against every stored hash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_table()
+
+    def _create_table(self):
+        chunk_columns = ", ".join(f"c{i} INTEGER NOT NULL" for i in range(CHUNKS))
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS face_hashes (
+                request_id TEXT PRIMARY KEY,
+                phash INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                file_path TEXT,
+                {chunk_columns}
+            )
+        """)
+        for i in range(CHUNKS):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_face_hashes_c{i} ON face_hashes (c{i})")
+        self.conn.commit()
+
+    def add_many(self, rows):
+        """Insert or replace (request_id, phash, file_path) rows"""
+        now = time.time()
+        values = [
+            [request_id, _signed(phash), now, file_path] + _chunks(phash)
+            for request_id, phash, file_path in rows
+        ]
+        try:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO face_hashes (request_id, phash, created_at, file_path, "
+                f"{', '.join(f'c{i}' for i in range(CHUNKS))}) VALUES ({', '.join('?' * (4 + CHUNKS))})",
+                values
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            console.print(f"[bold red]DEDUP[/bold red] | Failed to index hashes: {e}")
+
+    def add(self, request_id, phash, file_path=None):
+        self.add_many([(request_id, phash, file_path)])
+
+    def search(self, phash, max_distance, limit=None, exclude=None):
+        """
+        Stored entries within `max_distance` bits of `phash`, as
+        (request_id, distance) sorted by distance.
+        """
+        chunk_radius = max_distance // CHUNKS
+        candidates = {}
+        for i, chunk in enumerate(_chunks(phash)):
+            values = _neighbours(chunk, chunk_radius)
+            for start in range(0, len(values), 500):
+                batch = values[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT request_id, phash FROM face_hashes WHERE c{i} IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                candidates.update(rows)
+
+        matches = []
+        for request_id, stored in candidates.items():
+            if request_id == exclude:
+                continue
+            distance = hamming_distance(phash, _unsigned(stored))
+            if distance <= max_distance:
+                matches.append((request_id, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches[:limit] if limit else matches
+
+    def indexed_ids(self):
+        return {row[0] for row in self.conn.execute("SELECT request_id FROM face_hashes")}
+
+    def all_hashes(self):
+        return [(request_id, _unsigned(phash)) for request_id, phash in self.conn.execute("SELECT request_id, phash FROM face_hashes")]
+
+    def close(self):
+        self.conn.close()
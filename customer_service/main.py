@@ -1,10 +1,21 @@
 import os
+import sys
 import signal
 import time
 import yaml
 import art # type: ignore
-import mediapipe as mp
 import argparse
+import queue
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import resource_manager
+
+# Thread budget and CPU pinning must be in place before NumPy, OpenCV and MediaPipe load
+thread_budget = resource_manager.apply_environment()
+
+import cv2
+import mediapipe as mp
 
 from rich.console import Console
 
@@ -16,8 +27,16 @@ from func.check_light_pollution import check_lightpol
 from func.check_eye import check_eye_status
 from func.get_landmarks import get_lm
 from func.check_head_fully import analyze_single_image
+from func.perceptual_hash import perceptual_hash
+from func.detectors import DetectorRegistry
+from func import buffer_arena
 
+from hash_index import HashIndex
+from metrics_store import MetricsStore
+from profiler import RequestProfiler, track
 from rabbitmq_handler import QueueHandler
+from result_model import VerificationResult
+from tracing import stage
 
 # Initialize Rich Console
 console = Console()
@@ -31,7 +50,16 @@ class ModelHandler:
         self.min_detection_confidence = min_detection_confidence
         self.gpu_mode = gpu_mode
         self.load_config()
+        self.load_arena_budget()
         self.load_model()
+        self.load_metrics_store()
+        self.load_hash_index()
+        self.detectors = DetectorRegistry(self.config.get('detectors', {}), os.path.dirname(__file__))
+        self.profiler = RequestProfiler(self.config.get('profiling', {}), os.path.dirname(__file__))
+        self.check_pool, self.check_workers = None, 1
+        self.load_check_pool()
+        self.image_pool, self.image_workers = None, 1
+        self.load_image_pool()
     
     def load_config(self):
         """Load configuration from config.yml file"""
@@ -50,6 +78,11 @@ class ModelHandler:
             console.print(f"[bold red]CONFIG[/bold red] | Error: {e}")
             raise
 
+    def load_arena_budget(self):
+        """Scratch memory the buffer arenas of all threads may hold together"""
+        budget_mb = self.config.get('resources', {}).get('buffer_arena_mb', 256)
+        buffer_arena.configure(int(budget_mb * 1024 * 1024))
+
     def load_model(self):
         os.environ['GLOG_minloglevel'] = '2'
         
@@ -60,6 +93,8 @@ class ModelHandler:
         else:
             os.environ['MEDIAPIPE_GPU'] = '0'
             console.print("[bold yellow]MODEL[/bold yellow] | CPU mode only")
+
+        resource_manager.apply_runtime_limits(thread_budget)
         
         self.mp_face_mesh = mp.solutions.face_mesh.FaceMesh(
             static_image_mode=self.static_image_mode,
@@ -67,70 +102,348 @@ class ModelHandler:
             min_detection_confidence=self.min_detection_confidence
         )
 
-    def process_image(self, file_path: str):
-        import json
+    def load_metrics_store(self):
+        store_config = self.config.get('metrics_store', {})
+        self.metrics_store = None
+        if store_config.get('enabled'):
+            path = os.path.join(os.path.dirname(__file__), store_config.get('path', 'metrics/metrics.db'))
+            self.metrics_store = MetricsStore(path)
+            console.print(f"[bold green]METRICS[/bold green] | Storing raw check metrics in [cyan]{path}[/cyan]")
+
+    def load_hash_index(self):
+        dedup_config = self.config.get('dedup', {})
+        self.hash_index = None
+        if dedup_config.get('enabled'):
+            path = os.path.join(os.path.dirname(__file__), dedup_config.get('path', 'metrics/hashes.db'))
+            self.hash_index = HashIndex(path)
+            console.print(f"[bold green]DEDUP[/bold green] | Indexing aligned face hashes in [cyan]{path}[/cyan]")
+
+    def load_check_pool(self):
+        """
+        Thread pool running the independent image checks of one request
+        concurrently. `concurrency.check_workers: 0` sizes it from the
+        worker's thread budget (all usable cores when unbudgeted), capped at
+        the number of checks that can overlap; 1 runs them inline.
+        """
+        workers = self.config.get('concurrency', {}).get('check_workers', 0)
+        if not workers:
+            workers = thread_budget or resource_manager.usable_cpu_count()
+        workers = max(1, min(int(workers), len(CONCURRENT_CHECKS)))
+        if workers == self.check_workers:
+            return
+        if self.check_pool is not None:
+            self.check_pool.shutdown(wait=False)
+        self.check_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="check") if workers > 1 else None
+        self.check_workers = workers
+        console.print(f"[bold green]CHECKS[/bold green] | Running up to {workers} check(s) concurrently")
+
+    def load_image_pool(self):
+        """
+        Thread pool running the images of one batch side by side: detection,
+        FaceMesh, the checks and alignment are native code that releases the
+        GIL, so a batch keeps several cores busy instead of one image at a
+        time. `batching.image_workers: 0` sizes it from the worker's thread
+        budget, capped at `max_batch_size`; no pool without batching.
+        """
+        batching_config = self.config.get('batching', {})
+        workers = 1
+        if batching_config.get('enabled'):
+            workers = batching_config.get('image_workers', 0) or thread_budget or resource_manager.usable_cpu_count()
+            workers = max(1, min(int(workers), batching_config.get('max_batch_size', 8)))
+        if workers == self.image_workers:
+            return
+        if self.image_pool is not None:
+            self.image_pool.shutdown(wait=False)
+        self.image_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image") if workers > 1 else None
+        self.image_workers = workers
+        console.print(f"[bold green]BATCH[/bold green] | Verifying up to {workers} image(s) of a batch concurrently")
+
+    def find_duplicates(self, results, traces):
+        """Look up near-duplicates of every aligned face, then add the faces to the index"""
+        dedup_config = self.config.get('dedup', {})
+        for result, trace in zip(results, traces):
+            if result.phash is None:
+                continue
+            # Same id the bulk build derives from "<request_id>_aligned.png"
+            request_id = result.request_id or os.path.basename(result.align_face)[:-len("_aligned.png")]
+            with stage(trace, "find_duplicates"):
+                matches = self.hash_index.search(
+                    result.phash,
+                    dedup_config.get('max_distance', 6),
+                    limit=dedup_config.get('max_results', 10),
+                    exclude=request_id
+                )
+                result.duplicates = [{"request_id": request_id, "distance": distance} for request_id, distance in matches]
+                # One at a time so later images of the batch also match earlier ones
+                self.hash_index.add(request_id, result.phash, result.align_face)
+            if matches:
+                console.print(f"[bold yellow]DEDUP[/bold yellow] | {request_id} has {len(matches)} near-duplicate(s)")
+
+    def pipeline_profile(self, degraded=False) -> dict:
+        """
+        Settings of the pipeline stages that have a cheaper variant. The
+        `degraded` profile (see the config section of the same name) trades
+        some accuracy for latency when the worker is overloaded.
+        `detector` names the face detection backend (see func/detectors.py).
+        """
+        detection_config = self.config.get('detection', {})
+        profile = {
+            "degraded": False,
+            "detector": detection_config.get('detector', 'auto'),
+            "detection_size": detection_config.get('detection_size', 640),
+            "fallback_full_range": detection_config.get('fallback_full_range', True),
+            "align_output_size": 1024,
+            "png_params": [],
+            "skip_checks": (),
+        }
+        if degraded:
+            degraded_config = self.config.get('degraded', {})
+            profile.update({
+                "degraded": True,
+                "detector": degraded_config.get('detector', profile["detector"]),
+                "detection_size": degraded_config.get('detection_size', profile["detection_size"]),
+                "fallback_full_range": degraded_config.get('fallback_full_range', profile["fallback_full_range"]),
+                "align_output_size": degraded_config.get('align_output_size', profile["align_output_size"]),
+                # Huffman-only deflate: faster to encode, files slightly larger
+                "png_params": [cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY] if degraded_config.get('fast_png') else [],
+                "skip_checks": tuple(degraded_config.get('optional_checks') or ()),
+            })
+        # Resolve the backends once per batch; the registry keeps them across batches
+        confidence = detection_config.get('min_detection_confidence', 0.5)
+        profile["face_detector"] = self.detectors.get(profile["detector"], confidence)
+        profile["fallback_detector"] = self.detectors.get("mediapipe_full", confidence) if profile["fallback_full_range"] else None
+        # Blur and light pollution measure inside the box: a fixed backend keeps
+        # their verdicts independent of the profile and of earlier traffic
+        profile["check_detector"] = self.detectors.get("mediapipe_full")
+        return profile
 
-        # Reload config for each image processing
+    def process_image(self, file_path: str, request_id: str = None, on_check=None, trace=None, degraded=False) -> VerificationResult:
+        return self.process_batch([file_path], [request_id], [on_check], [trace], degraded=degraded)[0]
+
+    def process_batch(self, file_paths: list, request_ids: list = None, on_checks: list = None, traces: list = None, degraded=False) -> list:
+        """
+        Verify several images in one pass, side by side on the image pool
+        (see load_image_pool), one after another without it.
+        Returns one VerificationResult per input path, in the same order.
+        `on_checks` optionally holds, per image, a callable that receives a
+        progress event ({"check", "passed", "message"}) as each verdict is known.
+        `traces` optionally holds, per image, the Trace its stages are recorded in.
+        `degraded` selects the cheaper pipeline profile (see pipeline_profile).
+        """
+        # Reload config once per batch
         self.load_config()
+        self.profiler.configure(self.config.get('profiling', {}))
+        self.load_arena_budget()
+        self.detectors.configure(self.config.get('detectors', {}))
+        self.load_check_pool()
+        self.load_image_pool()
+        request_ids = request_ids or [None] * len(file_paths)
+        on_checks = on_checks or [None] * len(file_paths)
+        traces = traces or [None] * len(file_paths)
+
+        with self.profiler.capture() as capture:
+            if capture is not None:
+                capture.inputs = [
+                    {"request_id": request_id, "file_path": file_path}
+                    for request_id, file_path in zip(request_ids, file_paths)
+                ]
+            results = self._process_batch(file_paths, request_ids, on_checks, traces, self.pipeline_profile(degraded))
+            if capture is not None:
+                capture.inputs = [
+                    {"request_id": result.request_id, "file_path": file_path,
+                     "ok": result.ok, "error": result.error, "duration_ms": result.duration_ms}
+                    for file_path, result in zip(file_paths, results)
+                ]
+        return results
+
+    def _process_batch(self, file_paths, request_ids, on_checks, traces, profile):
+        if self.image_pool is None or len(file_paths) == 1:
+            results = [
+                self._process_one(file_path, request_id, on_check, trace, profile)
+                for file_path, request_id, on_check, trace in zip(file_paths, request_ids, on_checks, traces)
+            ]
+        else:
+            results = self._process_concurrently(file_paths, request_ids, on_checks, traces, profile)
+
+        if self.hash_index is not None:
+            self.find_duplicates(results, traces)
+
+        if self.metrics_store is not None:
+            self.metrics_store.record_many([
+                {
+                    "request_id": result.request_id,
+                    "file_path": file_path,
+                    "detected": bool(result.checks),
+                    "ok": result.ok,
+                    "degraded": result.degraded,
+                    "duration_ms": result.duration_ms,
+                    "metrics": result.metrics,
+                    "checks": result.checks,
+                }
+                for file_path, result in zip(file_paths, results)
+            ])
+        return results
+
+    def _process_concurrently(self, file_paths, request_ids, on_checks, traces, profile):
+        """
+        Run the images of a batch on the image pool. Their progress events are
+        published from this thread as they arrive, since pika is not
+        thread-safe; each image posts None to the queue once it is done.
+        """
+        events = queue.Queue()
+
+        def relay(on_check):
+            return None if on_check is None else lambda event: events.put((on_check, event))
+
+        def run(*args):
+            try:
+                # Image threads are sampled too while the batch is profiled
+                with track("process_image"):
+                    return self._process_one(*args)
+            finally:
+                events.put(None)
+
+        futures = [
+            # Own context copy per image, so its spans land in its trace
+            self.image_pool.submit(contextvars.copy_context().run, run, file_path, request_id, relay(on_check), trace, profile)
+            for file_path, request_id, on_check, trace in zip(file_paths, request_ids, on_checks, traces)
+        ]
+        remaining = len(futures)
+        while remaining:
+            item = events.get()
+            if item is None:
+                remaining -= 1
+            else:
+                _publish(*item)
+        return [future.result() for future in futures]
 
+    def _process_one(self, file_path, request_id, on_check, trace, profile) -> VerificationResult:
+        detection_config = self.config.get('detection', {})
+        started = time.perf_counter()
+        with stage(trace, "detect_face"):
+            detection = get_lm(
+                file_path,
+                max_faces=detection_config.get('max_faces', 1),
+                detection_size=profile["detection_size"],
+                crop_padding=detection_config.get('crop_padding', 0.5),
+                min_detection_confidence=detection_config.get('min_detection_confidence', 0.5),
+                detector=profile["face_detector"],
+                fallback=profile["fallback_detector"]
+            )
+        result = self._verify(file_path, detection, profile, on_check, trace)
+        result.degraded = profile["degraded"]
+        result.request_id = request_id or os.path.splitext(os.path.basename(file_path))[0]
+        result.duration_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    def _verify(self, file_path, detection, profile, on_check=None, trace=None) -> VerificationResult:
+        th = self.config['threshold']
         output_crop_face_dir = os.path.dirname(file_path)
-        result = { "message": None, "align_face": None, "bbox": None }
-        success, msg, landmarks, bbox, norm_box = get_lm(file_path)
+        result = { "message": None, "metrics": {}, "checks": {} }
+        success, msg = detection[:2]
+        _report(on_check, "detect_face", success, msg)
 
         if not success:
-            result["message"] = msg
-        else:
-            console.print(f"[bold cyan]PROCESSING[/bold cyan] | {os.path.basename(file_path)}")
-            
-            funcs = [
-                ("check_face_min_size", check_face_min_size, [bbox, self.config['threshold']['face_size']], {}),
-                ("check_lightpol", check_lightpol, [file_path,self.config['threshold']['dark_threshold'],self.config['threshold']['bright_threshold'],self.config['threshold']['diff_threshold'],self.config['threshold']['margin']], {}),
-                ("check_face_blur", check_face_blur, [file_path, self.config['threshold']['blur']], {}),
-                ("check_head_fully",analyze_single_image,[file_path, self.config['threshold']['head_fully_th']],{}),
-                ("check_head_pose",check_head_pose,[file_path, self.config['threshold']['left_th'], self.config['threshold']['right_th'], self.config['threshold']['down_th'], self.config['threshold']['up_th'], self.config['threshold']['til_left_th'], self.config['threshold']['til_right_th']],{}),
-                ("check_eye", check_eye_status, [landmarks, success, msg, self.config['threshold']['EAR_THRESHOLD']], {}),
-            ]
+            return VerificationResult.failure(msg)
+
+        _, _, landmarks, bbox, norm_box = detection
+        console.print(f"[bold cyan]PROCESSING[/bold cyan] | {os.path.basename(file_path)}")
 
-            all_passed = True
+        detect_kwargs = {"detector": profile["check_detector"]}
+        funcs = [
+            ("check_face_min_size", check_face_min_size, [bbox, th['face_size']], {}),
+            ("check_lightpol", check_lightpol, [file_path, th['dark_threshold'], th['bright_threshold'], th['diff_threshold'], th['margin']], detect_kwargs),
+            ("check_face_blur", check_face_blur, [file_path, th['blur']], detect_kwargs),
+            ("check_head_fully", analyze_single_image, [file_path, th['head_fully_th']], {}),
+            ("check_head_pose", check_head_pose, [file_path, th['left_th'], th['right_th'], th['down_th'], th['up_th'], th['til_left_th'], th['til_right_th']], {}),
+            ("check_eye", check_eye_status, [landmarks, True, msg, th['EAR_THRESHOLD']], {}),
+        ]
+        # Optional checks are left out of the degraded profile (no verdict
+        # recorded); the reply names them
+        skipped = [f[0] for f in funcs if f[0] in profile["skip_checks"]] or None
+        funcs = [f for f in funcs if f[0] not in profile["skip_checks"]]
 
+        # Start the independent checks together, then collect them in declared
+        # order: logs, progress events and the first-failure message are the
+        # same as when they run one after another
+        futures = {}
+        if self.check_pool is not None:
             for name, func, args, kwargs in funcs:
-                try:
-                    success, msg = func(*args, **kwargs)
-                    status_icon = 'PASS' if success else 'FAIL'
-                    status_color = 'green' if success else 'red'
-                    console.print(f"\t[bold {status_color}]{status_icon}[/bold {status_color}] | {name} - {msg}")
-                except Exception as e:
-                    console.print(f"\t[bold red]ERROR[/bold red] | {name} - Function error: {str(e)}")
-                    success, msg = False, f"Function error: {str(e)}"
-                
-                if not success:
-                    if result["message"] is None:
-                        result["message"] = msg
-                    all_passed = False
-
-            if all_passed:
-                align_face(file_path, output_crop_face_dir, self.mp_face_mesh)
-                image_filename = f"{os.path.basename(file_path).split('.')[0]}_aligned.png"
-                image_save_path = os.path.join(output_crop_face_dir, image_filename)
-                result["align_face"] = image_save_path
-                result["bbox"] = bbox
-                console.print(f"[bold green]PROCESSING[/bold green] | All checks passed - Face aligned")
-            else:
-                console.print(f"[bold red]PROCESSING[/bold red] | Failed - {result['message']}")
-        
-        # Return JSON response
-        if result["message"] is None:
-            return json.dumps({
-                'OK': True,
-                'align_face': result["align_face"],
-                'bbox': result["bbox"],
-                'norm_box': norm_box
-            })
-        else:
-            return json.dumps({
-                'OK': False,
-                'error': result["message"]
-            })
+                if name in CONCURRENT_CHECKS:
+                    # Own context copy per check, so its span nests under the request's
+                    futures[name] = self.check_pool.submit(
+                        contextvars.copy_context().run, _run_check, trace, name, func, args, kwargs)
+
+        all_passed = True
+
+        for name, func, args, kwargs in funcs:
+            try:
+                if name in futures:
+                    success, msg, metrics = futures[name].result()
+                else:
+                    success, msg, metrics = _run_check(trace, name, func, args, kwargs)
+                result["metrics"].update(metrics)
+                status_icon = 'PASS' if success else 'FAIL'
+                status_color = 'green' if success else 'red'
+                console.print(f"\t[bold {status_color}]{status_icon}[/bold {status_color}] | {name} - {msg}")
+            except Exception as e:
+                console.print(f"\t[bold red]ERROR[/bold red] | {name} - Function error: {str(e)}")
+                success, msg = False, f"Function error: {str(e)}"
+            result["checks"][name] = bool(success)
+            _report(on_check, name, success, msg)
+
+            if not success:
+                if result["message"] is None:
+                    result["message"] = msg
+                all_passed = False
+
+        if not all_passed:
+            console.print(f"[bold red]PROCESSING[/bold red] | Failed - {result['message']}")
+            return VerificationResult.failure(
+                result["message"], metrics=result["metrics"], checks=result["checks"], skipped_checks=skipped)
+
+        with stage(trace, "align_face"):
+            aligned, _, aligned_image = align_face(
+                file_path, output_crop_face_dir, self.mp_face_mesh, landmarks=landmarks,
+                output_size=profile["align_output_size"], png_params=profile["png_params"]
+            )
+        phash = perceptual_hash(aligned_image) if aligned and self.hash_index is not None else None
+        image_filename = f"{os.path.basename(file_path).split('.')[0]}_aligned.png"
+        image_save_path = os.path.join(output_crop_face_dir, image_filename)
+        console.print(f"[bold green]PROCESSING[/bold green] | All checks passed - Face aligned")
+
+        # Return typed result, serialized once by the queue handler
+        return VerificationResult(
+            ok=True,
+            align_face=image_save_path,
+            bbox=bbox,
+            norm_box=norm_box,
+            metrics=result["metrics"],
+            checks=result["checks"],
+            skipped_checks=skipped,
+            phash=phash
+        )
+
+# Image checks that only read the input file: each uses MediaPipe graphs of its
+# own (per call, or per thread for the detectors) and its thread's buffer
+# arena, so they can run side by side
+CONCURRENT_CHECKS = ("check_lightpol", "check_face_blur", "check_head_fully", "check_head_pose")
+
+def _run_check(trace, name, func, args, kwargs):
+    # Pool threads are sampled too while the batch is profiled, under the check's name
+    with stage(trace, name), track(name):
+        return func(*args, **kwargs)
+
+def _report(on_check, name, success, msg):
+    """Send a check verdict to the progress callback, never failing the pipeline"""
+    if on_check is not None:
+        _publish(on_check, {"check": name, "passed": bool(success), "message": msg})
+
+def _publish(on_check, event):
+    try:
+        on_check(event)
+    except Exception as e:
+        console.print(f"[bold yellow]PROGRESS[/bold yellow] | Failed to publish progress: {e}")
 
 def signal_handler(signum, frame):
     console.print("\n[bold yellow]SYSTEM[/bold yellow] | Shutdown signal received")
@@ -155,10 +468,17 @@ if __name__ == "__main__":
     console.print("[bold blue]STARTUP[/bold blue] | Initializing Face Verification Service")
     console.print(f"[bold green]STARTUP[/bold green] | GPU Mode: {gpu_mode}")
     model_handler = ModelHandler(gpu_mode=gpu_mode)
+    model_handler.profiler.install_signal()
     global queue_handler
     queue_handler = QueueHandler(model_handler)
     console.print("[bold blue]RABBITMQ[/bold blue] | Connecting...")
     queue_handler.connect()
     art.tprint("N. Face Verification")
     console.print(f"[bold green]RABBITMQ[/bold green] | Service started at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    queue_handler.start_consuming()
\ No newline at end of file
+    queue_handler.start_consuming()
+
+    # Only reached when the watchdog stopped consuming after a hung message
+    if queue_handler.restart_required:
+        queue_handler.close()
+        console.print("[bold red]SYSTEM[/bold red] | Exiting for restart after a hung message")
+        sys.exit(1)
\ No newline at end of file
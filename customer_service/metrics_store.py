@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import time
+from rich.console import Console
+
+# Initialize Rich Console
+console = Console()
+
+# Raw values reported by the checks, one column each
+METRIC_COLUMNS = [
+    "face_w",
+    "face_h",
+    "face_brightness",
+    "background_brightness",
+    "brightness_diff",
+    "laplacian_var",
+    "head_top_margin",
+    "head_chin_margin",
+    "yaw",
+    "pitch",
+    "roll",
+    "ear_left",
+    "ear_right",
+]
+
+# Verdict of each check at the time the request was processed
+CHECK_COLUMNS = [
+    "check_face_min_size",
+    "check_lightpol",
+    "check_face_blur",
+    "check_head_fully",
+    "check_head_pose",
+    "check_eye",
+]
+
+
+class MetricsStore:
+    """
+    Wide SQLite table with one row per request: the raw metrics of every
+    check, the verdicts and the latency. Thresholds can then be replayed
+    against the stored values without touching the images again
+    (see replay_thresholds.py).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_table()
+
+    def _create_table(self):
+        columns = ",\n".join(
+            [f"{name} REAL" for name in METRIC_COLUMNS] +
+            [f"{name} INTEGER" for name in CHECK_COLUMNS]
+        )
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS request_metrics (
+                request_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                file_path TEXT,
+                detected INTEGER NOT NULL,
+                ok INTEGER NOT NULL,
+                duration_ms REAL,
+                degraded INTEGER NOT NULL DEFAULT 0,
+                {columns}
+            )
+        """)
+        # Databases created before the degraded profile existed
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(request_metrics)")}
+        if "degraded" not in existing:
+            self.conn.execute("ALTER TABLE request_metrics ADD COLUMN degraded INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_request_metrics_created_at ON request_metrics (created_at)")
+        self.conn.commit()
+
+    def record_many(self, rows):
+        """
+        Insert or replace rows. Each row is a dict with request_id, file_path,
+        detected, ok, duration_ms, degraded, `metrics` (name -> value) and
+        `checks` (check name -> bool).
+        """
+        names = ["request_id", "created_at", "file_path", "detected", "ok", "duration_ms", "degraded"] + METRIC_COLUMNS + CHECK_COLUMNS
+        placeholders = ", ".join("?" for _ in names)
+        now = time.time()
+        values = []
+        for row in rows:
+            metrics = row.get("metrics", {})
+            checks = row.get("checks", {})
+            values.append(
+                [row["request_id"], now, row.get("file_path"), int(row["detected"]), int(row["ok"]), row.get("duration_ms"),
+                 int(bool(row.get("degraded")))] +
+                [metrics.get(name) for name in METRIC_COLUMNS] +
+                [None if checks.get(name) is None else int(bool(checks[name])) for name in CHECK_COLUMNS]
+            )
+        try:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO request_metrics ({', '.join(names)}) VALUES ({placeholders})",
+                values
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            console.print(f"[bold red]METRICS[/bold red] | Failed to store metrics: {e}")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,108 @@
+import os
+import glob
+import json
+import argparse
+import time
+from collections import Counter, defaultdict
+
+from rich.console import Console
+from rich.table import Table
+
+# Initialize Rich Console
+console = Console()
+
+
+def load_profiles(directory, since=None, reason=None):
+    profiles = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path, "r") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if since is not None and profile.get("created_at", 0) < since:
+            continue
+        if reason is not None and profile.get("reason") != reason:
+            continue
+        profiles.append(profile)
+    return profiles
+
+
+def aggregate(profiles):
+    """
+    Per function: self time (it was the leaf), total time (it was anywhere on
+    the stack, counted once per stack for recursion) and how many profiles
+    it appeared in.
+    """
+    self_ms, total_ms, seen_in = Counter(), Counter(), defaultdict(int)
+    for profile in profiles:
+        functions = set()
+        for stack, ms in profile["stacks"].items():
+            frames = stack.split(";")
+            self_ms[frames[-1]] += ms
+            for name in set(frames):
+                total_ms[name] += ms
+            functions.update(frames)
+        for name in functions:
+            seen_in[name] += 1
+    return self_ms, total_ms, seen_in
+
+
+def main():
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Summarize the hottest functions across captured profiles")
+    parser.add_argument("--dir", default=os.path.join(base_dir, "profiles"), help="Profile directory (profiling.directory)")
+    parser.add_argument("--top", type=int, default=25, help="Number of functions to show")
+    parser.add_argument("--since-hours", type=float, default=None, help="Only profiles newer than this many hours")
+    parser.add_argument("--reason", choices=["slow", "sampled", "error"], default=None, help="Only profiles captured for this reason")
+    parser.add_argument("--sort", choices=["self", "total"], default="self", help="Rank by self or inclusive time")
+    parser.add_argument("--folded", default=None, help="Also write merged collapsed stacks (flamegraph.pl / speedscope input)")
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    profiles = load_profiles(args.dir, since, args.reason)
+    if not profiles:
+        console.print(f"[bold yellow]PROFILER[/bold yellow] | No profiles in {args.dir}")
+        return
+
+    self_ms, total_ms, seen_in = aggregate(profiles)
+    sampled_ms = sum(self_ms.values())
+    reasons = Counter(profile.get("reason") for profile in profiles)
+    slowest = max(profiles, key=lambda profile: profile.get("duration_ms", 0))
+    console.print(f"[bold blue]PROFILER[/bold blue] | {len(profiles)} profiles "
+                  f"({', '.join(f'{count} {reason}' for reason, count in reasons.most_common())}), "
+                  f"{sampled_ms / 1000:.1f}s sampled")
+    console.print(f"[bold blue]PROFILER[/bold blue] | Slowest: {slowest.get('duration_ms', 0):.0f} ms on "
+                  f"{', '.join(str(item.get('file_path')) for item in slowest.get('inputs', []))}")
+
+    ranking = self_ms if args.sort == "self" else total_ms
+    table = Table(title=f"Top {args.top} functions by {args.sort} time")
+    table.add_column("Function")
+    table.add_column("Self ms", justify="right")
+    table.add_column("Self %", justify="right")
+    table.add_column("Total ms", justify="right")
+    table.add_column("Total %", justify="right")
+    table.add_column("Profiles", justify="right")
+    for name, _ in ranking.most_common(args.top):
+        table.add_row(
+            name,
+            f"{self_ms[name]:,.0f}",
+            f"{self_ms[name] / sampled_ms:.1%}",
+            f"{total_ms[name]:,.0f}",
+            f"{total_ms[name] / sampled_ms:.1%}",
+            f"{seen_in[name]}/{len(profiles)}",
+        )
+    console.print(table)
+
+    if args.folded:
+        merged = Counter()
+        for profile in profiles:
+            merged.update(profile["stacks"])
+        with open(args.folded, "w") as f:
+            for stack, ms in merged.most_common():
+                f.write(f"{stack} {round(ms)}\n")
+        console.print(f"[bold green]PROFILER[/bold green] | Collapsed stacks written to [cyan]{args.folded}[/cyan]")
+
+
+if __name__ == "__main__":
+    main()
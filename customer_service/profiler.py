@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import signal
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+from rich.console import Console
+
+# Initialize Rich Console
+console = Console()
+
+# Sampler of the capture in progress: copied into the check pool with the context
+_active_sampler = contextvars.ContextVar("active_sampler", default=None)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of the profiled thread, and of the threads
+    working for it (see `track`), from a background thread every `interval`
+    seconds and accumulates wall time per collapsed stack
+    ("outer;inner;leaf"). Time spent in native code (MediaPipe, OpenCV) is
+    attributed to the Python frame that called it. Each sample is weighted
+    by the time actually elapsed since the previous one, so samples delayed
+    by a GIL-holding native call still add up to the real duration.
+
+    Stacks of a tracked thread start with its label, e.g. "check_face_blur",
+    and are counted per thread: while checks run side by side the total
+    exceeds the wall time of the call.
+    """
+
+    def __init__(self, thread_id, root_frame, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        # thread id -> (frame sampling stops at, label the stacks start with)
+        self.threads = {thread_id: (root_frame, None)}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def add_thread(self, thread_id, root_frame, label):
+        """False when the thread is sampled already (e.g. a check run inline)"""
+        with self.lock:
+            if thread_id in self.threads:
+                return False
+            self.threads[thread_id] = (root_frame, label)
+            return True
+
+    def remove_thread(self, thread_id):
+        with self.lock:
+            self.threads.pop(thread_id, None)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            if self.thread_id not in frames:
+                return
+            with self.lock:
+                threads = list(self.threads.items())
+            sampled = False
+            for thread_id, (root_frame, label) in threads:
+                frame = frames.get(thread_id)
+                names = []
+                # Stop at the profiled call: frames above it are the same for every sample
+                while frame is not None and frame is not root_frame:
+                    names.append(frame_name(frame))
+                    frame = frame.f_back
+                if names:
+                    if label is not None:
+                        names.append(label)
+                    self.stacks[";".join(reversed(names))] += (now - last) * 1000
+                    sampled = True
+            self.samples += sampled
+            last = now
+
+
+@contextmanager
+def track(label):
+    """
+    Sample the calling thread under `label` while the body runs, when it
+    works for a profiled call: the body of `RequestProfiler.capture`, or a
+    pool thread started with a copy of its context. Does nothing otherwise.
+    """
+    sampler = _active_sampler.get()
+    if sampler is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    # The frame of the `with` statement: sampled stacks start below it
+    if not sampler.add_thread(thread_id, sys._getframe(2), label):
+        yield
+        return
+    try:
+        yield
+    finally:
+        sampler.remove_thread(thread_id)
+
+
+class Capture:
+    """One profiled call; the caller fills `inputs` before it ends"""
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.started = time.time()
+        self.inputs = []
+        self.error = None
+
+
+class RequestProfiler:
+    """
+    Opt-in sampling profiler around the verification pipeline.
+
+    While enabled, every call runs under a StackSampler; when it ends the
+    profile is kept if the call was sampled (`sample_rate`), was slower than
+    `slow_threshold_ms`, or raised. Kept profiles are written with their
+    inputs as JSON to `directory` by a background thread, and only the
+    newest `max_profiles` are kept.
+
+    Enabled by `profiling.enabled` (the config is reloaded per batch) or
+    toggled at runtime with the configured signal (SIGUSR1 by default),
+    which overrides the config until the next toggle.
+    """
+
+    def __init__(self, config, base_dir):
+        self.base_dir = base_dir
+        self.override = None
+        self.pending = queue.Queue(maxsize=100)
+        self.writer = None
+        self.lock = threading.Lock()
+        self.configure(config)
+
+    def configure(self, config):
+        self.config_enabled = bool(config.get('enabled', False))
+        self.sample_rate = float(config.get('sample_rate', 0.01))
+        self.slow_threshold_ms = config.get('slow_threshold_ms', 3000)
+        self.interval = config.get('interval_ms', 5) / 1000
+        self.directory = os.path.join(self.base_dir, config.get('directory', 'profiles'))
+        self.max_profiles = config.get('max_profiles', 200)
+        self.signal_name = config.get('signal', 'SIGUSR1')
+
+    @property
+    def enabled(self):
+        return self.config_enabled if self.override is None else self.override
+
+    def install_signal(self):
+        """Toggle profiling on the configured signal (main thread only, POSIX only)"""
+        signum = getattr(signal, self.signal_name, None)
+        if signum is None:
+            return
+        try:
+            signal.signal(signum, self._toggle)
+        except ValueError:
+            pass
+
+    def _toggle(self, signum, frame):
+        self.override = not self.enabled
+        state = "enabled" if self.override else "disabled"
+        console.print(f"[bold blue]PROFILER[/bold blue] | Profiling {state} by {signal.Signals(signum).name}")
+
+    @contextmanager
+    def capture(self):
+        """Profile the body; yields a Capture (None when profiling is off)"""
+        if not self.enabled:
+            yield None
+            return
+        # The frame of the `with` statement: sampled stacks start below it
+        root_frame = sys._getframe(2)
+        sampler = StackSampler(threading.get_ident(), root_frame, self.interval)
+        capture = Capture(sampler)
+        token = _active_sampler.set(sampler)
+        sampler.start()
+        try:
+            yield capture
+        except BaseException as e:
+            capture.error = repr(e)
+            raise
+        finally:
+            _active_sampler.reset(token)
+            sampler.stop()
+            self._finish(capture)
+
+    def _finish(self, capture):
+        duration_ms = (time.time() - capture.started) * 1000
+        slowest = max((item.get('duration_ms') or 0 for item in capture.inputs), default=duration_ms)
+        if capture.error is not None:
+            reason = "error"
+        elif slowest >= self.slow_threshold_ms:
+            reason = "slow"
+        elif random.random() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return
+        profile = {
+            "created_at": capture.started,
+            "reason": reason,
+            "duration_ms": duration_ms,
+            "interval_ms": self.interval * 1000,
+            "samples": capture.sampler.samples,
+            "error": capture.error,
+            "inputs": capture.inputs,
+            "stacks": dict(capture.sampler.stacks),
+        }
+        self._ensure_writer()
+        try:
+            self.pending.put_nowait(profile)
+        except queue.Full:
+            pass  # never let profiling back-pressure the request path
+
+    def _ensure_writer(self):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run, name="profiler-writer", daemon=True)
+                self.writer.start()
+
+    def _run(self):
+        while True:
+            profile = self.pending.get()
+            try:
+                self._write(profile)
+            except Exception as e:
+                console.print(f"[bold red]PROFILER[/bold red] | Failed to write profile: {e}")
+
+    def _write(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile["created_at"]))
+        request_id = (profile["inputs"][0].get("request_id") if profile["inputs"] else None) or "unknown"
+        path = os.path.join(self.directory, f"{stamp}_{profile['reason']}_{request_id}.json")
+        with open(path, "w") as f:
+            json.dump(profile, f)
+        console.print(f"[bold blue]PROFILER[/bold blue] | Captured {profile['reason']} profile "
+                      f"({profile['duration_ms']:.0f} ms) -> [cyan]{os.path.basename(path)}[/cyan]")
+        self._rotate()
+
+    def _rotate(self):
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
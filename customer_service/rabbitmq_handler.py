@@ -1,9 +1,18 @@
 import pika
-import json
 import os
+import copy
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from rich.console import Console
 
+from batch_scheduler import BatchScheduler
+from degraded import DegradationController
+from result_model import VerificationResult
+from serialization import decode, encode, negotiate
+from tracing import build_tracer, stage
+from watchdog import InflightJournal, Watchdog, WatchdogTimeout
+
 load_dotenv()
 
 # Initialize Rich Console
@@ -15,6 +24,22 @@ class QueueHandler:
         self.connection = None
         self.channel = None
         self.queue = None
+        self.scheduler = None
+        self.batching = model_handler.config.get('batching', {})
+        self.watchdog_config = model_handler.config.get('watchdog', {})
+        self.watchdog = None
+        self.journal = None
+        self.dead_letter_queue = None
+        self.probe_channel = None
+        self.restart_required = False
+        self.degradation = DegradationController(model_handler.config.get('degraded', {}))
+        self._depth = 0
+        self._depth_checked_at = 0.0
+        self.tracer = build_tracer(
+            model_handler.config.get('tracing', {}),
+            "face-verification-consumer",
+            base_dir=os.path.dirname(os.path.abspath(__file__))
+        )
 
     def connect(self):
         """Establish connection to RabbitMQ"""
@@ -30,59 +55,397 @@ class QueueHandler:
         self.connection = pika.BlockingConnection(params)
         self.channel = self.connection.channel()
         self.channel.queue_declare(queue=self.queue)
-        self.channel.basic_qos(prefetch_count=1)
+
+        if self.watchdog_config.get('enabled'):
+            self.watchdog = Watchdog(
+                self.connection,
+                timeout_seconds=self.watchdog_config.get('timeout_seconds', 60),
+                poll_interval=self.watchdog_config.get('poll_interval_seconds', 1)
+            )
+            self.journal = InflightJournal(self.watchdog_config.get('inflight_dir') or None)
+            # Messages that failed every attempt are parked here for inspection
+            self.dead_letter_queue = self.watchdog_config.get('dead_letter_queue') or f"{self.queue}.dead"
+            self.channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+
+        if self.batching.get('enabled'):
+            # Let the broker push up to one batch worth of messages
+            self.channel.basic_qos(prefetch_count=self.batching.get('max_batch_size', 8))
+            self.scheduler = BatchScheduler(
+                self.connection,
+                self.channel,
+                self.queue,
+                self.process_batch,
+                max_batch_size=self.batching.get('max_batch_size', 8),
+                max_wait_ms=self.batching.get('max_wait_ms', 50),
+                depth_probe_interval_ms=self.batching.get('depth_probe_interval_ms', 500)
+            )
+        else:
+            self.channel.basic_qos(prefetch_count=1)
         console.print(f"[bold green]RABBITMQ[/bold green] | Connected to queue: [yellow]{self.queue}[/yellow]")
 
-    def on_request(self, ch, method, props, body):
-        """Handle incoming RabbitMQ requests"""
+    def retry_count(self, props):
+        """Failed attempts so far, carried in the x-retry-count header"""
+        return int((props.headers or {}).get('x-retry-count', 0))
+
+    def delivery_count(self, props):
+        """
+        Deliveries of this message counted by the broker: x-delivery-count on
+        quorum queues, x-death entries once it went through a dead-letter
+        exchange. 0 on classic queues, which keep no count.
+        """
+        headers = props.headers or {}
+        deaths = sum(int(death.get('count', 0)) for death in headers.get('x-death') or [] if isinstance(death, dict))
+        return max(int(headers.get('x-delivery-count', 0)), deaths)
+
+    def run_guarded(self, func, *args, timeout_scale=1, **kwargs):
+        """Run model work under the watchdog when enabled, inline otherwise"""
+        if self.watchdog is None:
+            return func(*args, **kwargs)
+        return self.watchdog.run(func, *args, timeout=self.watchdog.timeout * timeout_scale, **kwargs)
+
+    def retry_or_dead_letter(self, ch, method, props, body, reason):
+        """
+        Record a failed attempt: requeue the message with x-retry-count + 1, or
+        once `max_retries` is exhausted move it to the dead-letter queue and
+        reply with an error so the caller is not left waiting.
+        """
+        attempts = self.retry_count(props) + 1
+        # Keep every property of the request (type, timestamp, message_id, ...), only the headers change
+        properties = copy.copy(props)
+        properties.headers = {**(props.headers or {}), 'x-retry-count': attempts, 'x-last-error': str(reason)[:500]}
+
+        if attempts <= self.watchdog_config.get('max_retries', 2):
+            console.print(f"[bold yellow]WATCHDOG[/bold yellow] | Retrying {self.request_id(props)} (attempt {attempts + 1}): {reason}")
+            ch.basic_publish(exchange='', routing_key=self.queue, properties=properties, body=body)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        console.print(f"[bold red]WATCHDOG[/bold red] | Dead-lettering {self.request_id(props)} after {attempts} attempts: {reason}")
+        # The dead-letter queue is durable: make the parked message survive a broker restart too
+        properties.delivery_mode = pika.DeliveryMode.Persistent.value
+        ch.basic_publish(exchange='', routing_key=self.dead_letter_queue, properties=properties, body=body)
+        self.reply(ch, method, props, VerificationResult.failure(f"Processing failed after {attempts} attempts: {reason}"))
+
+    def message_key(self, props):
+        """Identity of a request across redeliveries and retries"""
+        return props.correlation_id or self.request_id(props)
+
+    def requeue_redelivered(self, ch, method, props, body):
+        """
+        A redelivered message was unacked when its consumer went away. Count
+        that as a failed attempt, so a crash loop ends in the dead-letter
+        queue, only when the journal shows a worker died while processing it.
+        Messages that were only prefetched when a worker was scaled down,
+        restarted or lost its connection are processed normally.
+
+        When the journal cannot tell (no mark on this host, a mark from another
+        host), a message redelivered more than `max_redeliveries` times, by the
+        broker's count or this host's, is counted as a failed attempt instead.
+        Returns True when the delivery was handled here.
+        """
+        if self.watchdog is None or not method.redelivered:
+            return False
+        key = self.message_key(props)
+        if self.journal.crashed(key):
+            reason = "Redelivered after consumer failure"
+        else:
+            redeliveries = max(self.delivery_count(props), self.journal.redelivered(key))
+            if redeliveries <= self.watchdog_config.get('max_redeliveries', 5):
+                return False
+            reason = f"Redelivered {redeliveries} times"
+        self.journal.clear([key])
+        self.retry_or_dead_letter(ch, method, props, body, reason)
+        return True
+
+    @contextmanager
+    def in_flight(self, props_list):
+        """Journal the deliveries while they are processed (watchdog only)"""
+        if self.journal is None:
+            yield
+            return
+        keys = [self.message_key(props) for props in props_list]
+        self.journal.mark(keys)
         try:
-            json_body = json.loads(body)
-            console.print(f"[bold cyan]REQUEST[/bold cyan] | Received: [white]{json_body.get('file', 'Unknown')}[/white]")
-
-            if 'file' not in json_body and 'files' not in json_body:
-                response = json.dumps({
-                    'OK': False,
-                    'error': 'Missing required "file" or "files" field in request'
-                })
-            elif 'files' in json_body:
-                response = json.dumps({
-                    'OK': False,
-                    'error': 'Batch processing not supported'
-                })
-            else:
-                response = self.model_handler.process_image(
-                    file_path=json_body['file']
-                )
-                result = json.loads(response)
-                status = "Success" if result.get('OK') else f"Error: {result.get('error', 'Unknown')}"
-                console.print(f"[bold blue]REQUEST[/bold blue] | {status}")
+            yield
+        finally:
+            self.journal.clear(keys)
+
+    def stop_if_hung(self, error):
+        """
+        A timed-out call keeps running on its abandoned thread. Stop consuming
+        so main.py exits and the supervisor (or container) starts a clean worker.
+        """
+        if isinstance(error, WatchdogTimeout) and self.watchdog_config.get('exit_on_timeout', True):
+            console.print("[bold red]WATCHDOG[/bold red] | Stopping consumer for restart")
+            self.restart_required = True
+            self.channel.stop_consuming()
+
+    def is_cancelled(self, props):
+        """
+        A caller that can cancel (`cancellable` header, e.g. a batch upload in
+        first-passing mode) deletes its exclusive reply queue when it gives up.
+        Probe for the queue on a separate channel, since a failed passive
+        declare closes the channel it runs on.
+        """
+        if not (props.headers or {}).get('cancellable') or not props.reply_to:
+            return False
+        try:
+            if self.probe_channel is None or not self.probe_channel.is_open:
+                self.probe_channel = self.connection.channel()
+            self.probe_channel.queue_declare(queue=props.reply_to, passive=True)
+            return False
+        except pika.exceptions.ChannelClosedByBroker:
+            self.probe_channel = None
+            return True
+
+    def skip_cancelled(self, ch, method, props):
+        """Ack a request whose caller is gone without processing it. Returns True when skipped."""
+        if not self.is_cancelled(props):
+            return False
+        console.print(f"[bold yellow]REQUEST[/bold yellow] | Skipping cancelled request {self.request_id(props)}")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return True
+
+    def queue_depth(self):
+        """Messages ready in the queue, probed at most every depth_probe_interval_ms"""
+        if self.scheduler is not None:
+            return self.scheduler.queue_depth()
+        interval = self.model_handler.config.get('degraded', {}).get('depth_probe_interval_ms', 1000) / 1000.0
+        now = time.monotonic()
+        if now - self._depth_checked_at >= interval:
+            try:
+                self._depth = self.channel.queue_declare(queue=self.queue, passive=True).method.message_count
+            except Exception as e:
+                console.print(f"[bold yellow]DEGRADED[/bold yellow] | Queue depth probe failed: {e}")
+                self._depth = 0
+            self._depth_checked_at = now
+        return self._depth
+
+    def degraded_mode(self):
+        """Whether the next request runs with the degraded profile (config reloaded by the model handler)"""
+        config = self.model_handler.config.get('degraded', {})
+        if not config:
+            return False
+        self.degradation.configure(config)
+        if self.degradation.mode != 'auto':
+            return self.degradation.update(0)
+        return self.degradation.update(self.queue_depth())
 
+    def request_id(self, props):
+        """request_id sent by the producer in the AMQP headers, if any"""
+        return (props.headers or {}).get('request_id')
+
+    def start_trace(self, props):
+        """
+        Continue the producer's trace (traceparent header) for one delivery.
+        The local root starts when the message was enqueued, so the time spent
+        waiting in the queue is its first span and counts towards the slow
+        threshold; clocks of both hosts are assumed to be in sync.
+        """
+        headers = props.headers or {}
+        received = time.time()
+        enqueued_at = headers.get('enqueued_at')
+        start = min(enqueued_at, received) if isinstance(enqueued_at, (int, float)) else received
+        trace = self.tracer.start_trace(
+            "consume",
+            traceparent=headers.get('traceparent'),
+            start=start,
+            queue=self.queue,
+            request_id=headers.get('request_id')
+        )
+        trace.add_span("queue_wait", start=start, end=received)
+        return trace
+
+    def parse_request(self, props, body):
+        """
+        Decode a request body.
+        Returns (file_path, None) for a valid request or (None, VerificationResult) with the error.
+        """
+        try:
+            json_body = decode(body, props.content_type)
         except Exception as e:
             console.print(f"[bold red]REQUEST[/bold red] | Processing error: {str(e)}")
-            response = json.dumps({
-                'OK': False,
-                'error': str(e)
-            })
+            return None, VerificationResult.failure(str(e))
+
+        console.print(f"[bold cyan]REQUEST[/bold cyan] | Received: [white]{json_body.get('file', 'Unknown')}[/white]")
 
+        if 'file' not in json_body and 'files' not in json_body:
+            return None, VerificationResult.failure('Missing required "file" or "files" field in request')
+        if 'files' in json_body:
+            return None, VerificationResult.failure('Batch processing not supported')
+        return json_body['file'], None
+
+    def reply(self, ch, method, props, result):
+        """Publish the result to the caller's reply queue and ack the request"""
+        # Reply in the encoding the client used, JSON if it is unknown
+        content_type = negotiate(props.content_type)
         ch.basic_publish(
             exchange='',
             routing_key=props.reply_to,
-            properties=pika.BasicProperties(correlation_id=props.correlation_id),
-            body=response
+            properties=pika.BasicProperties(
+                correlation_id=props.correlation_id,
+                content_type=content_type,
+                type='result'
+            ),
+            body=encode(result.to_dict(), content_type)
         )
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
+    def progress_publisher(self, ch, props):
+        """
+        Callback publishing per-check progress events to the reply queue,
+        or None when the client did not ask for progress.
+        """
+        if not (props.headers or {}).get('progress') or not props.reply_to:
+            return None
+        content_type = negotiate(props.content_type)
+
+        def publish(event):
+            ch.basic_publish(
+                exchange='',
+                routing_key=props.reply_to,
+                properties=pika.BasicProperties(
+                    correlation_id=props.correlation_id,
+                    content_type=content_type,
+                    type='progress'
+                ),
+                body=encode(event, content_type)
+            )
+        if self.watchdog is not None:
+            # Checks run on the watchdog's worker thread, pika is not thread-safe
+            return lambda event: self.watchdog.call_soon(lambda: publish(event))
+        return publish
+
+    def log_result(self, result):
+        status = "Success" if result.ok else f"Error: {result.error or 'Unknown'}"
+        console.print(f"[bold blue]REQUEST[/bold blue] | {status}")
+
+    def on_request(self, ch, method, props, body):
+        """Handle incoming RabbitMQ requests"""
+        if self.skip_cancelled(ch, method, props):
+            return
+        if self.requeue_redelivered(ch, method, props, body):
+            return
+        self.handle_request(ch, method, props, body)
+
+    def handle_request(self, ch, method, props, body):
+        if self.restart_required:
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return
+        with self.in_flight([props]):
+            self._handle_request(ch, method, props, body)
+
+    def _handle_request(self, ch, method, props, body):
+        trace = self.start_trace(props)
+        error = None
+        file_path, result = self.parse_request(props, body)
+        if file_path is not None:
+            try:
+                with stage(trace, "process"):
+                    result = self.run_guarded(
+                        self.model_handler.process_image,
+                        file_path=file_path,
+                        request_id=self.request_id(props),
+                        on_check=self.progress_publisher(ch, props),
+                        trace=trace,
+                        degraded=self.degraded_mode()
+                    )
+                self.degradation.observe(result.duration_ms)
+                self.log_result(result)
+            except Exception as e:
+                console.print(f"[bold red]REQUEST[/bold red] | Processing error: {str(e)}")
+                if self.watchdog is not None:
+                    trace.finish(error=str(e))
+                    self.retry_or_dead_letter(ch, method, props, body, e)
+                    self.stop_if_hung(e)
+                    return
+                result = VerificationResult.failure(str(e))
+                error = str(e)
+
+        with stage(trace, "reply"):
+            self.reply(ch, method, props, result)
+        trace.finish(error=error, ok=result.ok)
+
+    def process_batch(self, deliveries):
+        """Flush callback for the batch scheduler: one reply per delivery"""
+        deliveries = [delivery for delivery in deliveries if not self.skip_cancelled(*delivery[:3])]
+        deliveries = [delivery for delivery in deliveries if not self.requeue_redelivered(*delivery)]
+        if self.watchdog is not None:
+            # Messages that already failed once run alone, a poison image cannot take a batch down again
+            for delivery in [d for d in deliveries if self.retry_count(d[2]) > 0]:
+                self.handle_request(*delivery)
+            deliveries = [d for d in deliveries if self.retry_count(d[2]) == 0]
+        if self.restart_required:
+            for ch, method, _, _ in deliveries:
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return
+
+        results = [None] * len(deliveries)
+        traces = [self.start_trace(props) for _, _, props, _ in deliveries]
+        pending = []
+        for i, (ch, method, props, body) in enumerate(deliveries):
+            file_path, results[i] = self.parse_request(props, body)
+            if file_path is not None:
+                pending.append((i, file_path, self.request_id(props), self.progress_publisher(ch, props)))
+
+        with self.in_flight([deliveries[i][2] for i, _, _, _ in pending]):
+            self._process_pending(deliveries, results, traces, pending)
+
+    def _process_pending(self, deliveries, results, traces, pending):
+        """Run the parsed requests of a batch, then reply to every delivery"""
+        error = None
+        if pending:
+            started = time.time()
+            try:
+                batch_results = self.run_guarded(
+                    self.model_handler.process_batch,
+                    [file_path for _, file_path, _, _ in pending],
+                    [request_id for _, _, request_id, _ in pending],
+                    [on_check for _, _, _, on_check in pending],
+                    [traces[i] for i, _, _, _ in pending],
+                    timeout_scale=len(pending),
+                    degraded=self.degraded_mode()
+                )
+            except Exception as e:
+                console.print(f"[bold red]REQUEST[/bold red] | Processing error: {str(e)}")
+                if self.watchdog is not None:
+                    # Which image failed is unknown: every message of the batch is retried on its own
+                    failed = {i for i, _, _, _ in pending}
+                    for i, delivery in enumerate(deliveries):
+                        if i in failed:
+                            traces[i].finish(error=str(e))
+                            self.retry_or_dead_letter(*delivery, e)
+                        else:
+                            self.reply(*delivery[:3], results[i])
+                            traces[i].finish(ok=results[i].ok)
+                    self.stop_if_hung(e)
+                    return
+                batch_results = [VerificationResult.failure(str(e))] * len(pending)
+                error = str(e)
+            for (i, _, _, _), result in zip(pending, batch_results):
+                traces[i].add_span("process", start=started, end=time.time(), attributes={"batch_size": len(pending)})
+                self.degradation.observe(result.duration_ms)
+                self.log_result(result)
+                results[i] = result
+
+        for (ch, method, props, body), result, trace in zip(deliveries, results, traces):
+            with stage(trace, "reply"):
+                self.reply(ch, method, props, result)
+            trace.finish(error=error, ok=result.ok)
+
     def start_consuming(self):
         """Start consuming messages"""
         self.channel.basic_consume(
             queue=self.queue,
-            on_message_callback=self.on_request
+            on_message_callback=self.scheduler.on_message if self.scheduler else self.on_request
         )
         console.print("[bold yellow]RABBITMQ[/bold yellow] | Waiting for messages...")
         self.channel.start_consuming()
 
     def close(self):
         """Close the connection"""
+        if self.journal is not None:
+            self.journal.release()
         if self.connection and not self.connection.is_closed:
             self.connection.close()
-            console.print("[bold green]RABBITMQ[/bold green] | Connection closed") 
\ No newline at end of file
+            console.print("[bold green]RABBITMQ[/bold green] | Connection closed")
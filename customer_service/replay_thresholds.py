@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import argparse
+import time
+import yaml
+import numpy as np
+
+from rich.console import Console
+from rich.table import Table
+
+from metrics_store import CHECK_COLUMNS, METRIC_COLUMNS
+
+# Initialize Rich Console
+console = Console()
+
+
+def load_columns(db_path, since=None):
+    """
+    Load the metrics table into one float array per column (NULL -> NaN).
+    Rows verified with the degraded profile are left out: the optional checks
+    it skips have no metrics and would replay as failures.
+    """
+    conn = sqlite3.connect(db_path)
+    names = ["detected", "ok"] + METRIC_COLUMNS + CHECK_COLUMNS
+    query = f"SELECT {', '.join(names)} FROM request_metrics WHERE degraded = 0"
+    params = ()
+    if since is not None:
+        query += " AND created_at >= ?"
+        params = (since,)
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, len(names))
+    return {name: data[:, i] for i, name in enumerate(names)}
+
+
+def evaluate(columns, th):
+    """
+    Re-run every threshold comparison of the pipeline over the stored metrics.
+    Mirrors the logic in func/: a missing metric (NaN) means the check errored
+    and fails, except brightness_diff where it means "no background".
+    """
+    with np.errstate(invalid="ignore"):
+        diff = columns["brightness_diff"]
+        verdicts = {
+            "check_face_min_size": (columns["face_w"] > th["face_size"]) & (columns["face_h"] > th["face_size"]),
+            "check_lightpol": (
+                (columns["face_brightness"] >= th["dark_threshold"]) &
+                (columns["face_brightness"] <= th["bright_threshold"]) &
+                (np.isnan(diff) | (diff <= th["diff_threshold"])) &
+                ~np.isnan(columns["face_brightness"])
+            ),
+            "check_face_blur": columns["laplacian_var"] >= th["blur"],
+            "check_head_fully": (columns["head_top_margin"] >= th["head_fully_th"]) & (columns["head_chin_margin"] >= th["head_fully_th"]),
+            "check_head_pose": (
+                (columns["yaw"] >= th["left_th"]) & (columns["yaw"] <= th["right_th"]) &
+                (columns["pitch"] >= th["down_th"]) & (columns["pitch"] <= th["up_th"]) &
+                (columns["roll"] >= th["til_left_th"]) & (columns["roll"] <= th["til_right_th"])
+            ),
+            "check_eye": (columns["ear_left"] > th["EAR_THRESHOLD"]) & (columns["ear_right"] > th["EAR_THRESHOLD"]),
+        }
+
+    detected = columns["detected"] == 1
+    ok = detected.copy()
+    for name in CHECK_COLUMNS:
+        verdicts[name] &= detected
+        ok &= verdicts[name]
+    return verdicts, ok
+
+
+def main():
+    base_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Replay a candidate threshold set against stored check metrics")
+    parser.add_argument("--config", default=os.path.join(base_dir, "config", "config.yml"), help="Candidate config.yml")
+    parser.add_argument("--db", default=None, help="Metrics database (defaults to metrics_store.path from the config)")
+    parser.add_argument("--since-hours", type=float, default=None, help="Only replay rows newer than this many hours")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+    db_path = args.db or os.path.join(base_dir, config.get("metrics_store", {}).get("path", "metrics/metrics.db"))
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+
+    started = time.perf_counter()
+    columns = load_columns(db_path, since)
+    loaded = time.perf_counter()
+    verdicts, ok = evaluate(columns, config["threshold"])
+    finished = time.perf_counter()
+
+    total = len(ok)
+    if total == 0:
+        console.print("[bold yellow]REPLAY[/bold yellow] | No rows to replay")
+        return
+
+    table = Table(title=f"Replay of {os.path.basename(args.config)} over {total:,} requests")
+    table.add_column("Check")
+    table.add_column("Stored pass %", justify="right")
+    table.add_column("Replay pass %", justify="right")
+    table.add_column("Newly failing", justify="right")
+    table.add_column("Newly passing", justify="right")
+
+    for name in CHECK_COLUMNS + ["overall"]:
+        stored = (columns["ok"] == 1) if name == "overall" else (columns[name] == 1)
+        replay = ok if name == "overall" else verdicts[name]
+        table.add_row(
+            name,
+            f"{stored.mean() * 100:.2f}",
+            f"{replay.mean() * 100:.2f}",
+            f"{int(np.sum(stored & ~replay)):,}",
+            f"{int(np.sum(~stored & replay)):,}",
+        )
+
+    console.print(table)
+    console.print(f"[bold green]REPLAY[/bold green] | Loaded in {loaded - started:.2f}s, evaluated in {(finished - loaded) * 1000:.1f}ms")
+    console.print("[bold yellow]REPLAY[/bold yellow] | Note: 'margin' changes the measured face region and cannot be replayed")
+
+
+if __name__ == "__main__":
+    main()
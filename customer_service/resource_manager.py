@@ -0,0 +1,185 @@
+"""
+Per-worker CPU budgets for the libraries that spawn their own thread pools
+(OpenCV, BLAS/OpenMP behind NumPy, the TFLite runtime inside MediaPipe).
+MediaPipe's solutions API has no thread setting, its pools size themselves
+from the machine, so for it the budget is enforced by CPU affinity.
+
+Nothing heavy is imported here: the environment part must run before NumPy,
+OpenCV or MediaPipe are first imported, since BLAS and OpenMP size their pools
+at load time.
+"""
+import os
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import yaml
+from rich.console import Console
+
+# Initialize Rich Console
+console = Console()
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "config.yml")
+
+# Read once by the BLAS / OpenMP runtimes when they are loaded
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+# Set by the supervisor for each worker it starts
+WORKER_THREADS_ENV = "WORKER_THREADS"
+WORKER_CPUS_ENV = "WORKER_CPUS"
+
+
+@dataclass
+class ResourcePlan:
+    workers: int
+    threads_per_worker: int
+    cpu_sets: List[List[int]] = field(default_factory=list)
+
+    def cpus_for(self, slot: int) -> Optional[List[int]]:
+        if not self.cpu_sets:
+            return None
+        return self.cpu_sets[slot % len(self.cpu_sets)]
+
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on (affinity mask, e.g. a container cpuset)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_quota() -> Optional[float]:
+    """CPU limit from the cgroup (v2 cpu.max or v1 cfs quota), None when unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def usable_cpu_count() -> int:
+    count = len(available_cpus())
+    quota = cpu_quota()
+    if quota is not None:
+        count = min(count, max(1, math.floor(quota)))
+    return count
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            low, high = part.split("-")
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def format_cpu_list(cpus: List[int]) -> str:
+    return ",".join(str(cpu) for cpu in cpus)
+
+
+def plan(config: dict, workers: Optional[int] = None) -> ResourcePlan:
+    """
+    Split the usable cores between workers.
+
+    `threads_per_worker: 0` picks it from the core count: the pipeline works
+    on one image at a time and most stages are short, so many single- or
+    dual-threaded workers scale better than a few wide ones. In `auto` mode
+    the worker count is cores // threads; in `manual` mode `workers` is kept.
+    """
+    cpus = available_cpus()
+    usable = usable_cpu_count()
+    threads = int(config.get("threads_per_worker", 0)) or (1 if usable < 8 else 2)
+    threads = max(1, min(threads, usable))
+
+    if config.get("mode", "off") == "auto":
+        workers = max(1, usable // threads)
+    elif workers is None:
+        workers = 1
+
+    cpu_sets = []
+    if config.get("pin_cpus", False):
+        # Disjoint sets while cores last, then reuse them round-robin
+        for slot in range(max(1, len(cpus) // threads)):
+            cpu_sets.append(cpus[slot * threads:(slot + 1) * threads])
+    return ResourcePlan(workers=workers, threads_per_worker=threads, cpu_sets=cpu_sets)
+
+
+def worker_env(threads: int, cpus: Optional[List[int]] = None) -> dict:
+    """Environment for a worker process started with this budget (applied by apply_environment)"""
+    env = {WORKER_THREADS_ENV: str(threads)}
+    if cpus:
+        env[WORKER_CPUS_ENV] = format_cpu_list(cpus)
+    return env
+
+
+def load_resource_config() -> dict:
+    try:
+        with open(CONFIG_PATH, "r") as file:
+            return (yaml.safe_load(file) or {}).get("resources", {})
+    except OSError:
+        return {}
+
+
+def apply_environment() -> Optional[int]:
+    """
+    Apply this worker's budget before the native libraries are loaded:
+    thread env vars and CPU affinity. Uses WORKER_THREADS / WORKER_CPUS when
+    started by the supervisor, the `resources` config section otherwise.
+    A worker started on its own only applies `manual` budgets and is never
+    pinned: `auto` splits the cores between the supervisor's workers, and a
+    lone worker cannot know which cores its siblings use.
+    Returns the thread budget, or None when budgeting is off.
+    """
+    threads = os.getenv(WORKER_THREADS_ENV)
+    cpus = os.getenv(WORKER_CPUS_ENV)
+    if threads is None:
+        config = load_resource_config()
+        if config.get("mode", "off") != "manual":
+            return None
+        threads = plan(config).threads_per_worker
+    threads = int(threads)
+
+    for var in THREAD_ENV_VARS:
+        # Variables set explicitly by the operator win
+        os.environ.setdefault(var, str(threads))
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, parse_cpu_list(cpus))
+        except OSError as e:
+            console.print(f"[bold yellow]RESOURCES[/bold yellow] | Could not pin to CPUs {cpus}: {e}")
+            cpus = None
+    console.print(f"[bold green]RESOURCES[/bold green] | {threads} thread(s) per library" + (f", CPUs {cpus}" if cpus else ""))
+    return threads
+
+
+def apply_runtime_limits(threads: Optional[int]):
+    """Limits that need the library loaded (OpenCV's own pool)"""
+    if threads is None:
+        return
+    import cv2
+    cv2.setNumThreads(threads)
@@ -0,0 +1,55 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class VerificationResult:
+    """
+    Result of a single verification, passed in-process between the pipeline
+    and the queue handler. It is only turned into a wire payload once, right
+    before the reply is published.
+    """
+    ok: bool
+    error: Optional[str] = None
+    align_face: Optional[str] = None
+    bbox: Optional[Tuple[int, int, int, int]] = None
+    norm_box: Optional[Tuple[float, float, float, float]] = None
+    # Near-duplicate request_ids from the hash index (None when it is disabled)
+    duplicates: Optional[List[dict]] = None
+    # True when the overload (degraded) pipeline profile produced this verdict
+    degraded: bool = False
+    # Checks the degraded profile left out, so they have no verdict
+    skipped_checks: Optional[List[str]] = None
+    # Kept in-process (metrics store, logging), not sent on the wire
+    request_id: Optional[str] = None
+    metrics: dict = field(default_factory=dict)
+    checks: dict = field(default_factory=dict)
+    duration_ms: Optional[float] = None
+    phash: Optional[int] = None
+
+    @classmethod
+    def failure(cls, error: str, **kwargs) -> "VerificationResult":
+        return cls(ok=False, error=error, **kwargs)
+
+    def to_dict(self) -> dict:
+        """Build the reply payload (same keys as the original JSON response)"""
+        if not self.ok:
+            payload = {'OK': False, 'error': self.error}
+            self._add_degraded(payload)
+            return payload
+        payload = {
+            'OK': True,
+            'align_face': self.align_face,
+            'bbox': self.bbox,
+            'norm_box': self.norm_box
+        }
+        if self.duplicates is not None:
+            payload['duplicates'] = self.duplicates
+        self._add_degraded(payload)
+        return payload
+
+    def _add_degraded(self, payload):
+        if self.degraded:
+            payload['degraded'] = True
+        if self.skipped_checks:
+            payload['skipped_checks'] = self.skipped_checks
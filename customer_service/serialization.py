@@ -0,0 +1,42 @@
+import json
+from typing import Optional
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, JSON is always available
+    msgpack = None
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+
+
+def supported_content_types() -> list:
+    """Content types this process can encode and decode, preferred first"""
+    if msgpack is not None:
+        return [CONTENT_TYPE_MSGPACK, CONTENT_TYPE_JSON]
+    return [CONTENT_TYPE_JSON]
+
+
+def negotiate(content_type: Optional[str]) -> str:
+    """
+    Pick the reply content type for a request.
+    The reply uses the same encoding as the request when we support it,
+    otherwise (or when the header is missing) it falls back to JSON.
+    """
+    if content_type in supported_content_types():
+        return content_type
+    return CONTENT_TYPE_JSON
+
+
+def encode(payload: dict, content_type: str) -> bytes:
+    if content_type == CONTENT_TYPE_MSGPACK and msgpack is not None:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload).encode('utf-8')
+
+
+def decode(body: bytes, content_type: Optional[str]) -> dict:
+    if content_type == CONTENT_TYPE_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Received msgpack payload but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import math
+import time
+import signal
+import sqlite3
+import argparse
+import threading
+import subprocess
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pika
+import yaml
+from dotenv import load_dotenv
+from rich.console import Console
+
+import resource_manager
+
+load_dotenv()
+
+# Initialize Rich Console
+console = Console()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class AmqpDepthProbe:
+    """Queue depth and consumer count through a passive queue_declare"""
+
+    def __init__(self, rabbitmq_url, queue):
+        self.rabbitmq_url = rabbitmq_url
+        self.queue = queue
+        self.connection = None
+        self.channel = None
+
+    def sample(self):
+        if self.connection is None or self.connection.is_closed:
+            self.connection = pika.BlockingConnection(pika.URLParameters(self.rabbitmq_url))
+            self.channel = self.connection.channel()
+        declare = self.channel.queue_declare(queue=self.queue, passive=True)
+        return declare.method.message_count, declare.method.consumer_count
+
+    def close(self):
+        if self.connection and not self.connection.is_closed:
+            self.connection.close()
+
+
+class ManagementApiProbe:
+    """
+    Queue depth from the RabbitMQ management HTTP API (/api/queues/{vhost}/{queue}).
+    Any service answering the same JSON shape can stand in for it locally.
+    """
+
+    def __init__(self, api_url, queue, vhost="/", user=None, password=None):
+        self.url = f"{api_url.rstrip('/')}/api/queues/{urllib.parse.quote(vhost, safe='')}/{urllib.parse.quote(queue, safe='')}"
+        self.auth = None
+        if user is not None:
+            password_mgr = urllib.request.HTTPPasswordMgrWithDefaultRealm()
+            password_mgr.add_password(None, self.url, user, password or "")
+            self.auth = urllib.request.HTTPBasicAuthHandler(password_mgr)
+
+    def sample(self):
+        opener = urllib.request.build_opener(*([self.auth] if self.auth else []))
+        with opener.open(self.url, timeout=5) as response:
+            data = json.load(response)
+        return data.get("messages_ready", 0), data.get("consumers", 0)
+
+    def close(self):
+        pass
+
+
+def recent_latency_p95(db_path, window_seconds):
+    """p95 processing latency (ms) of the last `window_seconds`, from the metrics store"""
+    if not db_path or not os.path.exists(db_path):
+        return None
+    try:
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(
+            "SELECT duration_ms FROM request_metrics WHERE created_at >= ? AND duration_ms IS NOT NULL",
+            (time.time() - window_seconds,)
+        ).fetchall()
+        conn.close()
+    except sqlite3.Error:
+        return None
+    if not rows:
+        return None
+    return float(np.percentile(np.array(rows, dtype=np.float64), 95))
+
+
+class ScalingPolicy:
+    """
+    Decides the worker count from queue depth and latency.
+
+    - Scale up as soon as the backlog needs more workers than we have
+      (ceil(depth / target_depth_per_worker)), or by one worker while p95
+      latency is above target and messages are waiting.
+    - Scale down only when the backlog would also fit in fewer workers at
+      `scale_down_ratio` of their target load (hysteresis band).
+    - Each direction has its own cooldown since the last change.
+    """
+
+    def __init__(self, min_workers=1, max_workers=4, target_depth_per_worker=8, target_latency_ms=None,
+                 scale_down_ratio=0.5, scale_up_cooldown_seconds=15, scale_down_cooldown_seconds=120):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.target_depth_per_worker = target_depth_per_worker
+        self.target_latency_ms = target_latency_ms
+        self.scale_down_ratio = scale_down_ratio
+        self.scale_up_cooldown = scale_up_cooldown_seconds
+        self.scale_down_cooldown = scale_down_cooldown_seconds
+        self.last_change = 0.0
+
+    def clamp(self, workers):
+        return max(self.min_workers, min(self.max_workers, workers))
+
+    def decide(self, current, depth, latency_p95_ms=None, now=None):
+        now = time.monotonic() if now is None else now
+        wanted = math.ceil(depth / self.target_depth_per_worker)
+        if self.target_latency_ms and latency_p95_ms and latency_p95_ms > self.target_latency_ms and depth > 0:
+            wanted = max(wanted, current + 1)
+        wanted = self.clamp(wanted)
+
+        if wanted > current:
+            if now - self.last_change >= self.scale_up_cooldown:
+                self.last_change = now
+                return wanted
+        elif wanted < current:
+            # Keep workers until the backlog fits comfortably in fewer of them
+            relaxed = self.clamp(math.ceil(depth / (self.target_depth_per_worker * self.scale_down_ratio)))
+            if relaxed < current and now - self.last_change >= self.scale_down_cooldown:
+                self.last_change = now
+                return max(wanted, relaxed)
+        return current
+
+
+class Supervisor:
+    """Keeps `desired` consumer processes (main.py) running and exposes the scaling state"""
+
+    def __init__(self, probe, policy, worker_args, poll_interval=5, latency_db=None, latency_window=300, resource_plan=None):
+        self.probe = probe
+        self.policy = policy
+        self.worker_args = worker_args
+        self.resource_plan = resource_plan
+        self.slots = {}
+        self.poll_interval = poll_interval
+        self.latency_db = latency_db
+        self.latency_window = latency_window
+        self.workers = []
+        self.running = True
+        self.state = {
+            "workers_current": 0,
+            "workers_desired": policy.min_workers,
+            "queue_depth": 0,
+            "queue_consumers": 0,
+            "latency_p95_ms": None,
+        }
+        self.lock = threading.Lock()
+
+    def spawn_worker(self):
+        env = None
+        slot = min(set(range(len(self.workers) + 1)) - set(self.slots.values()))
+        if self.resource_plan is not None:
+            # Each worker gets its thread budget and, when pinning, its own CPU set
+            cpus = self.resource_plan.cpus_for(slot)
+            env = {**os.environ, **resource_manager.worker_env(self.resource_plan.threads_per_worker, cpus)}
+        process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "main.py"), *self.worker_args], cwd=BASE_DIR, env=env)
+        self.workers.append(process)
+        self.slots[process.pid] = slot
+        console.print(f"[bold green]SUPERVISOR[/bold green] | Started worker pid={process.pid} slot={slot}")
+
+    def stop_worker(self):
+        process = self.workers.pop()
+        self.slots.pop(process.pid, None)
+        process.send_signal(signal.SIGTERM)
+        console.print(f"[bold yellow]SUPERVISOR[/bold yellow] | Stopping worker pid={process.pid}")
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def reap(self):
+        """Forget workers that exited on their own (they are replaced by reconcile)"""
+        alive = []
+        for process in self.workers:
+            if process.poll() is None:
+                alive.append(process)
+            else:
+                console.print(f"[bold red]SUPERVISOR[/bold red] | Worker pid={process.pid} exited with {process.returncode}")
+                self.slots.pop(process.pid, None)
+        self.workers = alive
+
+    def reconcile(self, desired):
+        while len(self.workers) < desired:
+            self.spawn_worker()
+        while len(self.workers) > desired:
+            self.stop_worker()
+
+    def tick(self):
+        self.reap()
+        try:
+            depth, consumers = self.probe.sample()
+        except Exception as e:
+            console.print(f"[bold red]SUPERVISOR[/bold red] | Queue probe failed: {e}")
+            depth, consumers = self.state["queue_depth"], self.state["queue_consumers"]
+        latency = recent_latency_p95(self.latency_db, self.latency_window)
+
+        current = max(len(self.workers), self.policy.min_workers)
+        desired = self.policy.decide(current, depth, latency)
+        if desired != len(self.workers):
+            console.print(f"[bold blue]SUPERVISOR[/bold blue] | depth={depth} p95={latency} workers {len(self.workers)} -> {desired}")
+        self.reconcile(desired)
+
+        with self.lock:
+            self.state.update({
+                "workers_current": len(self.workers),
+                "workers_desired": desired,
+                "queue_depth": depth,
+                "queue_consumers": consumers,
+                "latency_p95_ms": latency,
+            })
+
+    def run(self):
+        self.reconcile(self.policy.min_workers)
+        while self.running:
+            self.tick()
+            time.sleep(self.poll_interval)
+
+    def shutdown(self):
+        self.running = False
+        while self.workers:
+            self.stop_worker()
+        self.probe.close()
+
+    def metrics_text(self):
+        """Scaling state in Prometheus text format, for external orchestrators"""
+        with self.lock:
+            state = dict(self.state)
+        lines = []
+        for name, value in state.items():
+            if value is None:
+                continue
+            lines.append(f"# TYPE face_verification_{name} gauge")
+            lines.append(f"face_verification_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(supervisor, port):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = supervisor.metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    console.print(f"[bold green]SUPERVISOR[/bold green] | Metrics on [cyan]:{port}/metrics[/cyan]")
+    return server
+
+
+def build_probe(config):
+    queue = os.getenv("RABBITMQ_QUEUE")
+    if config.get("probe", "amqp") == "management":
+        return ManagementApiProbe(
+            config.get("management_url", "http://localhost:15672"),
+            queue,
+            vhost=config.get("management_vhost", "/"),
+            user=os.getenv("RABBITMQ_USER"),
+            password=os.getenv("RABBITMQ_PASSWORD"),
+        )
+    rabbitmq_url = os.getenv("RABBITMQ_URL")
+    if rabbitmq_url is None:
+        raise ValueError("RABBITMQ_URL environment variable is not set")
+    return AmqpDepthProbe(rabbitmq_url, queue)
+
+
+def plan_workers(supervisor_config, resources_config):
+    """
+    Upper bound on the worker count and the CPU budget of each worker (None
+    when resources are off). In auto mode the core count caps the configured
+    `max_workers`; it never raises it.
+    """
+    max_workers = supervisor_config.get("max_workers", 4)
+    if resources_config.get("mode", "off") == "off":
+        return max_workers, None
+    resource_plan = resource_manager.plan(resources_config, workers=max_workers)
+    max_workers = min(max_workers, resource_plan.workers)
+    console.print(
+        f"[bold blue]SUPERVISOR[/bold blue] | Up to {max_workers} worker(s) x "
+        f"{resource_plan.threads_per_worker} thread(s) on {resource_manager.usable_cpu_count()} CPU(s)"
+    )
+    return max_workers, resource_plan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Autoscaling supervisor for Face Verification workers")
+    parser.add_argument("--cpu_mode", action="store_true", help="Start workers in CPU mode")
+    args = parser.parse_args()
+
+    with open(os.path.join(BASE_DIR, "config", "config.yml"), "r") as file:
+        config = yaml.safe_load(file)
+    supervisor_config = config.get("supervisor", {})
+    store_config = config.get("metrics_store", {})
+    resources_config = config.get("resources", {})
+
+    max_workers, resource_plan = plan_workers(supervisor_config, resources_config)
+
+    policy = ScalingPolicy(
+        min_workers=min(supervisor_config.get("min_workers", 1), max_workers),
+        max_workers=max_workers,
+        target_depth_per_worker=supervisor_config.get("target_depth_per_worker", 8),
+        target_latency_ms=supervisor_config.get("target_latency_ms"),
+        scale_down_ratio=supervisor_config.get("scale_down_ratio", 0.5),
+        scale_up_cooldown_seconds=supervisor_config.get("scale_up_cooldown_seconds", 15),
+        scale_down_cooldown_seconds=supervisor_config.get("scale_down_cooldown_seconds", 120),
+    )
+    supervisor = Supervisor(
+        build_probe(supervisor_config),
+        policy,
+        worker_args=["--cpu_mode"] if args.cpu_mode else [],
+        poll_interval=supervisor_config.get("poll_interval_seconds", 5),
+        latency_db=os.path.join(BASE_DIR, store_config.get("path", "metrics/metrics.db")) if store_config.get("enabled") else None,
+        latency_window=supervisor_config.get("latency_window_seconds", 300),
+        resource_plan=resource_plan,
+    )
+
+    def handle_signal(signum, frame):
+        console.print("\n[bold yellow]SUPERVISOR[/bold yellow] | Shutdown signal received")
+        supervisor.shutdown()
+        os._exit(0)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    serve_metrics(supervisor, supervisor_config.get("metrics_port", 9105))
+    supervisor.run()
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import PIL.Image
+import pytest
+
+from func.align_func import ffhq_align
+
+EYE_LEFT = [33, 246, 161, 160, 159, 158, 157, 173, 133, 155, 154, 153, 145, 144, 163, 7]
+EYE_RIGHT = [463, 398, 384, 385, 386, 387, 388, 466, 263, 249, 390, 373, 374, 380, 381, 382, 362]
+MOUTH_OUTER = [61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 409, 270, 269, 267, 0, 37, 39, 40, 185]
+
+
+def pil_ffhq_align(img, landmarks, output_size=1024):
+    """The PIL implementation ffhq_align replaced, kept as the reference output"""
+    lm = np.array(landmarks)
+    eye_left = np.mean(lm[EYE_LEFT], axis=0)
+    eye_right = np.mean(lm[EYE_RIGHT], axis=0)
+    eye_avg = (eye_left + eye_right) * 0.5
+    eye_to_eye = eye_right - eye_left
+    mouth_avg = (lm[MOUTH_OUTER][0] + lm[MOUTH_OUTER][10]) * 0.5
+    eye_to_mouth = mouth_avg - eye_avg
+
+    x = eye_to_eye - np.flipud(eye_to_mouth) * [-1, 1]
+    x /= np.hypot(*x)
+    x *= max(np.hypot(*eye_to_eye) * 2.0, np.hypot(*eye_to_mouth) * 1.8)
+    y = np.flipud(x) * [-1, 1]
+    c = eye_avg + eye_to_mouth * 0.1
+    quad = np.stack([c - x - y, c - x + y, c + x + y, c + x - y])
+    qsize = np.hypot(*x) * 2
+
+    pil_img = PIL.Image.fromarray(img)
+    transform_size = 4096
+
+    shrink = int(np.floor(qsize / output_size * 0.5))
+    if shrink > 1:
+        rsize = (int(np.rint(float(pil_img.size[0]) / shrink)), int(np.rint(float(pil_img.size[1]) / shrink)))
+        pil_img = pil_img.resize(rsize, PIL.Image.LANCZOS)
+        quad /= shrink
+        qsize /= shrink
+
+    border = max(int(np.rint(qsize * 0.1)), 3)
+    crop = (int(np.floor(min(quad[:, 0]))), int(np.floor(min(quad[:, 1]))), int(np.ceil(max(quad[:, 0]))), int(np.ceil(max(quad[:, 1]))))
+    crop = (max(crop[0] - border, 0), max(crop[1] - border, 0), min(crop[2] + border, pil_img.size[0]), min(crop[3] + border, pil_img.size[1]))
+    if crop[2] - crop[0] < pil_img.size[0] or crop[3] - crop[1] < pil_img.size[1]:
+        pil_img = pil_img.crop(crop)
+        quad -= crop[0:2]
+
+    pad = (int(np.floor(min(quad[:, 0]))), int(np.floor(min(quad[:, 1]))), int(np.ceil(max(quad[:, 0]))), int(np.ceil(max(quad[:, 1]))))
+    pad = (max(-pad[0] + border, 0), max(-pad[1] + border, 0), max(pad[2] - pil_img.size[0] + border, 0), max(pad[3] - pil_img.size[1] + border, 0))
+    if max(pad) > border - 4:
+        pad = np.maximum(pad, int(np.rint(qsize * 0.3)))
+        padded = np.pad(np.array(pil_img), ((pad[1], pad[3]), (pad[0], pad[2]), (0, 0)), mode='constant', constant_values=0)
+        pil_img = PIL.Image.fromarray(padded)
+        quad += pad[:2]
+
+    pil_img = pil_img.transform((transform_size, transform_size), PIL.Image.QUAD, (quad + 0.5).flatten(), PIL.Image.BILINEAR)
+    if output_size < transform_size:
+        pil_img = pil_img.resize((output_size, output_size), PIL.Image.LANCZOS)
+    return np.array(pil_img)
+
+
+def face_image(scale=1.0, offset=(0, 0)):
+    """Textured RGB image with MediaPipe-indexed eye and mouth landmarks"""
+    rng = np.random.default_rng(0)
+    height, width = int(900 * scale), int(800 * scale)
+    yy, xx = np.mgrid[0:height, 0:width]
+    img = np.stack([xx * 255 / width, yy * 255 / height, 128 + 100 * np.sin(xx / 7) * np.cos(yy / 11)], axis=-1)
+    img = cv2.GaussianBlur((img + rng.normal(0, 20, img.shape)).clip(0, 255).astype(np.uint8), (3, 3), 0)
+
+    landmarks = np.full((478, 2), [400.0, 450.0])
+    landmarks[EYE_LEFT] = [340, 400] + rng.normal(0, [5, 3], (len(EYE_LEFT), 2))
+    landmarks[EYE_RIGHT] = [460, 395] + rng.normal(0, [5, 3], (len(EYE_RIGHT), 2))
+    landmarks[61], landmarks[291] = [360, 520], [445, 525]
+    return img, (landmarks + offset) * scale
+
+
+@pytest.mark.parametrize("scale, offset, output_size", [
+    (1.0, (0, 0), 1024),      # the default output size
+    (3.0, (0, 0), 256),       # a large face: the shrink step runs
+    (1.0, (-250, -300), 512),  # a face at the corner: the pad step runs
+])
+def test_output_matches_the_pil_implementation(scale, offset, output_size):
+    img, landmarks = face_image(scale, offset)
+    expected = pil_ffhq_align(img, landmarks, output_size)
+    aligned = ffhq_align(img, landmarks, output_size)
+
+    assert aligned.shape == expected.shape == (output_size, output_size, 3)
+    diff = np.abs(aligned.astype(int) - expected.astype(int))
+    assert diff.mean() < 1.5
+    assert np.percentile(diff, 99) <= 6
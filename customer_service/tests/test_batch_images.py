@@ -0,0 +1,49 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from result_model import VerificationResult
+
+
+class StubHandler(main.ModelHandler):
+    """ModelHandler with the per-image pipeline replaced, to observe how a batch is run"""
+
+    def __init__(self, workers):
+        self.image_pool = ThreadPoolExecutor(max_workers=workers)
+        self.running = 0
+        self.overlap = 0
+        self.lock = threading.Lock()
+
+    def _process_one(self, file_path, request_id, on_check, trace, profile):
+        with self.lock:
+            self.running += 1
+            self.overlap = max(self.overlap, self.running)
+        try:
+            time.sleep(0.05 if file_path == "slow.jpg" else 0.01)
+            if on_check is not None:
+                on_check({"check": "detect_face", "passed": True, "message": file_path})
+            return VerificationResult(ok=True, align_face=file_path, request_id=request_id)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_images_run_side_by_side_and_keep_their_order():
+    handler = StubHandler(workers=4)
+    paths = ["slow.jpg", "a.jpg", "b.jpg", "c.jpg"]
+    results = handler._process_concurrently(paths, ["r0", "r1", "r2", "r3"], [None] * 4, [None] * 4, {})
+    assert [result.request_id for result in results] == ["r0", "r1", "r2", "r3"]
+    assert handler.overlap > 1
+
+
+def test_progress_is_published_from_the_calling_thread():
+    handler = StubHandler(workers=2)
+    published = []
+
+    def on_check(event):
+        published.append((threading.current_thread(), event["message"]))
+
+    handler._process_concurrently(["a.jpg", "b.jpg"], [None, None], [on_check, on_check], [None, None], {})
+    assert sorted(message for _, message in published) == ["a.jpg", "b.jpg"]
+    assert all(thread is threading.current_thread() for thread, _ in published)
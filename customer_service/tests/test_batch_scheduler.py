@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+from batch_scheduler import BatchScheduler
+
+
+class FakeConnection:
+    def __init__(self):
+        self.timers = []
+
+    def call_later(self, delay, callback):
+        timer = (delay, callback)
+        self.timers.append(timer)
+        return timer
+
+    def remove_timeout(self, timer):
+        self.timers.remove(timer)
+
+
+class FakeChannel:
+    def __init__(self, depth=0):
+        self.depth = depth
+
+    def queue_declare(self, queue, passive):
+        return SimpleNamespace(method=SimpleNamespace(message_count=self.depth))
+
+
+def make_scheduler(depth, **kwargs):
+    batches = []
+    connection = FakeConnection()
+    scheduler = BatchScheduler(
+        connection, FakeChannel(depth), "q", batches.append, depth_probe_interval_ms=0, **kwargs)
+    return scheduler, connection, batches
+
+
+def deliver(scheduler, tag):
+    scheduler.on_message(None, SimpleNamespace(delivery_tag=tag), None, b"")
+
+
+def test_empty_queue_flushes_immediately():
+    scheduler, connection, batches = make_scheduler(depth=0)
+    deliver(scheduler, 1)
+    assert len(batches) == 1 and len(batches[0]) == 1
+    assert connection.timers == []
+
+
+def test_window_grows_with_backlog_up_to_max_wait():
+    scheduler, _, _ = make_scheduler(depth=2, max_batch_size=8, max_wait_ms=40)
+    assert scheduler.window() == 0.04 * 2 / 8
+    scheduler.channel.depth = 100
+    assert scheduler.window() == 0.04
+
+
+def test_full_batch_flushes_without_waiting_for_timer():
+    scheduler, connection, batches = make_scheduler(depth=50, max_batch_size=3)
+    for tag in range(3):
+        deliver(scheduler, tag)
+    assert [len(batch) for batch in batches] == [3]
+    # The pending timer of the first delivery is cancelled by the flush
+    assert connection.timers == []
+
+
+def test_timer_flushes_partial_batch():
+    scheduler, connection, batches = make_scheduler(depth=50, max_batch_size=8)
+    deliver(scheduler, 1)
+    deliver(scheduler, 2)
+    assert batches == []
+    (_, callback), = connection.timers
+    callback()
+    assert [len(batch) for batch in batches] == [2]
+
+
+def test_depth_probe_failure_counts_as_empty_queue():
+    scheduler, _, batches = make_scheduler(depth=0)
+
+    def fail(queue, passive):
+        raise RuntimeError("channel closed")
+    scheduler.channel.queue_declare = fail
+    assert scheduler.queue_depth() == 0
@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+import pytest
+
+from func.buffer_arena import ArenaBudget, BufferArena
+
+MB = 1024 * 1024
+
+
+def test_same_key_reuses_the_buffer():
+    arena = BufferArena(ArenaBudget(10 * MB))
+    first = arena.get("rgb", (10, 10, 3))
+    assert arena.get("rgb", (10, 10, 3)) is first
+    assert arena.get("rgb", (10, 10, 1)) is not first
+    assert arena.get("rgb", (10, 10, 3), dtype=np.float32) is not first
+
+
+def test_zero_clears_a_reused_buffer():
+    arena = BufferArena(ArenaBudget(10 * MB))
+    arena.get("mask", (4, 4)).fill(7)
+    assert not arena.get("mask", (4, 4), zero=True).any()
+
+
+def test_least_recently_used_buffer_is_evicted():
+    arena = BufferArena(ArenaBudget(2 * MB))
+    a = arena.get("a", (MB,))
+    arena.get("b", (MB,))
+    assert arena.get("a", (MB,)) is a  # a is now the most recently used
+    arena.get("c", (MB,))
+    assert set(name for name, _, _ in arena.buffers) == {"a", "c"}
+    assert arena.nbytes == 2 * MB
+
+
+def test_budget_is_shared_between_threads():
+    budget = ArenaBudget(3 * MB)
+    arenas = []
+
+    def work():
+        arena = BufferArena(budget)
+        arena.get("transform", (2 * MB,))
+        arenas.append(arena)
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    assert budget.nbytes() <= 3 * MB
+    # The newest allocation is kept, older arenas gave theirs up
+    assert arenas[-1].nbytes == 2 * MB
+
+
+def test_evicted_buffer_stays_valid_for_its_holder():
+    budget = ArenaBudget(MB)
+    owner, other = BufferArena(budget), BufferArena(budget)
+    held = owner.get("rgb", (MB,))
+    held.fill(3)
+    other.get("rgb", (MB,))
+    assert owner.nbytes == 0
+    assert held.sum() == 3 * MB
+
+
+def test_oversized_buffer_is_still_handed_out():
+    arena = BufferArena(ArenaBudget(MB))
+    assert arena.get("big", (4 * MB,)).nbytes == 4 * MB
+
+
+@pytest.mark.parametrize("max_mb, expected_mb", [(1, 1), (8, 3)])
+def test_configure_trims_to_a_lower_budget(max_mb, expected_mb):
+    budget = ArenaBudget(8 * MB)
+    arena = BufferArena(budget)
+    for name in "abc":
+        arena.get(name, (MB,))
+    budget.configure(max_mb * MB)
+    assert budget.nbytes() == expected_mb * MB
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pika
+import pytest
+
+from rabbitmq_handler import QueueHandler
+
+
+class FakeProbeChannel:
+    def __init__(self, queues):
+        self.queues = queues
+        self.is_open = True
+
+    def queue_declare(self, queue, passive=False):
+        if queue not in self.queues:
+            # A failed passive declare closes the channel, as on a real broker
+            self.is_open = False
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+
+
+class FakeConnection:
+    def __init__(self, queues):
+        self.queues = queues
+        self.channels = 0
+
+    def channel(self):
+        self.channels += 1
+        return FakeProbeChannel(self.queues)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.acked = []
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+
+def props(reply_to="amq.gen-reply", cancellable=True):
+    headers = {"request_id": "req-1"}
+    if cancellable:
+        headers["cancellable"] = True
+    return SimpleNamespace(reply_to=reply_to, correlation_id="corr-1", headers=headers)
+
+
+@pytest.fixture
+def handler():
+    handler = QueueHandler(SimpleNamespace(config={}))
+    handler.connection = FakeConnection({"amq.gen-reply"})
+    return handler
+
+
+def test_live_reply_queue_is_not_cancelled(handler):
+    assert not handler.is_cancelled(props())
+    assert not handler.is_cancelled(props())
+    # The probe channel is reused while it stays open
+    assert handler.connection.channels == 1
+
+
+def test_missing_reply_queue_is_cancelled(handler):
+    assert handler.is_cancelled(props(reply_to="amq.gen-gone"))
+    # The closed probe channel is replaced on the next check
+    assert not handler.is_cancelled(props())
+    assert handler.connection.channels == 2
+
+
+def test_requests_without_the_header_are_never_probed(handler):
+    assert not handler.is_cancelled(props(reply_to="amq.gen-gone", cancellable=False))
+    assert handler.connection.channels == 0
+
+
+def test_skip_cancelled_acks_without_processing(handler):
+    channel = FakeChannel()
+    assert handler.skip_cancelled(channel, SimpleNamespace(delivery_tag=7), props(reply_to="amq.gen-gone"))
+    assert not handler.skip_cancelled(channel, SimpleNamespace(delivery_tag=8), props())
+    assert channel.acked == [7]
@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+import func.check_head_pose as head_pose
+from func.buffer_arena import get_arena
+
+
+class FailingFaceMesh:
+    def __init__(self, **kwargs):
+        pass
+
+    def process(self, image):
+        raise RuntimeError("graph error")
+
+
+def test_arena_buffer_is_writeable_after_face_mesh_error(tmp_path, monkeypatch):
+    path = str(tmp_path / "face.png")
+    cv2.imwrite(path, np.full((32, 48, 3), 100, np.uint8))
+    monkeypatch.setattr(head_pose.mp.solutions, "face_mesh", SimpleNamespace(FaceMesh=FailingFaceMesh))
+
+    with pytest.raises(RuntimeError):
+        head_pose.check_head_pose(path, -0.3, 0.3, -10, 15, -0.1, 0.1)
+
+    rgb = get_arena().get("rgb", (32, 48, 3))
+    assert rgb.flags.writeable
+    cv2.cvtColor(np.zeros((32, 48, 3), np.uint8), cv2.COLOR_BGR2RGB, dst=rgb)
@@ -0,0 +1,123 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+import yaml
+
+import main
+from degraded import DegradationController
+from rabbitmq_handler import QueueHandler
+from result_model import VerificationResult
+
+CONFIG_PATH = os.path.join(os.path.dirname(main.__file__), "config", "config.yml")
+
+
+@pytest.fixture
+def config():
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f)
+
+
+@pytest.fixture
+def shipped(config):
+    return config["degraded"]
+
+
+@pytest.fixture
+def auto(shipped):
+    """The shipped limits with the automatic switch turned on (enter 64 / exit 8, 30 s dwell, 20 samples)"""
+    return DegradationController({**shipped, "mode": "auto"})
+
+
+class DepthProbe:
+    def __init__(self, depth):
+        self.depth = depth
+        self.probes = 0
+
+    def queue_declare(self, queue, passive=False):
+        self.probes += 1
+        return SimpleNamespace(method=SimpleNamespace(message_count=self.depth))
+
+
+def test_shipped_config_keeps_the_full_pipeline_under_any_load(shipped):
+    handler = QueueHandler(SimpleNamespace(config={"degraded": shipped}))
+    handler.channel = DepthProbe(10000)
+    assert not handler.degraded_mode()
+    # Nothing to decide, so the queue is not probed either
+    assert handler.channel.probes == 0
+
+
+@pytest.mark.parametrize("line, mode", [("mode: on", "on"), ("mode: off", "off"), ('mode: "on"', "on")])
+def test_unquoted_yaml_modes_are_understood(line, mode):
+    assert DegradationController(yaml.safe_load(line)).mode == mode
+
+
+def test_auto_mode_follows_the_probed_queue_depth(shipped):
+    handler = QueueHandler(SimpleNamespace(config={"degraded": {**shipped, "mode": "auto"}}))
+    handler.channel = DepthProbe(64)
+    assert handler.degraded_mode()
+    assert handler.channel.probes == 1
+
+
+def test_enters_on_p95_once_enough_samples(auto):
+    for _ in range(19):
+        auto.observe(5000, now=100)
+    assert not auto.update(0, now=100)
+    auto.observe(5000, now=100)
+    assert auto.update(0, now=100)
+    # The samples of the full pipeline are dropped on the switch
+    assert auto.p95(now=100) is None
+
+
+def test_stays_on_for_min_dwell_and_between_the_limits(auto):
+    assert auto.update(64, now=100)
+    assert auto.update(0, now=129)
+    assert auto.update(9, now=130)
+    for _ in range(20):
+        auto.observe(3000, now=130)
+    # p95 between exit and enter: no flapping
+    assert auto.update(0, now=130)
+    for _ in range(400):
+        auto.observe(1000, now=131)
+    assert not auto.update(8, now=131)
+
+
+def test_old_latencies_leave_the_window(auto):
+    for _ in range(20):
+        auto.observe(5000, now=100)
+    assert not auto.update(0, now=161)
+
+
+def test_degraded_reply_names_the_skipped_checks(config, monkeypatch):
+    called = []
+
+    def check(name, passed=True):
+        def run(*args, **kwargs):
+            called.append(name)
+            return passed, f"{name} done", {}
+        return run
+
+    for name in ("check_face_min_size", "check_lightpol", "analyze_single_image", "check_head_pose", "check_eye_status"):
+        monkeypatch.setattr(main, name, check(name))
+    monkeypatch.setattr(main, "check_face_blur", check("check_face_blur", passed=False))
+
+    handler = main.ModelHandler.__new__(main.ModelHandler)
+    handler.config = config
+    handler.check_pool = None
+    profile = {"skip_checks": tuple(config["degraded"]["optional_checks"]), "check_detector": None}
+    detection = (True, "face found", [], (0, 0, 10, 10), (0, 0, 1, 1))
+
+    result = handler._verify("face.jpg", detection, profile)
+    result.degraded = True
+    assert "check_lightpol" not in called and "analyze_single_image" not in called
+    assert result.to_dict() == {
+        "OK": False, "error": "check_face_blur done", "degraded": True,
+        "skipped_checks": ["check_lightpol", "check_head_fully"],
+    }
+
+
+def test_full_pipeline_reply_has_no_degraded_keys():
+    assert VerificationResult(ok=True, align_face="a.png").to_dict() == {
+        "OK": True, "align_face": "a.png", "bbox": None, "norm_box": None
+    }
+    assert VerificationResult(ok=True, degraded=True).to_dict()["degraded"] is True
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+from func.detectors import AutoDetector, Box, DetectorRegistry, FaceDetector, MediaPipeDetector, detect_faces
+from func.get_landmarks import get_lm
+
+
+class FakeDetector(FaceDetector):
+    def __init__(self, name, boxes=(), covers_full_range=False):
+        self.name = name
+        self.boxes = list(boxes)
+        self.covers_full_range = covers_full_range
+        self.calls = 0
+        self.observed = []
+
+    def _detect(self, image):
+        self.calls += 1
+        return list(self.boxes)
+
+    def observe(self, boxes, height, width):
+        self.observed.append(len(boxes))
+
+
+def face(size):
+    return Box(0.1, 0.1, size, size, 0.9)
+
+
+def auto(short_boxes=(), full_boxes=()):
+    return AutoDetector(FakeDetector("short", short_boxes), FakeDetector("full", full_boxes, True),
+                        small_image_size=1280, min_face_scale=0.2, smoothing=0.5)
+
+
+def test_auto_starts_from_the_image_size():
+    detector = auto()
+    assert detector.choose(720, 1280) is detector.short
+    assert detector.choose(3000, 4000) is detector.full
+
+
+def test_auto_follows_the_recent_face_scale():
+    detector = auto()
+    detector.observe([face(0.5)], 3000, 4000)
+    assert detector.choose(3000, 4000) is detector.short
+    detector.observe([face(0.02)], 100, 100)
+    detector.observe([face(0.02)], 100, 100)
+    assert detector.recent_scale < 0.2
+    assert detector.choose(100, 100) is detector.full
+    # Images without a face leave the average alone
+    detector.observe([], 100, 100)
+    assert detector.choose(100, 100) is detector.full
+
+
+def test_auto_retries_a_short_range_miss_without_learning():
+    detector = auto(full_boxes=[face(0.05)])
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    assert detector.detect(image) == [face(0.05)]
+    assert (detector.short.calls, detector.full.calls) == (1, 1)
+    assert detector.recent_scale is None
+
+
+def test_detect_faces_fallback():
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    fallback = FakeDetector("full", [face(0.3)], True)
+    assert detect_faces(image, FakeDetector("short"), fallback=fallback) == [face(0.3)]
+    # A backend that already covers full range is not retried
+    assert detect_faces(image, FakeDetector("yunet", covers_full_range=True), fallback=fallback) == []
+    assert fallback.calls == 1
+
+
+def test_get_lm_reports_each_image_once(tmp_path):
+    path = str(tmp_path / "blank.png")
+    cv2.imwrite(path, np.zeros((64, 64, 3), dtype=np.uint8))
+    detector = FakeDetector("short")
+    fallback = FakeDetector("full", covers_full_range=True)
+    assert get_lm(path, detector=detector, fallback=fallback)[1] == "No faces detected"
+    assert detector.observed == [0]
+    assert fallback.observed == []
+
+
+def test_registry_falls_back_to_full_range(tmp_path):
+    registry = DetectorRegistry({"yunet_model": "missing.onnx"}, str(tmp_path))
+    for name in ("opencv_yunet", "no_such_backend"):
+        detector = registry.get(name)
+        assert isinstance(detector, MediaPipeDetector) and detector.name == "mediapipe_full"
+    assert registry.get("mediapipe_full") is registry.get("mediapipe_full")
+
+
+def test_registry_auto_shares_the_mediapipe_models(tmp_path):
+    registry = DetectorRegistry({"auto": {"min_face_scale": 0.3}}, str(tmp_path))
+    detector = registry.get("auto")
+    assert detector.short is registry.get("mediapipe_short")
+    assert detector.full is registry.get("mediapipe_full")
+    assert detector.min_face_scale == 0.3
+    # A config change rebuilds the backends, anything else keeps them
+    registry.configure({"auto": {"min_face_scale": 0.3}})
+    assert registry.get("auto") is detector
+    registry.configure({"auto": {"min_face_scale": 0.1}})
+    assert registry.get("auto") is not detector
@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from func.get_landmarks import _padded_crop
+
+
+def box(xmin, ymin, width, height):
+    return SimpleNamespace(xmin=xmin, ymin=ymin, width=width, height=height)
+
+
+def test_crop_is_padded_on_every_side():
+    assert _padded_crop(box(0.375, 0.375, 0.25, 0.25), 1000, 1000, 0.5) == (250, 250, 750, 750)
+
+
+def test_crop_is_clipped_to_the_image():
+    assert _padded_crop(box(0.0, 0.75, 0.25, 0.25), 512, 400, 0.5) == (0, 250, 192, 400)
+
+
+def test_crop_rounds_outwards():
+    # Never cut into the face: the near edge rounds down, the far edge up
+    assert _padded_crop(box(0.25, 0.25, 0.25, 0.25), 999, 999, 0.0) == (249, 249, 500, 500)
+
+
+def test_no_padding_keeps_the_box():
+    assert _padded_crop(box(0.25, 0.5, 0.5, 0.25), 800, 400, 0.0) == (200, 200, 600, 300)
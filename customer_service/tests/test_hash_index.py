@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from build_hash_index import duplicate_groups
+from func.perceptual_hash import hamming_distance, perceptual_hash
+from hash_index import HashIndex
+from main import ModelHandler
+from result_model import VerificationResult
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = HashIndex(str(tmp_path / "hashes.db"))
+    yield index
+    index.close()
+
+
+def test_search_within_distance(index):
+    base = 0x0123456789ABCDEF
+    index.add_many([
+        ("same", base, None),
+        ("close", flip(base, 0, 17, 33, 49, 50, 63), None),
+        ("far", flip(base, *range(0, 64, 8)), None),
+    ])
+    assert index.search(base, 6) == [("same", 0), ("close", 6)]
+    assert index.search(base, 6, limit=1) == [("same", 0)]
+    assert index.search(base, 6, exclude="same") == [("close", 6)]
+
+
+def test_finds_matches_with_all_flips_in_one_chunk(index):
+    # Three chunks equal, the fourth 6 bits off: still found through the others
+    base = 0xFFFF0000AAAA5555
+    index.add("moved", flip(base, 0, 1, 2, 3, 4, 5))
+    assert index.search(base, 6) == [("moved", 6)]
+
+
+def test_hashes_above_the_signed_range_round_trip(index):
+    high = (1 << 64) - 1
+    index.add("high", high, "uploads/a_aligned.png")
+    assert index.all_hashes() == [("high", high)]
+    assert index.search(flip(high, 63), 1) == [("high", 1)]
+
+
+def test_add_replaces_the_request(index):
+    index.add("a", 1)
+    index.add("a", 2)
+    assert index.all_hashes() == [("a", 2)]
+    assert index.indexed_ids() == {"a"}
+
+
+def test_duplicate_groups(index):
+    index.add_many([
+        ("a", 0, None), ("b", flip(0, 1), None), ("c", flip(0, 1, 2), None),
+        ("x", (1 << 64) - 1, None), ("y", flip((1 << 64) - 1, 5), None),
+        ("alone", 0x00000000FFFFFFFF, None),
+    ])
+    assert duplicate_groups(index, 1) == [["a", "b", "c"], ["x", "y"]]
+
+
+def test_perceptual_hash_is_stable_under_resizing():
+    rng = np.random.default_rng(0)
+    image = (rng.random((16, 16)) * 255).astype(np.uint8)
+    large = np.kron(image, np.ones((16, 16), dtype=np.uint8))
+    phash = perceptual_hash(large)
+    assert 0 <= phash < 1 << 64
+    assert hamming_distance(phash, perceptual_hash(large[::2, ::2])) <= 4
+    assert hamming_distance(phash, perceptual_hash(255 - large)) > 16
+
+
+def test_perceptual_hash_accepts_colour_images():
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    image[:, 32:] = 200
+    assert perceptual_hash(image) == perceptual_hash(image[:, :, 0])
+
+
+def test_hamming_distance():
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance((1 << 64) - 1, 0) == 64
+
+
+def test_replies_list_earlier_near_duplicates_but_not_the_hash(index):
+    handler = ModelHandler.__new__(ModelHandler)
+    handler.config = {"dedup": {"max_distance": 6}}
+    handler.hash_index = index
+    base = 0x0123456789ABCDEF
+    first = VerificationResult(ok=True, align_face="/data/first_aligned.png", phash=base)
+    second = VerificationResult(ok=True, align_face="/data/second_aligned.png", request_id="second", phash=flip(base, 3))
+    rejected = VerificationResult.failure("blurry", request_id="third")
+
+    handler.find_duplicates([first, second, rejected], [None] * 3)
+    assert first.to_dict()["duplicates"] == []
+    assert second.to_dict() == {
+        "OK": True, "align_face": "/data/second_aligned.png", "bbox": None, "norm_box": None,
+        "duplicates": [{"request_id": "first", "distance": 1}],
+    }
+    assert rejected.duplicates is None
@@ -0,0 +1,90 @@
+import sqlite3
+
+from metrics_store import CHECK_COLUMNS, MetricsStore
+from replay_thresholds import evaluate, load_columns
+from result_model import VerificationResult
+
+CONFIG_THRESHOLDS = {
+    "face_size": 150, "blur": 90, "dark_threshold": 35, "bright_threshold": 200, "diff_threshold": 20,
+    "head_fully_th": 10, "EAR_THRESHOLD": 0.37, "left_th": -0.3, "right_th": 0.3,
+    "down_th": -10, "up_th": 15, "til_left_th": -0.1, "til_right_th": 0.1,
+}
+
+PASSING_METRICS = {
+    "face_w": 300, "face_h": 320, "face_brightness": 120, "background_brightness": 110,
+    "brightness_diff": 10, "laplacian_var": 150, "head_top_margin": 40, "head_chin_margin": 30,
+    "yaw": 0.0, "pitch": 0.0, "roll": 0.0, "ear_left": 0.5, "ear_right": 0.5,
+}
+
+
+def row(request_id, ok=True, degraded=False, **metrics):
+    return {
+        "request_id": request_id, "file_path": f"{request_id}.jpg", "detected": True, "ok": ok,
+        "degraded": degraded, "duration_ms": 100.0,
+        "metrics": {**PASSING_METRICS, **metrics},
+        "checks": {name: ok for name in CHECK_COLUMNS},
+    }
+
+
+def test_record_and_replay_same_thresholds(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.db"))
+    store.record_many([row("a"), row("b", ok=False, laplacian_var=20)])
+    store.close()
+
+    columns = load_columns(str(tmp_path / "metrics.db"))
+    verdicts, ok = evaluate(columns, CONFIG_THRESHOLDS)
+    assert list(ok) == [True, False]
+    assert list(verdicts["check_face_blur"]) == [True, False]
+    assert list(verdicts["check_eye"]) == [True, True]
+
+
+def test_stricter_threshold_fails_stored_pass(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.db"))
+    store.record_many([row("a", laplacian_var=100)])
+    store.close()
+
+    _, ok = evaluate(load_columns(str(tmp_path / "metrics.db")), {**CONFIG_THRESHOLDS, "blur": 120})
+    assert list(ok) == [False]
+
+
+def test_missing_metric_fails_but_missing_background_passes(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.db"))
+    store.record_many([
+        row("no_background", brightness_diff=None, background_brightness=None),
+        row("errored", yaw=None),
+    ])
+    store.close()
+
+    verdicts, _ = evaluate(load_columns(str(tmp_path / "metrics.db")), CONFIG_THRESHOLDS)
+    assert list(verdicts["check_lightpol"]) == [True, True]
+    assert list(verdicts["check_head_pose"]) == [True, False]
+
+
+def test_degraded_rows_are_not_replayed(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.db"))
+    store.record_many([row("full"), row("cheap", degraded=True)])
+    store.close()
+
+    columns = load_columns(str(tmp_path / "metrics.db"))
+    assert len(columns["ok"]) == 1
+
+
+def test_database_without_degraded_column_is_migrated(tmp_path):
+    path = str(tmp_path / "metrics.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE request_metrics (request_id TEXT PRIMARY KEY, created_at REAL NOT NULL, "
+                 "file_path TEXT, detected INTEGER NOT NULL, ok INTEGER NOT NULL, duration_ms REAL)")
+    conn.commit()
+    conn.close()
+
+    MetricsStore(path).close()
+    columns = {r[1] for r in sqlite3.connect(path).execute("PRAGMA table_info(request_metrics)")}
+    assert "degraded" in columns
+
+
+def test_recorded_fields_stay_out_of_the_reply():
+    result = VerificationResult(ok=True, align_face="a_aligned.png", request_id="a", duration_ms=12.5,
+                                metrics=dict(PASSING_METRICS), checks={name: True for name in CHECK_COLUMNS})
+    assert set(result.to_dict()) == {"OK", "align_face", "bbox", "norm_box"}
+    failed = VerificationResult.failure("blurry", request_id="b", metrics={"laplacian_var": 20.0})
+    assert failed.to_dict() == {"OK": False, "error": "blurry"}
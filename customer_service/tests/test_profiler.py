@@ -0,0 +1,133 @@
+import json
+import os
+import signal
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import yaml
+
+from profiler import RequestProfiler, track
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "config.yml")
+
+
+@pytest.fixture
+def shipped():
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f)["profiling"]
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def written(profiler, count, newest=None, timeout=5.0):
+    """Wait until the writer thread has left exactly `count` profiles (`newest` among them) on disk and load them"""
+    deadline = time.monotonic() + timeout
+    while True:
+        names = sorted(name for name in os.listdir(profiler.directory) if name.endswith(".json")) \
+            if os.path.isdir(profiler.directory) else []
+        done = len(names) == count and (newest is None or any(name.endswith(f"_{newest}.json") for name in names))
+        if done or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    profiles = {}
+    for name in names:
+        with open(os.path.join(profiler.directory, name)) as f:
+            profiles[name] = json.load(f)
+    return profiles
+
+
+def test_shipped_config_is_off_until_the_signal(shipped, tmp_path):
+    profiler = RequestProfiler(shipped, str(tmp_path))
+    with profiler.capture() as capture:
+        assert capture is None
+
+    previous = signal.getsignal(signal.SIGUSR1)
+    profiler.install_signal()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        with profiler.capture() as capture:
+            assert capture is not None
+        # The config is reloaded per batch: the toggle still wins
+        profiler.configure(shipped)
+        assert profiler.enabled
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert not profiler.enabled
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+
+
+def test_slow_call_is_written_with_its_inputs_and_stacks(shipped, tmp_path):
+    profiler = RequestProfiler({**shipped, "enabled": True, "sample_rate": 0, "slow_threshold_ms": 20,
+                                "interval_ms": 1}, str(tmp_path))
+    with profiler.capture() as capture:
+        busy(0.05)
+        capture.inputs = [{"request_id": "a", "file_path": "a.jpg", "duration_ms": 50}]
+
+    [(name, profile)] = written(profiler, 1).items()
+    assert name.endswith("_slow_a.json")
+    assert profile["inputs"] == [{"request_id": "a", "file_path": "a.jpg", "duration_ms": 50}]
+    assert profile["samples"] > 0
+    assert any("busy" in stack for stack in profile["stacks"])
+
+
+def test_fast_call_leaves_no_profile(shipped, tmp_path):
+    profiler = RequestProfiler({**shipped, "enabled": True, "sample_rate": 0}, str(tmp_path))
+    with profiler.capture() as capture:
+        capture.inputs = [{"request_id": "a", "duration_ms": 10}]
+    assert profiler.writer is None
+    assert not os.path.exists(profiler.directory)
+
+
+def test_error_is_written_and_raised(shipped, tmp_path):
+    profiler = RequestProfiler({**shipped, "enabled": True, "sample_rate": 0}, str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with profiler.capture():
+            raise RuntimeError("boom")
+    [(name, profile)] = written(profiler, 1).items()
+    assert name.endswith("_error_unknown.json")
+    assert "boom" in profile["error"]
+
+
+def test_only_the_newest_profiles_are_kept(shipped, tmp_path):
+    profiler = RequestProfiler({**shipped, "enabled": True, "slow_threshold_ms": 0, "max_profiles": 2},
+                               str(tmp_path))
+    for i in range(4):
+        with profiler.capture() as capture:
+            capture.inputs = [{"request_id": f"r{i}", "duration_ms": 1}]
+        assert len(written(profiler, min(i + 1, 2), newest=f"r{i}")) == min(i + 1, 2)
+        time.sleep(0.02)  # distinct mtimes for the rotation order
+    assert sorted(profile["inputs"][0]["request_id"] for profile in written(profiler, 2).values()) == ["r2", "r3"]
+
+
+def test_pool_threads_are_sampled_under_their_label(shipped, tmp_path):
+    profiler = RequestProfiler({**shipped, "enabled": True, "slow_threshold_ms": 0, "interval_ms": 1},
+                               str(tmp_path))
+
+    def work():
+        with track("check_face_blur"):
+            busy(0.05)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        with profiler.capture():
+            pool.submit(contextvars.copy_context().run, work).result()
+        # Outside a capture's context the pool thread is left alone
+        pool.submit(work).result()
+    [profile] = written(profiler, 1).values()
+    assert any(stack.startswith("check_face_blur;") and "busy" in stack for stack in profile["stacks"])
+
+
+def test_track_on_the_profiled_thread_keeps_sampling_it(shipped, tmp_path):
+    profiler = RequestProfiler({**shipped, "enabled": True, "slow_threshold_ms": 0, "interval_ms": 1},
+                               str(tmp_path))
+    with profiler.capture():
+        with track("inline"):
+            pass
+        busy(0.05)
+    [profile] = written(profiler, 1).values()
+    assert any("busy" in stack and not stack.startswith("inline") for stack in profile["stacks"])
@@ -0,0 +1,84 @@
+import pytest
+
+import resource_manager
+from resource_manager import ResourcePlan, format_cpu_list, parse_cpu_list, plan, worker_env
+from supervisor import plan_workers
+
+
+@pytest.fixture
+def cpus(monkeypatch):
+    def set_cpus(count, usable=None):
+        monkeypatch.setattr(resource_manager, "available_cpus", lambda: list(range(count)))
+        monkeypatch.setattr(resource_manager, "usable_cpu_count", lambda: count if usable is None else usable)
+    return set_cpus
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpu_list(" 3, 1,1 ,") == [1, 3]
+    assert parse_cpu_list("") == []
+
+
+def test_format_round_trip():
+    assert format_cpu_list([0, 1, 4]) == "0,1,4"
+    assert parse_cpu_list(format_cpu_list([2, 5, 7])) == [2, 5, 7]
+
+
+def test_auto_uses_two_threads_from_eight_cores(cpus):
+    cpus(16)
+    result = plan({"mode": "auto"})
+    assert (result.workers, result.threads_per_worker) == (8, 2)
+    assert result.cpu_sets == []
+
+
+def test_auto_uses_one_thread_on_small_machines(cpus):
+    cpus(4)
+    result = plan({"mode": "auto"}, workers=10)
+    assert (result.workers, result.threads_per_worker) == (4, 1)
+
+
+def test_cgroup_quota_limits_the_budget(cpus):
+    cpus(16, usable=3)
+    result = plan({"mode": "auto", "threads_per_worker": 8})
+    assert (result.workers, result.threads_per_worker) == (1, 3)
+
+
+def test_manual_keeps_the_worker_count(cpus):
+    cpus(8)
+    assert plan({"mode": "manual", "threads_per_worker": 1}, workers=3).workers == 3
+    assert plan({"mode": "manual"}).workers == 1
+
+
+def test_pinned_sets_are_disjoint(cpus):
+    cpus(6)
+    result = plan({"mode": "auto", "threads_per_worker": 2, "pin_cpus": True})
+    assert result.cpu_sets == [[0, 1], [2, 3], [4, 5]]
+    # More workers than sets reuse them round-robin
+    assert result.cpus_for(1) == [2, 3]
+    assert result.cpus_for(4) == [2, 3]
+
+
+def test_cpus_for_without_pinning():
+    assert ResourcePlan(workers=2, threads_per_worker=1).cpus_for(0) is None
+
+
+def test_worker_env():
+    assert worker_env(2) == {"WORKER_THREADS": "2"}
+    assert worker_env(2, [4, 5]) == {"WORKER_THREADS": "2", "WORKER_CPUS": "4,5"}
+
+
+def test_supervisor_max_workers_caps_the_auto_plan(cpus):
+    cpus(16)
+    max_workers, resource_plan = plan_workers({"max_workers": 4}, {"mode": "auto"})
+    assert max_workers == 4
+    assert resource_plan.threads_per_worker == 2
+
+
+def test_core_count_caps_the_supervisor_max_workers(cpus):
+    cpus(2)
+    assert plan_workers({"max_workers": 4}, {"mode": "auto"})[0] == 2
+
+
+def test_supervisor_workers_without_resource_plan(cpus):
+    cpus(16)
+    assert plan_workers({"max_workers": 6}, {"mode": "off"}) == (6, None)
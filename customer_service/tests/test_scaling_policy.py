@@ -0,0 +1,59 @@
+from supervisor import ScalingPolicy, recent_latency_p95
+from metrics_store import MetricsStore
+
+
+def policy(**kwargs):
+    defaults = dict(min_workers=1, max_workers=4, target_depth_per_worker=8, target_latency_ms=3000,
+                    scale_down_ratio=0.5, scale_up_cooldown_seconds=15, scale_down_cooldown_seconds=120)
+    return ScalingPolicy(**{**defaults, **kwargs})
+
+
+def test_scales_up_to_the_backlog_at_once():
+    assert policy().decide(current=1, depth=24, now=100) == 3
+
+
+def test_scale_up_is_capped_at_max_workers():
+    assert policy().decide(current=1, depth=1000, now=100) == 4
+
+
+def test_slow_p95_adds_one_worker_while_messages_wait():
+    p = policy()
+    assert p.decide(current=1, depth=2, latency_p95_ms=5000, now=100) == 2
+    assert policy().decide(current=1, depth=0, latency_p95_ms=5000, now=100) == 1
+
+
+def test_scale_up_cooldown():
+    p = policy()
+    assert p.decide(current=1, depth=16, now=100) == 2
+    assert p.decide(current=2, depth=32, now=110) == 2
+    assert p.decide(current=2, depth=32, now=116) == 4
+
+
+def test_scale_down_waits_for_the_hysteresis_band():
+    p = policy()
+    # 3 workers fit 24 messages; 12 would fit in 2 at full load but not at half load
+    assert p.decide(current=3, depth=12, now=1000) == 3
+    assert p.decide(current=3, depth=4, now=1000) == 1
+
+
+def test_scale_down_cooldown():
+    p = policy()
+    p.last_change = 1000
+    assert p.decide(current=3, depth=0, now=1100) == 3
+    assert p.decide(current=3, depth=0, now=1121) == 1
+
+
+def test_never_below_min_workers():
+    assert policy(min_workers=2).decide(current=2, depth=0, now=1000) == 2
+
+
+def test_latency_p95_from_metrics_store(tmp_path):
+    path = str(tmp_path / "metrics.db")
+    store = MetricsStore(path)
+    store.record_many([
+        {"request_id": str(i), "detected": True, "ok": True, "duration_ms": float(i)}
+        for i in range(1, 101)
+    ])
+    store.close()
+    assert 95 <= recent_latency_p95(path, 300) <= 96
+    assert recent_latency_p95(str(tmp_path / "missing.db"), 300) is None
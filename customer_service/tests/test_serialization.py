@@ -0,0 +1,47 @@
+import msgpack
+import pytest
+
+from serialization import (
+    CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK, decode, encode, negotiate, supported_content_types
+)
+from result_model import VerificationResult
+
+
+def test_msgpack_preferred_when_installed():
+    assert supported_content_types() == [CONTENT_TYPE_MSGPACK, CONTENT_TYPE_JSON]
+
+
+@pytest.mark.parametrize("requested, expected", [
+    (CONTENT_TYPE_MSGPACK, CONTENT_TYPE_MSGPACK),
+    (CONTENT_TYPE_JSON, CONTENT_TYPE_JSON),
+    (None, CONTENT_TYPE_JSON),
+    ("application/xml", CONTENT_TYPE_JSON),
+])
+def test_negotiate_replies_in_request_encoding_or_json(requested, expected):
+    assert negotiate(requested) == expected
+
+
+@pytest.mark.parametrize("content_type", [CONTENT_TYPE_MSGPACK, CONTENT_TYPE_JSON])
+def test_encode_decode_round_trip(content_type):
+    payload = {"OK": True, "bbox": [1, 2, 3, 4], "error": None, "name": "ใบหน้า"}
+    assert decode(encode(payload, content_type), content_type) == payload
+
+
+def test_decode_without_content_type_is_json():
+    assert decode(b'{"OK": false}', None) == {"OK": False}
+
+
+def test_msgpack_body_is_binary_msgpack():
+    body = encode({"OK": True}, CONTENT_TYPE_MSGPACK)
+    assert msgpack.unpackb(body, raw=False) == {"OK": True}
+
+
+def test_failure_payload_keeps_original_keys():
+    assert VerificationResult.failure("too_dark").to_dict() == {"OK": False, "error": "too_dark"}
+
+
+def test_success_payload_keeps_original_keys():
+    result = VerificationResult(ok=True, align_face="a_aligned.png", bbox=(1, 2, 3, 4), norm_box=(0.1, 0.2, 0.3, 0.4))
+    assert result.to_dict() == {
+        "OK": True, "align_face": "a_aligned.png", "bbox": (1, 2, 3, 4), "norm_box": (0.1, 0.2, 0.3, 0.4)
+    }
@@ -0,0 +1,85 @@
+import pytest
+
+from tracing import Tracer, format_traceparent, parse_traceparent, stage
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+class ListExporter:
+    def __init__(self):
+        self.payloads = []
+
+    def export(self, payload):
+        self.payloads.append(payload)
+
+
+def test_traceparent_round_trip():
+    value = format_traceparent(TRACE_ID, SPAN_ID, True)
+    assert value == f"00-{TRACE_ID}-{SPAN_ID}-01"
+    assert parse_traceparent(value) == (TRACE_ID, SPAN_ID, True)
+
+
+@pytest.mark.parametrize("value", [None, "", "garbage", f"00-{TRACE_ID}-{SPAN_ID}", f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",
+                                   f"00-{'z' * 32}-{SPAN_ID}-01", b"00-bytes"])
+def test_invalid_traceparent_is_ignored(value):
+    assert parse_traceparent(value) is None
+
+
+def test_trace_continues_the_remote_parent():
+    trace = Tracer("test").start_trace("consume", traceparent=f"00-{TRACE_ID}-{SPAN_ID}-01")
+    assert trace.trace_id == TRACE_ID
+    assert trace.root.parent_id == SPAN_ID
+    assert trace.sampled
+
+
+def test_spans_nest_under_the_open_span():
+    trace = Tracer("test").start_trace("consume")
+    with trace.span("verify") as verify:
+        with stage(trace, "check_eye") as check:
+            assert trace.traceparent().split("-")[2] == check.span_id
+    assert verify.parent_id == trace.root.span_id
+    assert check.parent_id == verify.span_id
+    assert verify.end is not None
+
+
+def test_span_records_the_error():
+    trace = Tracer("test").start_trace("consume")
+    with pytest.raises(ValueError):
+        with trace.span("align_face"):
+            raise ValueError("no landmarks")
+    assert trace.spans[-1].error == "no landmarks"
+
+
+def test_stage_without_trace_is_a_no_op():
+    with stage(None, "detect_face") as span:
+        assert span is None
+
+
+@pytest.mark.parametrize("sampled, error, slow, kept", [
+    (True, None, False, True),
+    (False, "boom", False, True),
+    (False, None, True, True),
+    (False, None, False, False),
+])
+def test_keep_sampled_failed_or_slow(sampled, error, slow, kept):
+    tracer = Tracer("test", exporter=ListExporter(), slow_threshold_ms=1000)
+    trace = tracer.start_trace("consume", start=0.0 if slow else None)
+    trace.sampled = sampled
+    trace.finish(error=error)
+    assert tracer.keep(trace) is kept
+
+
+def test_kept_trace_is_exported_as_otlp():
+    exporter = ListExporter()
+    tracer = Tracer("face-verification", exporter=exporter, sample_rate=1.0)
+    trace = tracer.start_trace("consume", request_id="a")
+    with trace.span("check_eye"):
+        pass
+    trace.finish()
+    tracer.flush()
+    (payload,) = exporter.payloads
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["consume", "check_eye"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert {"key": "request_id", "value": {"stringValue": "a"}} in spans[0]["attributes"]
@@ -0,0 +1,206 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pika
+import pytest
+
+from rabbitmq_handler import QueueHandler
+from watchdog import InflightJournal, Watchdog, WatchdogTimeout, _start_time
+
+
+class FakeConnection:
+    def process_data_events(self, time_limit=0):
+        pass
+
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+        self.acked = []
+
+    def basic_publish(self, exchange, routing_key, properties, body):
+        self.published.append((routing_key, properties, body))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def props(retries=0, correlation_id="corr-1"):
+    return SimpleNamespace(reply_to="amq.gen-reply", correlation_id=correlation_id, content_type="application/json",
+                           headers={"request_id": "req-1", "x-retry-count": retries})
+
+
+def delivery(tag=1, redelivered=False):
+    return SimpleNamespace(delivery_tag=tag, redelivered=redelivered)
+
+
+@pytest.fixture
+def handler(tmp_path):
+    handler = QueueHandler(SimpleNamespace(config={"watchdog": {"enabled": True, "max_retries": 2}}))
+    handler.queue = "face"
+    handler.dead_letter_queue = "face.dead"
+    handler.watchdog = Watchdog(FakeConnection(), timeout_seconds=1, poll_interval=0.01)
+    handler.journal = InflightJournal(str(tmp_path / "inflight"))
+    return handler
+
+
+def test_watchdog_returns_result_and_raises_errors():
+    watchdog = Watchdog(FakeConnection(), timeout_seconds=1, poll_interval=0.01)
+    assert watchdog.run(lambda x: x * 2, 21) == 42
+    with pytest.raises(ZeroDivisionError):
+        watchdog.run(lambda: 1 / 0)
+
+
+def test_watchdog_abandons_a_hung_call():
+    watchdog = Watchdog(FakeConnection(), timeout_seconds=0.05, poll_interval=0.01)
+    release = threading.Event()
+    with pytest.raises(WatchdogTimeout):
+        watchdog.run(release.wait)
+    # The next call runs on a fresh worker while the hung one is still blocked
+    assert watchdog.run(lambda: "ok") == "ok"
+    assert watchdog.abandoned == 1
+    release.set()
+
+
+def test_call_soon_runs_on_the_calling_thread():
+    watchdog = Watchdog(FakeConnection(), timeout_seconds=1, poll_interval=0.01)
+    seen = []
+
+    def work():
+        watchdog.call_soon(lambda: seen.append(threading.get_ident()))
+        time.sleep(0.05)
+    watchdog.run(work)
+    assert seen == [threading.get_ident()]
+
+
+def test_retry_republishes_with_incremented_count(handler):
+    channel = FakeChannel()
+    handler.retry_or_dead_letter(channel, delivery(7), props(retries=1), b"{}", "boom")
+    (queue, properties, body), = channel.published
+    assert queue == "face"
+    assert properties.headers["x-retry-count"] == 2
+    assert properties.headers["x-last-error"] == "boom"
+    assert channel.acked == [7]
+
+
+def test_exhausted_retries_go_to_dead_letter_with_error_reply(handler):
+    channel = FakeChannel()
+    handler.retry_or_dead_letter(channel, delivery(7), props(retries=2), b"{}", "boom")
+    assert [queue for queue, _, _ in channel.published] == ["face.dead", "amq.gen-reply"]
+    assert b"after 3 attempts" in channel.published[1][2]
+    assert channel.acked == [7]
+
+
+def test_prefetched_redelivery_is_not_a_failed_attempt(handler):
+    # Nobody was processing it (e.g. its worker was scaled down): process normally
+    channel = FakeChannel()
+    assert not handler.requeue_redelivered(channel, delivery(redelivered=True), props(), b"{}")
+    assert channel.published == []
+
+
+def other_worker(handler, **identity):
+    """A journal of another process on this host, writing marks as `identity`"""
+    worker = InflightJournal(handler.journal.directory)
+    worker.identity = {**worker.identity, "token": "other-run", **identity}
+    return worker
+
+
+def test_redelivery_while_its_worker_is_alive_is_not_a_failed_attempt(handler):
+    # A dropped connection: the mark belongs to a live process
+    other_worker(handler, pid=os.getppid(), start=_start_time(os.getppid())).mark(["corr-1"])
+    assert not handler.requeue_redelivered(FakeChannel(), delivery(redelivered=True), props(), b"{}")
+
+
+def test_redelivery_after_a_crash_counts_as_failed_attempt(handler):
+    other_worker(handler, pid=dead_pid()).mark(["corr-1"])
+
+    channel = FakeChannel()
+    assert handler.requeue_redelivered(channel, delivery(redelivered=True), props(), b"{}")
+    assert channel.published[0][1].headers["x-retry-count"] == 1
+    assert not handler.journal.crashed("corr-1")
+
+
+def test_mark_of_an_earlier_run_with_our_pid_is_a_crash(handler):
+    # A restarted container keeps /tmp and gets the same PID back
+    other_worker(handler).mark(["corr-1"])
+    assert handler.journal.crashed("corr-1")
+
+
+def test_mark_whose_pid_was_reused_is_a_crash(handler):
+    parent = os.getppid()
+    other_worker(handler, pid=parent, start=_start_time(parent) - 1).mark(["corr-1"])
+    assert handler.journal.crashed("corr-1")
+
+
+def test_mark_from_before_a_reboot_is_a_crash(handler):
+    other_worker(handler, pid=os.getppid(), boot_id="earlier-boot").mark(["corr-1"])
+    assert handler.journal.crashed("corr-1")
+
+
+def test_unjudged_redeliveries_count_after_max_redeliveries(handler):
+    # Marks of another host cannot be checked: fall back to counting redeliveries
+    other_worker(handler, host="other-host", pid=os.getppid()).mark(["corr-1"])
+    channel = FakeChannel()
+    for _ in range(5):
+        assert not handler.requeue_redelivered(channel, delivery(redelivered=True), props(), b"{}")
+    assert handler.requeue_redelivered(channel, delivery(redelivered=True), props(), b"{}")
+    assert channel.published[0][1].headers["x-last-error"] == "Redelivered 6 times"
+
+
+def test_broker_delivery_count_is_honoured(handler):
+    quorum = props()
+    quorum.headers["x-delivery-count"] = 6
+    assert handler.requeue_redelivered(FakeChannel(), delivery(redelivered=True), quorum, b"{}")
+    assert not handler.requeue_redelivered(FakeChannel(), delivery(redelivered=True), props(), b"{}")
+
+
+def test_legacy_pid_only_mark_is_not_a_crash(handler):
+    with open(handler.journal._path("corr-1"), "w") as f:
+        f.write(str(dead_pid()))
+    assert not handler.journal.crashed("corr-1")
+
+
+def test_dead_letter_keeps_properties_and_is_persistent(handler):
+    request = pika.BasicProperties(
+        reply_to="amq.gen-reply", correlation_id="corr-1", content_type="application/json",
+        type="verify", message_id="msg-1", timestamp=1700000000, expiration="60000",
+        headers={"request_id": "req-1", "x-retry-count": 2}
+    )
+    channel = FakeChannel()
+    handler.retry_or_dead_letter(channel, delivery(7), request, b"{}", "boom")
+    (queue, properties, _), _ = channel.published
+    assert queue == "face.dead"
+    assert properties.delivery_mode == pika.DeliveryMode.Persistent.value
+    assert (properties.type, properties.message_id, properties.timestamp, properties.expiration) == \
+        ("verify", "msg-1", 1700000000, "60000")
+    assert properties.headers["x-retry-count"] == 3
+    assert request.headers["x-retry-count"] == 2
+
+
+def test_retry_keeps_the_request_properties(handler):
+    request = pika.BasicProperties(correlation_id="corr-1", message_id="msg-1", headers={"x-retry-count": 0})
+    channel = FakeChannel()
+    handler.retry_or_dead_letter(channel, delivery(7), request, b"{}", "boom")
+    (_, properties, _), = channel.published
+    assert properties.message_id == "msg-1"
+    assert properties.delivery_mode is None
+
+
+def test_marks_are_cleared_after_processing_and_on_shutdown(handler):
+    with handler.in_flight([props()]):
+        assert handler.journal.marked == {"corr-1"}
+    assert handler.journal.marked == set()
+
+    handler.journal.mark(["corr-2"])
+    handler.journal.release()
+    assert handler.journal.marked == set()
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import uuid
+import queue
+import socket
+import hashlib
+import tempfile
+import threading
+import contextvars
+from concurrent.futures import Future
+
+from rich.console import Console
+
+# Initialize Rich Console
+console = Console()
+
+
+class WatchdogTimeout(Exception):
+    pass
+
+
+class _Worker:
+    """
+    Long-lived daemon thread running submitted work. Long-lived so its
+    thread-local state (buffer arena) is reused across messages, daemon so a
+    hung call never blocks interpreter exit.
+    """
+
+    def __init__(self, name):
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, args, kwargs):
+        future = Future()
+        # Keep the caller's context (e.g. the open tracing span) on the worker
+        self.jobs.put((future, contextvars.copy_context(), func, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            future, context, func, args, kwargs = self.jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(func, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class Watchdog:
+    """
+    Runs pipeline work on a worker thread under a time limit while the
+    connection thread keeps servicing the AMQP connection, so heartbeats keep
+    flowing however long an image takes.
+
+    pika does not dispatch deliveries, timers or threadsafe callbacks while a
+    consumer callback is running, so work that must publish from the worker
+    (progress events) goes through `call_soon` and is executed here, on the
+    connection thread, while waiting.
+
+    A call that exceeds its deadline cannot be interrupted: its thread is
+    abandoned (left to finish or hang on its own) and the next call gets a
+    fresh worker.
+    """
+
+    def __init__(self, connection, timeout_seconds=60, poll_interval=1.0):
+        self.connection = connection
+        self.timeout = timeout_seconds
+        self.poll_interval = poll_interval
+        self.outbox = queue.Queue()
+        self.wakeup = threading.Event()
+        self.abandoned = 0
+        self.worker = _Worker("watchdog-worker-0")
+
+    def call_soon(self, callback):
+        """Run `callback` on the connection thread (thread-safe)"""
+        self.outbox.put(callback)
+        self.wakeup.set()
+
+    def _drain(self):
+        while True:
+            try:
+                callback = self.outbox.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback()
+            except Exception as e:
+                console.print(f"[bold yellow]WATCHDOG[/bold yellow] | Deferred callback failed: {e}")
+
+    def run(self, func, *args, timeout=None, **kwargs):
+        """
+        Call `func(*args, **kwargs)` on the worker thread and return its result.
+        Raises the function's exception, or WatchdogTimeout after `timeout` seconds.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        self.wakeup.clear()
+        future = self.worker.submit(func, args, kwargs)
+        future.add_done_callback(lambda _: self.wakeup.set())
+        deadline = time.monotonic() + timeout
+
+        while True:
+            self.wakeup.wait(max(0.0, min(self.poll_interval, deadline - time.monotonic())))
+            self.wakeup.clear()
+            self._drain()
+            if future.done():
+                return future.result()
+            if time.monotonic() >= deadline:
+                self._abandon()
+                raise WatchdogTimeout(f"Processing exceeded {timeout:g}s")
+            # Service heartbeats and other connection I/O
+            self.connection.process_data_events(time_limit=0)
+
+    def _abandon(self):
+        self.abandoned += 1
+        console.print(f"[bold red]WATCHDOG[/bold red] | Worker hung, abandoning it ({self.abandoned} so far)")
+        self.worker = _Worker(f"watchdog-worker-{self.abandoned}")
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _start_time(pid):
+    """Start time of `pid` in clock ticks since boot (Linux), None when unknown"""
+    stat = _read(f"/proc/{pid}/stat")
+    if not stat:
+        return None
+    # The command name may contain spaces: count fields after its closing ')'
+    return int(stat.rsplit(")", 1)[1].split()[19])
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, owned by someone else
+    return True
+
+
+class InflightJournal:
+    """
+    Marks the messages this worker is processing, one file per message in a
+    directory shared by the workers of the host. A redelivered message only
+    counts as a failed attempt when it is still marked by a worker that no
+    longer exists, i.e. the worker died while processing it.
+
+    A mark records the identity of the process that wrote it (host, boot id,
+    PID, process start time and a token drawn at startup), not just its PID.
+    A restarted container keeps /tmp and often gets the same PID back, and a
+    PID can be reused by an unrelated process; both still read as a crash.
+
+    Redeliveries of messages that were merely prefetched (a worker scaled
+    down or restarted, a dropped connection) find no mark, or one left by a
+    live process, and are processed normally.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "face-verification-inflight")
+        os.makedirs(self.directory, exist_ok=True)
+        self.pid = os.getpid()
+        self.identity = {
+            "host": socket.gethostname(),
+            "boot_id": _read("/proc/sys/kernel/random/boot_id"),
+            "pid": self.pid,
+            "start": _start_time(self.pid),
+            "token": uuid.uuid4().hex,
+        }
+        self.marked = set()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def mark(self, keys):
+        for key in keys:
+            if key is None:
+                continue
+            with open(self._path(key), "w") as f:
+                json.dump(self.identity, f)
+            self.marked.add(key)
+
+    def clear(self, keys):
+        for key in keys:
+            if key is None:
+                continue
+            self.marked.discard(key)
+            for path in (self._path(key), self._path(key) + ".redelivered"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def release(self):
+        """Drop this worker's marks on a graceful shutdown: those messages did not fail"""
+        self.clear(list(self.marked))
+
+    def redelivered(self, key) -> int:
+        """
+        Count a redelivery of `key` on this host and return the total so far.
+        The count survives restarts and is cleared once the message is done,
+        so it only grows while deliveries keep dying unjudged by `crashed`.
+        """
+        if key is None:
+            return 0
+        path = self._path(key) + ".redelivered"
+        try:
+            count = int(_read(path) or 0) + 1
+        except ValueError:
+            count = 1
+        with open(path, "w") as f:
+            f.write(str(count))
+        return count
+
+    def crashed(self, key) -> bool:
+        """Whether `key` was being processed by a worker that has since died"""
+        if key is None:
+            return False
+        try:
+            with open(self._path(key)) as f:
+                owner = json.load(f)
+            pid = int(owner.get("pid") or 0)
+        except (FileNotFoundError, ValueError, AttributeError):
+            return False
+        if pid <= 0 or owner.get("token") == self.identity["token"]:
+            return False
+        if owner.get("host") != self.identity["host"]:
+            # A directory shared across hosts: their processes cannot be checked from here
+            return False
+        if owner.get("boot_id") != self.identity["boot_id"]:
+            return True  # the host rebooted since
+        if pid == self.pid:
+            return True  # an earlier incarnation that had our PID
+        if not _alive(pid):
+            return True
+        # Alive, unless the PID now belongs to a process started later
+        start = _start_time(pid)
+        return start is not None and owner.get("start") is not None and start != owner["start"]
@@ -0,0 +1,50 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import fake_pika
+import run_loadtest
+
+
+class CountingModelHandler(run_loadtest.SyntheticModelHandler):
+    """Synthetic model that records which images it verified"""
+
+    def __init__(self, service_time_ms):
+        super().__init__(service_time_ms)
+        self.verified = []
+
+    def process_batch(self, file_paths, *args, **kwargs):
+        self.verified.extend(file_paths)
+        return super().process_batch(file_paths, *args, **kwargs)
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    """Producer app and one consumer (200 ms per image) on a fresh in-process broker"""
+    monkeypatch.setattr(fake_pika, "broker", fake_pika.FakeBroker())
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("RABBITMQ_URL", "amqp://test/")
+    monkeypatch.setenv("RABBITMQ_QUEUE", run_loadtest.QUEUE_NAME)
+    monkeypatch.setenv("BASEURL_STATIC", "http://test/uploads")
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+
+    import rabbitmq_handler
+    monkeypatch.setattr(rabbitmq_handler, "pika", fake_pika)
+    model = CountingModelHandler(service_time_ms=200)
+    consumer = rabbitmq_handler.QueueHandler(model)
+    consumer.connect()
+    thread = threading.Thread(target=consumer.start_consuming, daemon=True)
+    thread.start()
+
+    producer = run_loadtest.load_producer()
+    yield SimpleNamespace(producer=producer, client=TestClient(producer.app), model=model)
+    consumer.connection.add_callback_threadsafe(consumer.channel.stop_consuming)
+    thread.join(timeout=5)
+    consumer.close()
+
+
+def upload(count, field="files"):
+    image = run_loadtest.make_png(64, 64)
+    return [(field, (f"face{index}.png", image, "image/png")) for index in range(count)]
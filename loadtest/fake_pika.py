@@ -0,0 +1,324 @@
+"""
+In-process stand-in for the parts of `pika` used by producer_service and
+customer_service: BlockingConnection/BlockingChannel, BasicProperties,
+DeliveryMode, queue_declare (incl. passive/exclusive),
+basic_consume/publish/ack/nack/qos, reply_to + correlation_id round trips,
+timers and threadsafe callbacks.
+
+All connections share one FakeBroker. Deliveries are pushed into the inbox of
+the consuming connection and dispatched from that connection's own thread
+(inside process_data_events), as with a real BlockingConnection.
+"""
+import enum
+import itertools
+import queue as queue_module
+import threading
+import time
+import uuid
+from collections import deque
+from types import SimpleNamespace
+
+
+class exceptions:
+    class AMQPError(Exception):
+        pass
+
+    class AMQPConnectionError(AMQPError):
+        pass
+
+    class ChannelClosedByBroker(AMQPError):
+        def __init__(self, reply_code=404, reply_text="NOT_FOUND"):
+            super().__init__(f"({reply_code}, '{reply_text}')")
+            self.reply_code = reply_code
+            self.reply_text = reply_text
+
+    class ConnectionClosed(AMQPError):
+        pass
+
+
+class DeliveryMode(enum.Enum):
+    Transient = 1
+    Persistent = 2
+
+
+class BasicProperties:
+    def __init__(self, content_type=None, headers=None, correlation_id=None, reply_to=None, type=None, **kwargs):
+        self.content_type = content_type
+        self.headers = headers
+        self.correlation_id = correlation_id
+        self.reply_to = reply_to
+        self.type = type
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class ConnectionParameters:
+    def __init__(self, host="localhost", **kwargs):
+        self.host = host
+
+
+class URLParameters:
+    def __init__(self, url):
+        self.url = url
+
+
+class _Queue:
+    def __init__(self, name, owner=None):
+        self.name = name
+        self.owner = owner
+        self.ready = deque()
+        self.consumers = []
+        self.next_consumer = 0
+
+
+class _Consumer:
+    def __init__(self, channel, queue, callback, auto_ack):
+        self.channel = channel
+        self.queue = queue
+        self.callback = callback
+        self.auto_ack = auto_ack
+        self.unacked = {}
+
+    def has_capacity(self):
+        prefetch = self.channel.prefetch_count
+        return self.auto_ack or prefetch == 0 or len(self.unacked) < prefetch
+
+
+class FakeBroker:
+    """Shared in-memory broker (default exchange only, which is all the services use)"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.queues = {}
+        self.delivery_tags = itertools.count(1)
+        self.published = 0
+
+    def declare(self, name, owner=None, passive=False):
+        with self.lock:
+            if not name:
+                name = f"amq.gen-{uuid.uuid4().hex}"
+            if name not in self.queues:
+                if passive:
+                    raise exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{name}'")
+                self.queues[name] = _Queue(name, owner)
+            q = self.queues[name]
+            return q.name, len(q.ready), len(q.consumers)
+
+    def publish(self, routing_key, properties, body):
+        with self.lock:
+            q = self.queues.get(routing_key)
+            if q is None:
+                return  # unroutable on the default exchange: dropped, like RabbitMQ
+            self.published += 1
+            q.ready.append((properties, body, False))
+            self._dispatch(q)
+
+    def _dispatch(self, q):
+        while q.ready and q.consumers:
+            for _ in range(len(q.consumers)):
+                consumer = q.consumers[q.next_consumer % len(q.consumers)]
+                q.next_consumer += 1
+                if consumer.has_capacity():
+                    break
+            else:
+                return
+            properties, body, redelivered = q.ready.popleft()
+            tag = next(self.delivery_tags)
+            if not consumer.auto_ack:
+                consumer.unacked[tag] = (properties, body)
+            method = SimpleNamespace(delivery_tag=tag, redelivered=redelivered, routing_key=q.name, consumer_tag=id(consumer))
+            consumer.channel.connection.inbox.put(("deliver", consumer, method, properties, body))
+
+    def add_consumer(self, consumer):
+        with self.lock:
+            self.queues[consumer.queue].consumers.append(consumer)
+            self._dispatch(self.queues[consumer.queue])
+
+    def settle(self, consumer, tag, multiple=False, requeue=None):
+        """Ack (requeue=None) or nack/reject a delivery"""
+        with self.lock:
+            tags = [t for t in consumer.unacked if t <= tag] if multiple else [tag]
+            q = self.queues.get(consumer.queue)
+            for t in tags:
+                message = consumer.unacked.pop(t, None)
+                if message is not None and requeue and q is not None:
+                    q.ready.appendleft((message[0], message[1], True))
+            if q is not None:
+                self._dispatch(q)
+
+    def disconnect(self, connection):
+        """Requeue unacked deliveries and drop exclusive queues of a closing connection"""
+        with self.lock:
+            for name, q in list(self.queues.items()):
+                for consumer in [c for c in q.consumers if c.channel.connection is connection]:
+                    q.consumers.remove(consumer)
+                    for properties, body in reversed(list(consumer.unacked.values())):
+                        q.ready.appendleft((properties, body, True))
+                    consumer.unacked.clear()
+                if q.owner is connection:
+                    del self.queues[name]
+                else:
+                    self._dispatch(q)
+
+    def depth(self, name):
+        with self.lock:
+            q = self.queues.get(name)
+            return len(q.ready) if q else 0
+
+
+broker = FakeBroker()
+
+
+class BlockingChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.prefetch_count = 0
+        self.consumers = []
+        self._consuming = False
+
+    @property
+    def is_open(self):
+        return not self.connection.is_closed
+
+    def queue_declare(self, queue="", passive=False, durable=False, exclusive=False, auto_delete=False, arguments=None):
+        name, message_count, consumer_count = broker.declare(
+            queue, owner=self.connection if exclusive else None, passive=passive
+        )
+        return SimpleNamespace(method=SimpleNamespace(queue=name, message_count=message_count, consumer_count=consumer_count))
+
+    def basic_qos(self, prefetch_count=0, **kwargs):
+        self.prefetch_count = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, **kwargs):
+        consumer = _Consumer(self, queue, on_message_callback, auto_ack)
+        self.consumers.append(consumer)
+        broker.add_consumer(consumer)
+        return str(id(consumer))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if self.connection.is_closed:
+            raise exceptions.ConnectionClosed("Connection is closed")
+        broker.publish(routing_key, properties or BasicProperties(), body)
+
+    def _consumer_for(self, delivery_tag, multiple=False):
+        for consumer in self.consumers:
+            if delivery_tag in consumer.unacked:
+                return consumer
+        if multiple:
+            for consumer in self.consumers:
+                if any(t <= delivery_tag for t in consumer.unacked):
+                    return consumer
+        return None
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        consumer = self._consumer_for(delivery_tag, multiple)
+        if consumer is not None:
+            broker.settle(consumer, delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        consumer = self._consumer_for(delivery_tag, multiple)
+        if consumer is not None:
+            broker.settle(consumer, delivery_tag, multiple, requeue=requeue)
+
+    def basic_reject(self, delivery_tag=0, requeue=True):
+        self.basic_nack(delivery_tag, requeue=requeue)
+
+    def start_consuming(self):
+        self._consuming = True
+        while self._consuming and not self.connection.is_closed:
+            self.connection.process_data_events(time_limit=0.1)
+
+    def stop_consuming(self):
+        self._consuming = False
+
+    def close(self):
+        self.stop_consuming()
+
+
+class BlockingConnection:
+    def __init__(self, parameters=None):
+        self.parameters = parameters
+        self.inbox = queue_module.Queue()
+        self.timers = {}
+        self.timer_ids = itertools.count(1)
+        self.is_closed = False
+        self.channels = []
+        self.dispatching = False
+
+    @property
+    def is_open(self):
+        return not self.is_closed
+
+    def channel(self):
+        channel = BlockingChannel(self)
+        self.channels.append(channel)
+        return channel
+
+    def call_later(self, delay, callback):
+        timer_id = next(self.timer_ids)
+        self.timers[timer_id] = (time.monotonic() + delay, callback)
+        return timer_id
+
+    def remove_timeout(self, timer_id):
+        self.timers.pop(timer_id, None)
+
+    def add_callback_threadsafe(self, callback):
+        self.inbox.put(("callback", callback))
+
+    def _run_timers(self):
+        now = time.monotonic()
+        for timer_id, (deadline, callback) in sorted(self.timers.items(), key=lambda item: item[1][0]):
+            if deadline <= now and self.timers.pop(timer_id, None) is not None:
+                callback()
+
+    def _next_timeout(self, limit):
+        if not self.timers:
+            return limit
+        until_timer = max(0.0, min(deadline for deadline, _ in self.timers.values()) - time.monotonic())
+        return until_timer if limit is None else min(limit, until_timer)
+
+    def process_data_events(self, time_limit=0):
+        """Dispatch pending deliveries, callbacks and due timers for up to `time_limit` seconds"""
+        if self.dispatching:
+            # Like pika, nothing is dispatched from inside a callback; only I/O would be serviced
+            time.sleep(time_limit or 0)
+            return
+        self.dispatching = True
+        try:
+            self._process_data_events(time_limit)
+        finally:
+            self.dispatching = False
+
+    def _process_data_events(self, time_limit):
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        while not self.is_closed:
+            self._run_timers()
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            timeout = self._next_timeout(remaining)
+            try:
+                # A zero limit still waits a moment so polling loops do not spin
+                event = self.inbox.get(timeout=None if timeout is None else max(0.001, timeout))
+            except queue_module.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                continue
+            if event[0] == "callback":
+                event[1]()
+            else:
+                _, consumer, method, properties, body = event
+                consumer.callback(consumer.channel, method, properties, body)
+            # Like pika, return once something was dispatched
+            return
+
+    def sleep(self, duration):
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            self.process_data_events(time_limit=deadline - time.monotonic())
+
+    def close(self):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        for channel in self.channels:
+            channel.stop_consuming()
+        broker.disconnect(self)
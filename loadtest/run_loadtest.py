@@ -0,0 +1,222 @@
+"""
+End-to-end load test of producer -> queue -> consumer without RabbitMQ.
+
+`pika` is replaced by the in-process broker in fake_pika.py for both
+RabbitMQClient (producer_service) and QueueHandler (customer_service). The
+FastAPI app is driven through an ASGI client, so every request goes through
+the real upload, validation, enqueue, consume and reply code paths.
+
+    python loadtest/run_loadtest.py --rate 20 --duration 30 --consumers 2
+    python loadtest/run_loadtest.py --concurrency 8 --requests 200 --model real --image face.jpg
+"""
+import os
+import sys
+import time
+import zlib
+import struct
+import asyncio
+import argparse
+import importlib.util
+import tempfile
+import threading
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCER_DIR = os.path.join(ROOT, "producer_service")
+CONSUMER_DIR = os.path.join(ROOT, "customer_service")
+QUEUE_NAME = "face_verification_queue"
+
+sys.path[:0] = [os.path.dirname(os.path.abspath(__file__)), PRODUCER_DIR, CONSUMER_DIR]
+
+import fake_pika  # noqa: E402
+
+
+def load_module(name, path):
+    """Import a service's main.py under a unique name (both services have one)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_png(width=512, height=512):
+    """Small valid grey PNG, enough for the producer's header validation"""
+    raw = b"".join(b"\x00" + b"\x80" * (width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def tracing_config():
+    """Consumer `tracing` section mirroring the producer's TRACING_* variables"""
+    slow_threshold_ms = os.getenv("TRACING_SLOW_MS")
+    return {
+        "enabled": os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes"),
+        "exporter": os.getenv("TRACING_EXPORTER", "file"),
+        "path": os.path.abspath(os.getenv("TRACING_FILE", "traces/traces.jsonl")),
+        "otlp_endpoint": os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318"),
+        "sample_rate": float(os.getenv("TRACING_SAMPLE_RATE", "0")),
+        "slow_threshold_ms": float(slow_threshold_ms) if slow_threshold_ms else None,
+    }
+
+
+class SyntheticModelHandler:
+    """Stands in for ModelHandler with a fixed service time, to measure the transport path"""
+
+    def __init__(self, service_time_ms, batching=False):
+        self.service_time = service_time_ms / 1000.0
+        self.config = {"batching": {"enabled": batching}, "tracing": tracing_config()}
+
+    def process_image(self, file_path, request_id=None, on_check=None, trace=None, degraded=False):
+        return self.process_batch([file_path], [request_id], [on_check], [trace], degraded=degraded)[0]
+
+    def process_batch(self, file_paths, request_ids=None, on_checks=None, traces=None, degraded=False):
+        from result_model import VerificationResult
+        time.sleep(self.service_time * len(file_paths))
+        return [
+            VerificationResult(ok=True, align_face=file_path, bbox=(0, 0, 1, 1), norm_box=(0.0, 0.0, 1.0, 1.0), request_id=request_id,
+                               degraded=degraded)
+            for file_path, request_id in zip(file_paths, request_ids or [None] * len(file_paths))
+        ]
+
+
+def start_consumers(count, model, service_time_ms, batching):
+    import rabbitmq_handler
+    rabbitmq_handler.pika = fake_pika
+
+    if model == "real":
+        consumer_main = load_module("consumer_main", os.path.join(CONSUMER_DIR, "main.py"))
+
+    handlers = []
+    for _ in range(count):
+        if model == "real":
+            model_handler = consumer_main.ModelHandler(gpu_mode=False)
+        else:
+            model_handler = SyntheticModelHandler(service_time_ms, batching)
+        handler = rabbitmq_handler.QueueHandler(model_handler)
+        handler.connect()
+        threading.Thread(target=handler.start_consuming, daemon=True).start()
+        handlers.append(handler)
+    return handlers
+
+
+def load_producer():
+    import rabbitmq_client
+    rabbitmq_client.pika = fake_pika
+    return load_module("producer_main", os.path.join(PRODUCER_DIR, "main.py"))
+
+
+async def run_load(app, image_bytes, filename, rate, duration, concurrency, total_requests, endpoint):
+    import httpx
+
+    results = []  # (latency_s, status_code, ok)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        async def one_request():
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, files={"file": (filename, image_bytes, "image/png")})
+                ok = response.status_code == 200 and response.json().get("OK", False)
+                results.append((time.perf_counter() - started, response.status_code, ok))
+            except Exception:
+                results.append((time.perf_counter() - started, 0, False))
+
+        started = time.perf_counter()
+        if rate > 0:
+            # Open loop: fixed arrival rate regardless of response times
+            tasks = []
+            deadline = started + duration
+            interval = 1.0 / rate
+            next_at = started
+            while next_at < deadline:
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                tasks.append(asyncio.create_task(one_request()))
+                next_at += interval
+            await asyncio.gather(*tasks)
+        else:
+            # Closed loop: `concurrency` clients each sending back-to-back requests
+            counter = iter(range(total_requests))
+
+            async def client_loop():
+                for _ in counter:
+                    await one_request()
+
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return results, elapsed
+
+
+def report(results, elapsed):
+    latencies = np.array([r[0] for r in results]) * 1000
+    status_codes = {}
+    for _, status, _ in results:
+        status_codes[status] = status_codes.get(status, 0) + 1
+    errors = sum(1 for r in results if r[1] != 200)
+    rejected = sum(1 for r in results if r[1] == 200 and not r[2])
+
+    print(f"\nRequests:    {len(results)} in {elapsed:.2f}s")
+    print(f"Throughput:  {len(results) / elapsed:.2f} req/s")
+    if len(latencies):
+        print("Latency ms:  " + "  ".join(
+            f"{name}={np.percentile(latencies, p):.1f}" for name, p in [("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99)]
+        ) + f"  max={latencies.max():.1f}")
+    print(f"Error rate:  {errors / max(1, len(results)) * 100:.2f}% (HTTP != 200)")
+    print(f"Rejected:    {rejected} (HTTP 200, OK=false)")
+    print(f"Status:      {dict(sorted(status_codes.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Producer -> queue -> consumer load test with an in-process broker")
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop arrival rate (req/s); 0 for closed loop")
+    parser.add_argument("--duration", type=float, default=10, help="Open-loop duration in seconds")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed-loop concurrent clients")
+    parser.add_argument("--requests", type=int, default=100, help="Closed-loop total requests")
+    parser.add_argument("--consumers", type=int, default=1, help="Consumer loops (each with its own connection)")
+    parser.add_argument("--model", choices=["synthetic", "real"], default="synthetic", help="Real ModelHandler or fixed service time")
+    parser.add_argument("--service-time-ms", type=float, default=50, help="Synthetic model service time per image")
+    parser.add_argument("--batching", action="store_true", help="Enable the micro-batching scheduler (synthetic model)")
+    parser.add_argument("--image", default=None, help="Image to upload (defaults to a generated PNG)")
+    parser.add_argument("--endpoint", default="/api/v1/face/verification")
+    args = parser.parse_args()
+
+    os.environ["RABBITMQ_URL"] = "amqp://loadtest/"
+    os.environ["RABBITMQ_QUEUE"] = QUEUE_NAME
+    os.environ.setdefault("BASEURL_STATIC", "http://loadtest/uploads")
+    # Every request comes from the same client here: measure the pipeline, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_bytes = f.read()
+        filename = os.path.basename(args.image)
+    else:
+        image_bytes, filename = make_png(), "loadtest.png"
+
+    # Uploads land in a throwaway working directory
+    workdir = tempfile.mkdtemp(prefix="fv-loadtest-")
+    os.chdir(workdir)
+    print(f"Working directory: {workdir}")
+
+    start_consumers(args.consumers, args.model, args.service_time_ms, args.batching)
+    producer = load_producer()
+
+    results, elapsed = asyncio.run(run_load(
+        producer.app, image_bytes, filename, args.rate, args.duration,
+        args.concurrency, args.requests, args.endpoint
+    ))
+    report(results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
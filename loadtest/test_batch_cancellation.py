@@ -0,0 +1,32 @@
+import time
+
+import fake_pika
+import run_loadtest
+from conftest import upload
+
+
+def test_first_passing_batch_skips_the_files_still_queued(services):
+    client, model = services.client, services.model
+    response = client.post("/api/v1/face/verification/batch?mode=first_passing", files=upload(4))
+
+    body = response.json()
+    assert response.status_code == 200 and body["OK"]
+    statuses = [entry["status"] for entry in body["results"]]
+    assert statuses.count("done") == 1 and statuses.count("cancelled") == 3
+    # The response does not wait for the queue: let the consumer drain it
+    deadline = time.monotonic() + 5
+    while fake_pika.broker.depth(run_loadtest.QUEUE_NAME) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.3)
+    assert fake_pika.broker.depth(run_loadtest.QUEUE_NAME) == 0
+    # One consumer, one image at a time: the first passes, the one delivered
+    # meanwhile may still run, the rest are acked unprocessed
+    assert len(model.verified) <= 2
+
+
+def test_all_mode_verifies_every_file(services):
+    client, model = services.client, services.model
+    response = client.post("/api/v1/face/verification/batch", files=upload(3))
+
+    assert [entry["status"] for entry in response.json()["results"]] == ["done"] * 3
+    assert len(model.verified) == 3
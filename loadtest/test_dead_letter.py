@@ -0,0 +1,53 @@
+import json
+import threading
+
+import fake_pika
+from fake_pika import BasicProperties, BlockingConnection, DeliveryMode
+
+
+class FailingModelHandler:
+    def __init__(self, inflight_dir):
+        self.config = {"watchdog": {"enabled": True, "max_retries": 0, "timeout_seconds": 5,
+                                    "poll_interval_seconds": 0.01, "inflight_dir": inflight_dir}}
+
+    def process_image(self, file_path, **kwargs):
+        raise RuntimeError("decoder crashed")
+
+
+def test_failed_request_is_parked_persistent_with_its_properties(tmp_path, monkeypatch):
+    monkeypatch.setattr(fake_pika, "broker", fake_pika.FakeBroker())
+    monkeypatch.setenv("RABBITMQ_URL", "amqp://test/")
+    monkeypatch.setenv("RABBITMQ_QUEUE", "face")
+    import rabbitmq_handler
+    monkeypatch.setattr(rabbitmq_handler, "pika", fake_pika)
+
+    consumer = rabbitmq_handler.QueueHandler(FailingModelHandler(str(tmp_path / "inflight")))
+    consumer.connect()
+    thread = threading.Thread(target=consumer.start_consuming, daemon=True)
+    thread.start()
+
+    caller = BlockingConnection()
+    channel = caller.channel()
+    reply_queue = channel.queue_declare("", exclusive=True).method.queue
+    replies = []
+    channel.basic_consume(reply_queue, lambda ch, method, props, body: replies.append(json.loads(body)), auto_ack=True)
+    channel.basic_publish("", "face", json.dumps({"file": "/data/a.jpg"}).encode(), BasicProperties(
+        reply_to=reply_queue, correlation_id="corr-1", content_type="application/json",
+        message_id="msg-1", type="verify", headers={"request_id": "req-1"}
+    ))
+    while not replies:
+        caller.process_data_events(time_limit=5)
+
+    assert replies[0]["OK"] is False and "after 1 attempts" in replies[0]["error"]
+    parked = []
+    channel.basic_consume("face.dead", lambda ch, method, props, body: parked.append(props), auto_ack=True)
+    caller.process_data_events(time_limit=1)
+    [props] = parked
+    assert props.delivery_mode == DeliveryMode.Persistent.value
+    assert (props.message_id, props.type, props.correlation_id) == ("msg-1", "verify", "corr-1")
+    assert props.headers["x-last-error"] == "decoder crashed"
+
+    consumer.connection.add_callback_threadsafe(consumer.channel.stop_consuming)
+    thread.join(timeout=5)
+    consumer.close()
+    caller.close()
@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+
+from conftest import upload
+from fair_dispatcher import FairDispatcher
+
+
+async def post_in_order(app, *requests):
+    """Start the requests a moment apart; returns the labels in completion order"""
+    finished = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        async def send(label, path, files, key):
+            response = await client.post(path, files=files, headers={"X-API-Key": key})
+            assert response.status_code == 200
+            finished.append(label)
+
+        tasks = []
+        for request in requests:
+            tasks.append(asyncio.create_task(send(*request)))
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*tasks)
+    return finished
+
+
+def test_one_clients_batch_does_not_hold_up_another_client(services, monkeypatch):
+    # One verification of this replica on the queue at a time
+    monkeypatch.setattr(services.producer, "dispatcher", FairDispatcher(1))
+    finished = asyncio.run(post_in_order(
+        services.producer.app,
+        ("batch", "/api/v1/face/verification/batch", upload(5), "client-a"),
+        ("single", "/api/v1/face/verification", upload(1, field="file"), "client-b"),
+    ))
+    # Round-robin: the single image gets the second slot, not the sixth
+    assert finished == ["single", "batch"]
+    assert len(services.model.verified) == 6
@@ -0,0 +1,95 @@
+import pytest
+
+import fake_pika
+from fake_pika import BasicProperties, BlockingConnection, FakeBroker, exceptions
+
+
+@pytest.fixture(autouse=True)
+def broker(monkeypatch):
+    broker = FakeBroker()
+    monkeypatch.setattr(fake_pika, "broker", broker)
+    return broker
+
+
+def consume(connection, queue, deliveries, auto_ack=False, prefetch=0):
+    channel = connection.channel()
+    channel.basic_qos(prefetch_count=prefetch)
+    channel.basic_consume(queue, lambda ch, method, props, body: deliveries.append((method, props, body)), auto_ack=auto_ack)
+    return channel
+
+
+def drain(connection, count):
+    for _ in range(count):
+        connection.process_data_events(time_limit=0.1)
+
+
+def test_rpc_round_trip():
+    server, client = BlockingConnection(), BlockingConnection()
+    server_channel = server.channel()
+    server_channel.queue_declare("face")
+
+    def on_request(ch, method, props, body):
+        ch.basic_publish("", props.reply_to, body.upper(), BasicProperties(correlation_id=props.correlation_id))
+        ch.basic_ack(method.delivery_tag)
+
+    server_channel.basic_consume("face", on_request)
+    client_channel = client.channel()
+    reply_queue = client_channel.queue_declare("", exclusive=True).method.queue
+    replies = []
+    client_channel.basic_consume(reply_queue, lambda ch, method, props, body: replies.append((props.correlation_id, body)), auto_ack=True)
+
+    client_channel.basic_publish("", "face", b"ping", BasicProperties(reply_to=reply_queue, correlation_id="c1"))
+    drain(server, 1)
+    drain(client, 1)
+    assert replies == [("c1", b"PING")]
+
+
+def test_prefetch_limits_unacked_deliveries(broker):
+    connection = BlockingConnection()
+    connection.channel().queue_declare("face")
+    deliveries = []
+    channel = consume(connection, "face", deliveries, prefetch=1)
+    for body in (b"a", b"b"):
+        channel.basic_publish("", "face", body)
+    drain(connection, 2)
+    assert [body for _, _, body in deliveries] == [b"a"]
+    assert broker.depth("face") == 1
+    channel.basic_ack(deliveries[0][0].delivery_tag)
+    drain(connection, 1)
+    assert [body for _, _, body in deliveries] == [b"a", b"b"]
+
+
+def test_nack_requeues_as_redelivered():
+    connection = BlockingConnection()
+    connection.channel().queue_declare("face")
+    deliveries = []
+    channel = consume(connection, "face", deliveries)
+    channel.basic_publish("", "face", b"a")
+    drain(connection, 1)
+    channel.basic_nack(deliveries[0][0].delivery_tag, requeue=True)
+    drain(connection, 1)
+    assert [method.redelivered for method, _, _ in deliveries] == [False, True]
+
+
+def test_close_requeues_unacked_and_drops_exclusive_queues(broker):
+    worker, owner = BlockingConnection(), BlockingConnection()
+    worker.channel().queue_declare("face")
+    reply_queue = owner.channel().queue_declare("", exclusive=True).method.queue
+    deliveries = []
+    channel = consume(worker, "face", deliveries)
+    channel.basic_publish("", "face", b"a")
+    drain(worker, 1)
+    worker.close()
+    owner.close()
+    assert broker.depth("face") == 1
+    with pytest.raises(exceptions.ChannelClosedByBroker):
+        BlockingConnection().channel().queue_declare(reply_queue, passive=True)
+
+
+def test_timers_and_threadsafe_callbacks_run_on_the_connection():
+    connection = BlockingConnection()
+    calls = []
+    connection.call_later(0.01, lambda: calls.append("timer"))
+    connection.add_callback_threadsafe(lambda: calls.append("callback"))
+    connection.sleep(0.05)
+    assert calls == ["callback", "timer"]
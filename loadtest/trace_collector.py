@@ -0,0 +1,126 @@
+"""
+Local stand-in for an OTLP/HTTP collector plus a summary of collected traces.
+
+    # receive traces from both services (exporter: otlp, endpoint http://localhost:4318)
+    python loadtest/trace_collector.py serve --port 4318 --out traces.jsonl
+
+    # per-stage latency percentiles and the breakdown of the slowest traces;
+    # accepts the collector output and/or the services' file exporter output
+    python loadtest/trace_collector.py summarize traces.jsonl customer_service/traces/traces.jsonl
+"""
+import json
+import argparse
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def serve(port, out_path):
+    lock = threading.Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_response(404)
+                self.end_headers()
+                return
+            payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                document = json.loads(payload)
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            with lock, open(out_path, "a") as f:
+                f.write(json.dumps(document) + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"Collecting OTLP/JSON traces on :{port}/v1/traces into {out_path}")
+    ThreadingHTTPServer(("0.0.0.0", port), CollectorHandler).serve_forever()
+
+
+def load_spans(paths):
+    """All spans in the given OTLP/JSON-lines files, grouped by trace id"""
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for resource_spans in json.loads(line).get("resourceSpans", []):
+                    service = next(
+                        (a["value"].get("stringValue") for a in resource_spans.get("resource", {}).get("attributes", [])
+                         if a["key"] == "service.name"),
+                        "unknown"
+                    )
+                    for scope_spans in resource_spans.get("scopeSpans", []):
+                        for span in scope_spans.get("spans", []):
+                            traces[span["traceId"]].append({
+                                "service": service,
+                                "name": span["name"],
+                                "parent": span.get("parentSpanId"),
+                                "start": int(span["startTimeUnixNano"]) / 1e6,
+                                "duration_ms": (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6,
+                            })
+    return traces
+
+
+def summarize(paths, top):
+    traces = load_spans(paths)
+    if not traces:
+        print("No traces found")
+        return
+
+    by_stage = defaultdict(list)
+    for spans in traces.values():
+        for span in spans:
+            by_stage[(span["service"], span["name"])].append(span["duration_ms"])
+
+    print(f"{len(traces)} traces\n")
+    print(f"{'service':<30} {'span':<32} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for (service, name), durations in sorted(by_stage.items()):
+        d = np.array(durations)
+        print(f"{service:<30} {name:<32} {len(d):>6} "
+              f"{np.percentile(d, 50):>9.1f} {np.percentile(d, 95):>9.1f} {np.percentile(d, 99):>9.1f}")
+
+    def total(spans):
+        roots = [s for s in spans if s["parent"] is None] or spans
+        return max(s["duration_ms"] for s in roots)
+
+    def stage(spans, name):
+        return sum(s["duration_ms"] for s in spans if s["name"] == name)
+
+    print(f"\nSlowest {top} traces (ms)")
+    print(f"{'trace_id':<34} {'total':>9} {'upload':>9} {'queue':>9} {'process':>9} {'reply':>9}")
+    for trace_id, spans in sorted(traces.items(), key=lambda item: total(item[1]), reverse=True)[:top]:
+        print(f"{trace_id:<34} {total(spans):>9.1f} {stage(spans, 'upload') + stage(spans, 'disk_write'):>9.1f} "
+              f"{stage(spans, 'queue_wait'):>9.1f} {stage(spans, 'process'):>9.1f} {stage(spans, 'reply'):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OTLP/HTTP collector stand-in and trace summary")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve", help="Accept OTLP/JSON on /v1/traces and append it to a file")
+    serve_parser.add_argument("--port", type=int, default=4318)
+    serve_parser.add_argument("--out", default="traces.jsonl")
+    summary_parser = sub.add_parser("summarize", help="Per-span latency percentiles and slowest traces")
+    summary_parser.add_argument("paths", nargs="+")
+    summary_parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.port, args.out)
+    else:
+        summarize(args.paths, args.top)
+
+
+if __name__ == "__main__":
+    main()
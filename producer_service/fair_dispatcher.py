@@ -0,0 +1,85 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+
+class FairDispatcher:
+    """
+    Bounds the verifications this producer has in flight on the queue and
+    hands free slots to waiting clients in round-robin order. A client with
+    a hundred requests waiting gets one slot per turn like everyone else,
+    instead of filling the queue ahead of them.
+
+    Runs on the event loop: acquire before starting the RPC, release after.
+    """
+
+    def __init__(self, max_in_flight=16):
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight = 0
+        # client -> waiters; the order of the keys is the round-robin order
+        self.waiting = OrderedDict()
+
+    @property
+    def queued(self):
+        return sum(len(waiters) for waiters in self.waiting.values())
+
+    async def acquire(self, client, cancelled: asyncio.Event = None) -> bool:
+        """
+        Wait for a slot. Returns False, without a slot, if `cancelled` is set
+        first.
+        """
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(client, deque()).append(waiter)
+        cancel_wait = asyncio.ensure_future(cancelled.wait()) if cancelled is not None else None
+        try:
+            if cancel_wait is None:
+                await waiter
+            else:
+                await asyncio.wait({waiter, cancel_wait}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            self._abandon(client, waiter)
+            raise
+        finally:
+            if cancel_wait is not None:
+                cancel_wait.cancel()
+        if waiter.done():
+            return True
+        self._abandon(client, waiter)
+        return False
+
+    def _abandon(self, client, waiter):
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just before the caller gave up
+            self.release()
+            return
+        waiter.cancel()
+        waiters = self.waiting.get(client)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self.waiting[client]
+
+    def release(self):
+        """Pass the slot to the next client in turn, or free it"""
+        while self.waiting:
+            client, waiters = self.waiting.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                # Back of the line until every other waiting client had a turn
+                self.waiting[client] = waiters
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, client):
+        await self.acquire(client)
+        try:
+            yield
+        finally:
+            self.release()
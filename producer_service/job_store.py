@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class Job:
+    job_id: str
+    status: str = "queued"  # queued -> running -> done | failed
+    events: list = field(default_factory=list)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "events": self.events,
+        }
+
+
+class JobStore:
+    """
+    In-memory store for asynchronous verification jobs.
+
+    The RPC runs on a worker thread that appends progress events and the final
+    result; HTTP handlers read them (polling or SSE). Finished jobs are dropped
+    after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def create(self, job_id=None) -> Job:
+        job = Job(job_id=job_id or str(uuid.uuid4()))
+        with self.lock:
+            self._expire()
+            self.jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def start(self, job_id):
+        with self.lock:
+            self.jobs[job_id].status = "running"
+
+    def add_event(self, job_id, event: dict):
+        with self.lock:
+            self.jobs[job_id].events.append(event)
+
+    def finish(self, job_id, result: dict):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.result = result
+            job.status = "done"
+            job.finished_at = time.time()
+
+    def fail(self, job_id, error: str):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.error = error
+            job.status = "failed"
+            job.finished_at = time.time()
+
+    def _expire(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
@@ -1,16 +1,23 @@
 import os
 import art # type: ignore
 import uuid
+import asyncio
+import threading
 import json
 import pika
 import time
 import datetime
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, UploadFile, Form, File
-from utils.validate import validate_file_extension, validate_file_size
-from rabbitmq_client import RabbitMQClient
+from fastapi import FastAPI, UploadFile, Form, File, Query, Request
+from typing import List
+from utils.validate import validate_file_extension, validate_file_size, validate_image_header
+from rabbitmq_client import RabbitMQClient, VerificationCancelled
+from job_store import JobStore
+from fair_dispatcher import FairDispatcher
+from rate_limit import build_rate_limiter
+from utils.tracing import build_tracer, stage
+from renditions import RenditionCache, RenditionError, RenditionStaticFiles
 import uvicorn
 from dotenv import load_dotenv
 from pathlib import Path
@@ -24,62 +31,357 @@ app.add_middleware(CORSMiddleware,allow_origins=["*"],allow_credentials=True,all
 # Use local path for file storage
 upload_path = "./uploads"
 os.makedirs(upload_path, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+
+# Aligned faces are also served as smaller derivatives (?w=256&format=webp), rendered on first request
+renditions = RenditionCache(
+    cache_dir=os.getenv("RENDITION_CACHE_DIR", "./renditions"),
+    widths=[int(w) for w in os.getenv("RENDITION_WIDTHS", "128,256,512").split(",")],
+    formats=os.getenv("RENDITION_FORMATS", "webp,jpeg").split(","),
+    quality=int(os.getenv("RENDITION_QUALITY", "80"))
+)
+app.mount("/uploads", RenditionStaticFiles(
+    directory="uploads",
+    renditions=renditions,
+    max_age=int(os.getenv("STATIC_MAX_AGE", "31536000"))
+), name="uploads")
+
+# Asynchronous verification jobs
+job_store = JobStore(ttl=int(os.getenv("JOB_TTL_SECONDS", "3600")))
+SSE_POLL_INTERVAL = 0.1
+SSE_KEEPALIVE_SECONDS = 15
+
+# Multi-file verification: files per request, verified concurrently
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "10"))
+BATCH_MODES = ("all", "first_passing")
+
+# Per-client admission (RATE_LIMIT_* variables) and fair dispatch to the queue:
+# at most DISPATCH_MAX_IN_FLIGHT verifications of this replica wait on the
+# consumers, free slots go round-robin to the waiting clients
+rate_limiter = build_rate_limiter(os.environ)
+dispatcher = FairDispatcher(int(os.getenv("DISPATCH_MAX_IN_FLIGHT", "16")))
+# Asynchronous jobs waiting for (or holding) a dispatch slot
+background_jobs = set()
+
+# Distributed tracing (TRACING_* variables), context travels in the AMQP headers
+tracer = build_tracer("face-verification-producer")
 
 art.tprint("Face Verification API")
 print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - Face verification master.\n")
 
-@app.post("/api/v1/face/verification", tags=["face"])
-async def face_verification(
-    file: UploadFile = File(...),
-):
-    try:
-        now = datetime.datetime.now()
-        uuid_name = str(uuid.uuid4())
-        folder_path = Path(f"{upload_path}/{now:%Y/%m/%d}")
-        os.makedirs(folder_path, exist_ok=True)
+async def save_upload(file: UploadFile, now: datetime.datetime, uuid_name: str, trace=None):
+    """
+    Validate an upload and write it to storage.
+    Returns (file_path, header) or the JSONResponse describing why it was rejected.
+    """
+    folder_path = Path(f"{upload_path}/{now:%Y/%m/%d}")
+    os.makedirs(folder_path, exist_ok=True)
 
+    with stage(trace, "upload") as span:
         if (vr := await validate_file_extension(file.filename)):
             return vr
         file_bytes = file.file.read()
+        if span is not None:
+            span.attributes["size_bytes"] = len(file_bytes)
         if (vs := await validate_file_size(file_bytes)):
             return vs
+        header = await validate_image_header(file_bytes)
+        if isinstance(header, JSONResponse):
+            return header
         file.file.seek(0)
 
-        file_ext = file.filename.split('.')[-1]
-        file_path = folder_path / f"{uuid_name}.{file_ext}"
+    file_ext = file.filename.split('.')[-1]
+    file_path = folder_path / f"{uuid_name}.{file_ext}"
+    with stage(trace, "disk_write"):
         with open(file_path, "wb") as fimg:
             fimg.write(file_bytes)
+    return file_path, header
 
-        mq_client = RabbitMQClient(
-            qname=os.getenv("RABBITMQ_QUEUE"),
-            rabbitmq_url=os.getenv("RABBITMQ_URL"),
-            local=False
-        )
+def rendition_query(width, image_format):
+    """Validated query selecting the rendition the client asked for, or a 400 JSONResponse"""
+    try:
+        return renditions.query(*renditions.validate(width, image_format))
+    except RenditionError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+def run_verification(file_path: Path, header, now: datetime.datetime, uuid_name: str, on_progress=None, trace=None, rendition: str = "", cancel=None) -> bytes:
+    """
+    Send the stored image through the queue and return the JSON response body.
+    `rendition` is the query appended to the aligned face URL (see rendition_query).
+    `cancel` (threading.Event) abandons the wait with VerificationCancelled once set.
+    """
+    mq_client = RabbitMQClient(
+        qname=os.getenv("RABBITMQ_QUEUE"),
+        rabbitmq_url=os.getenv("RABBITMQ_URL"),
+        local=False
+    )
+    try:
         if not mq_client.connect():
             raise ConnectionError("Failed to connect to RabbitMQ")
 
         request_data = {"file": str(file_path.absolute())}
-        metadata = {"request_id": uuid_name, "timestamp": now.isoformat()}
-        response = mq_client.call(request_data, metadata)
-        data_json = json.loads(response.decode('utf-8'))
+        metadata = {
+            "request_id": uuid_name,
+            "timestamp": now.isoformat(),
+            "image_format": header.format,
+            "image_width": header.width,
+            "image_height": header.height,
+            "image_orientation": header.orientation
+        }
+        data_json = mq_client.call(request_data, metadata, on_progress=on_progress, trace=trace, cancel=cancel)
+    finally:
+        mq_client.close()
 
+    with stage(trace, "write_result"):
         if 'align_face' in data_json:
             af = data_json['align_face'].split('/')
             static_base_url = os.getenv("BASEURL_STATIC")
-            data_json['align_face'] = f"{static_base_url}/{'/'.join(af[-4:])}"
+            data_json['align_face'] = f"{static_base_url}/{'/'.join(af[-4:])}{rendition}"
 
-        with open(file_path.parent / f"{uuid_name}.json", "w") as f:
-            json.dump(data_json, f)
-        return JSONResponse(status_code=200, content=data_json)
+        # Encode once, reuse the same bytes for the sidecar file and the response
+        body = json.dumps(data_json).encode('utf-8')
+        with open(file_path.parent / f"{uuid_name}.json", "wb") as f:
+            f.write(body)
+    if trace is not None:
+        trace.root.attributes["ok"] = bool(data_json.get("OK"))
+    return body
+
+@app.post("/api/v1/face/verification", tags=["face"])
+async def face_verification(
+    request: Request,
+    file: UploadFile = File(...),
+    width: int = Query(None, description="Width of the aligned face rendition"),
+    image_format: str = Query(None, alias="format", description="Encoding of the aligned face rendition"),
+):
+    client = await rate_limiter.admit(request)
+    if isinstance(client, JSONResponse):
+        return client
+    rendition = rendition_query(width, image_format)
+    if isinstance(rendition, JSONResponse):
+        return rendition
+    now = datetime.datetime.now()
+    uuid_name = str(uuid.uuid4())
+    trace = tracer.start_trace("POST /api/v1/face/verification", request_id=uuid_name)
+    try:
+        saved = await save_upload(file, now, uuid_name, trace=trace)
+        if isinstance(saved, JSONResponse):
+            trace.finish(status_code=saved.status_code)
+            return saved
+        file_path, header = saved
+
+        with stage(trace, "dispatch_wait"):
+            await dispatcher.acquire(client)
+        try:
+            body = await asyncio.to_thread(run_verification, file_path, header, now, uuid_name, trace=trace, rendition=rendition)
+        finally:
+            dispatcher.release()
+        trace.finish(status_code=200)
+        return Response(status_code=200, content=body, media_type="application/json")
 
     except Exception as e:
         print(f"Error processing request: {str(e)}")
+        trace.finish(error=e, status_code=500)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+async def verify_batch_file(index, file, saved, now, uuid_name, trace, rendition, client, cancel, cancelled):
+    """
+    Per-file entry of the batch response; the verification runs on a worker
+    thread once the dispatcher gives it a slot. `cancel` (threading.Event)
+    stops a running call, `cancelled` (asyncio.Event) one still waiting.
+    """
+    entry = {"index": index, "filename": file.filename, "request_id": uuid_name}
+    if isinstance(saved, JSONResponse):
+        return {**entry, "status": "rejected", "status_code": saved.status_code, "result": json.loads(saved.body)}
+    file_path, header = saved
+    if not await dispatcher.acquire(client, cancelled):
+        return {**entry, "status": "cancelled"}
+
+    def verify():
+        with stage(trace, "verify_file", index=index, request_id=uuid_name):
+            return run_verification(file_path, header, now, uuid_name, trace=trace, rendition=rendition, cancel=cancel)
+
+    try:
+        body = await asyncio.to_thread(verify)
+        return {**entry, "status": "done", "result": json.loads(body)}
+    except VerificationCancelled:
+        return {**entry, "status": "cancelled"}
+    except Exception as e:
+        print(f"Error processing {file.filename}: {str(e)}")
+        return {**entry, "status": "error", "result": {"error": str(e)}}
     finally:
-        if 'mq_client' in locals():
-            mq_client.close()
+        dispatcher.release()
+
+@app.post("/api/v1/face/verification/batch", tags=["face"])
+async def face_verification_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    mode: str = Query("all", description="'all' returns every result, 'first_passing' stops at the first image that passes"),
+    width: int = Query(None, description="Width of the aligned face rendition"),
+    image_format: str = Query(None, alias="format", description="Encoding of the aligned face rendition"),
+):
+    """
+    Verify several images in one call. Every valid file is stored and
+    published at once, so the consumers work on them in parallel; results
+    come back per file in upload order. In `first_passing` mode the response
+    is sent as soon as one image passes, and the files still waiting are
+    cancelled: their calls stop waiting, and the consumers skip them if they
+    have not started them yet.
+    """
+    if mode not in BATCH_MODES:
+        return JSONResponse(status_code=400, content={"error": f"Unsupported mode '{mode}', allowed: {', '.join(BATCH_MODES)}"})
+    if len(files) > MAX_BATCH_FILES:
+        return JSONResponse(status_code=400, content={"error": f"Too many files ({len(files)}), maximum is {MAX_BATCH_FILES}"})
+    # One token per image
+    client = await rate_limiter.admit(request, cost=len(files))
+    if isinstance(client, JSONResponse):
+        return client
+    rendition = rendition_query(width, image_format)
+    if isinstance(rendition, JSONResponse):
+        return rendition
+
+    now = datetime.datetime.now()
+    trace = tracer.start_trace("POST /api/v1/face/verification/batch", mode=mode, files=len(files))
+    cancel = threading.Event()
+    cancelled = asyncio.Event()
+    try:
+        tasks = []
+        for index, file in enumerate(files):
+            uuid_name = str(uuid.uuid4())
+            saved = await save_upload(file, now, uuid_name, trace=trace)
+            # Start verifying each file as soon as it is stored
+            tasks.append(asyncio.create_task(
+                verify_batch_file(index, file, saved, now, uuid_name, trace, rendition, client, cancel, cancelled)
+            ))
+
+        passed = None
+        if mode == "first_passing":
+            for next_done in asyncio.as_completed(tasks):
+                entry = await next_done
+                if entry["status"] == "done" and entry["result"].get("OK"):
+                    passed = entry
+                    cancel.set()
+                    cancelled.set()
+                    break
+        results = await asyncio.gather(*tasks)
+        if mode == "all":
+            passed = next((entry for entry in results if entry["status"] == "done" and entry["result"].get("OK")), None)
+
+        trace.finish(status_code=200, passed=passed is not None)
+        return JSONResponse(status_code=200, content={
+            "mode": mode,
+            "OK": passed is not None,
+            "passed_request_id": passed["request_id"] if passed else None,
+            "results": results
+        })
+
+    except Exception as e:
+        print(f"Error processing batch: {str(e)}")
+        cancel.set()
+        cancelled.set()
+        trace.finish(error=e, status_code=500)
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+def run_job(job_id: str, file_path: Path, header, now: datetime.datetime, trace=None, rendition: str = ""):
+    """Worker thread for an asynchronous job: streams progress into the job store"""
+    job_store.start(job_id)
+    try:
+        body = run_verification(
+            file_path, header, now, job_id,
+            on_progress=lambda event: job_store.add_event(job_id, event),
+            trace=trace,
+            rendition=rendition
+        )
+        job_store.finish(job_id, json.loads(body))
+        if trace is not None:
+            trace.finish()
+    except Exception as e:
+        print(f"Error processing job {job_id}: {str(e)}")
+        job_store.fail(job_id, str(e))
+        if trace is not None:
+            trace.finish(error=e)
+
+async def dispatch_job(client, *args):
+    """Run an asynchronous job on a worker thread once the dispatcher gives it a slot"""
+    async with dispatcher.slot(client):
+        await asyncio.to_thread(run_job, *args)
+
+@app.post("/api/v1/face/verification/jobs", tags=["face"], status_code=202)
+async def create_verification_job(
+    request: Request,
+    file: UploadFile = File(...),
+    width: int = Query(None, description="Width of the aligned face rendition"),
+    image_format: str = Query(None, alias="format", description="Encoding of the aligned face rendition"),
+):
+    client = await rate_limiter.admit(request)
+    if isinstance(client, JSONResponse):
+        return client
+    rendition = rendition_query(width, image_format)
+    if isinstance(rendition, JSONResponse):
+        return rendition
+    now = datetime.datetime.now()
+    job = job_store.create()
+    trace = tracer.start_trace("POST /api/v1/face/verification/jobs", request_id=job.job_id)
+    try:
+        saved = await save_upload(file, now, job.job_id, trace=trace)
+        if isinstance(saved, JSONResponse):
+            job_store.fail(job.job_id, "Upload rejected")
+            trace.finish(status_code=saved.status_code)
+            return saved
+        file_path, header = saved
+
+        # The trace stays open until the job finishes on its worker thread
+        task = asyncio.create_task(dispatch_job(client, job.job_id, file_path, header, now, trace, rendition))
+        background_jobs.add(task)
+        task.add_done_callback(background_jobs.discard)
+        return JSONResponse(status_code=202, content={
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": f"/api/v1/face/verification/jobs/{job.job_id}",
+            "events_url": f"/api/v1/face/verification/jobs/{job.job_id}/events"
+        })
+
+    except Exception as e:
+        print(f"Error creating job: {str(e)}")
+        trace.finish(error=e, status_code=500)
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/api/v1/face/verification/jobs/{job_id}", tags=["face"])
+async def get_verification_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return JSONResponse(status_code=200, content=job.to_dict())
+
+@app.get("/api/v1/face/verification/jobs/{job_id}/events", tags=["face"])
+async def stream_verification_job(job_id: str):
+    """Server-sent events: one `progress` event per check, then `result` (or `error`)"""
+    if job_store.get(job_id) is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+
+    async def event_stream():
+        sent = 0
+        last_send = time.monotonic()
+        while True:
+            job = job_store.get(job_id)
+            if job is None:
+                return
+            # Read the status first: every event is appended before the job finishes
+            status = job.status
+            for event in job.events[sent:]:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                sent += 1
+                last_send = time.monotonic()
+            if status == "done":
+                yield f"event: result\ndata: {json.dumps(job.result)}\n\n"
+                return
+            if status == "failed":
+                yield f"event: error\ndata: {json.dumps({'error': job.error})}\n\n"
+                return
+            if time.monotonic() - last_send > SSE_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_send = time.monotonic()
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("API_PORT")), reload=True)
\ No newline at end of file
@@ -1,19 +1,32 @@
 import pika
 import uuid
-import json
 import os
+import time
+
+from utils.serialization import decode, encode, supported_content_types
+from utils.tracing import stage
+
+# Longest wait for a reply before the cancel flag is checked again
+CANCEL_POLL_SECONDS = 0.1
+
+class VerificationCancelled(Exception):
+    pass
 
 class RabbitMQClient(object):
     
-    def __init__(self, qname, rabbitmq_url, local=False):
+    def __init__(self, qname, rabbitmq_url, local=False, content_type=None):
         self.qname = qname
         self.rabbitmq_url = rabbitmq_url
         self.local = local
+        # Preferred wire encoding (msgpack when installed, JSON otherwise)
+        self.content_type = content_type or supported_content_types()[0]
         self.connection = None
         self.channel = None
         self.callback_queue = None
         self.response = None
+        self.response_content_type = None
         self.corr_id = None
+        self.on_progress = None
 
     def connect(self):
         """Establish connection to RabbitMQ"""
@@ -62,33 +75,64 @@ class RabbitMQClient(object):
             return False
 
     def on_response(self, ch, method, props, body):
-        if self.corr_id == props.correlation_id:
-            self.response = body
+        if self.corr_id != props.correlation_id:
+            return
+        # Progress events share the reply queue and correlation_id with the final result
+        if props.type == 'progress':
+            if self.on_progress is not None:
+                self.on_progress(decode(body, props.content_type))
+            return
+        self.response_content_type = props.content_type
+        self.response = body
 
-    def call(self, data, metadata):
-        """Send a message to RabbitMQ and wait for response"""
+    def call(self, data, metadata, on_progress=None, trace=None, cancel=None):
+        """
+        Send a message to RabbitMQ and wait for the decoded response.
+        When `on_progress` is given the consumer is asked to stream per-check
+        verdicts, which are passed to it as they arrive. With a `trace` the
+        publish and the wait are recorded as spans and the trace context
+        travels to the consumer in the `traceparent` header.
+        `cancel` is an optional threading.Event: once set the wait is abandoned
+        with VerificationCancelled. Closing the connection then deletes the
+        reply queue, which tells the consumer to skip the request if it has
+        not started it yet.
+        """
         if not self.connection or self.connection.is_closed:
             if not self.connect():
                 raise ConnectionError("Failed to connect to RabbitMQ")
         
         self.response = None
         self.corr_id = str(uuid.uuid4())
+        self.on_progress = on_progress
+        if on_progress is not None:
+            metadata = {**metadata, "progress": True}
+        if cancel is not None:
+            metadata = {**metadata, "cancellable": True}
         
         # Send the actual data in the body
-        self.channel.basic_publish(
-            exchange='',
-            routing_key=self.qname,
-            properties=pika.BasicProperties(
-                reply_to=self.callback_queue,
-                correlation_id=self.corr_id,
-                headers=metadata
-            ),
-            body=json.dumps(data))
+        with stage(trace, "enqueue", queue=self.qname) as span:
+            if trace is not None:
+                # enqueued_at lets the consumer measure time spent waiting in the queue
+                metadata = {**metadata, "traceparent": trace.traceparent(span), "enqueued_at": time.time()}
+            self.channel.basic_publish(
+                exchange='',
+                routing_key=self.qname,
+                properties=pika.BasicProperties(
+                    reply_to=self.callback_queue,
+                    correlation_id=self.corr_id,
+                    content_type=self.content_type,
+                    headers=metadata
+                ),
+                body=encode(data, self.content_type))
         
         print(f" [x] Submit new request for {self.qname}")
-        while self.response is None:
-            self.connection.process_data_events()
-        return self.response
+        with stage(trace, "await_reply"):
+            while self.response is None:
+                if cancel is not None and cancel.is_set():
+                    raise VerificationCancelled("Verification cancelled")
+                # Returns as soon as the reply is dispatched, the limit only bounds the wait
+                self.connection.process_data_events(time_limit=CANCEL_POLL_SECONDS)
+        return decode(self.response, self.response_content_type)
     
     def close(self):
         """Close the RabbitMQ connection"""
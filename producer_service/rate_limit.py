@@ -0,0 +1,164 @@
+import math
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+
+import anyio
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+try:
+    import redis  # optional: shared buckets across producer replicas
+except ImportError:
+    redis = None
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    remaining: float
+    retry_after: float = 0.0
+
+
+class MemoryBackend:
+    """
+    Token buckets in process memory. The default, and the local stand-in for
+    the shared backend: limits then apply per producer replica.
+    """
+    blocking = False
+
+    def __init__(self, max_keys=100000):
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def take(self, key, rate, burst, cost=1) -> Decision:
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            if len(self.buckets) >= self.max_keys and key not in self.buckets:
+                self._prune(now, rate, burst)
+            self.buckets[key] = (tokens, now)
+        return Decision(allowed, tokens, 0.0 if allowed else (cost - tokens) / rate)
+
+    def _prune(self, now, rate, burst):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = burst / rate
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < full_after}
+
+
+# Refill, take and store atomically on the server, with the server's clock
+# so every replica sees the same time
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    """Token buckets shared by every producer replica (RATE_LIMIT_BACKEND=redis)"""
+    blocking = True
+
+    def __init__(self, url, prefix="ratelimit:"):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(_TOKEN_BUCKET_LUA)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst, cost=1) -> Decision:
+        allowed, tokens = self.script(keys=[self.prefix + key], args=[rate, burst, cost])
+        tokens = float(tokens)
+        return Decision(bool(allowed), tokens, 0.0 if allowed else (cost - tokens) / rate)
+
+
+class RateLimiter:
+    """
+    Per-client admission control: one token bucket per API key, or per IP
+    address for callers without one. Each verified image costs one token;
+    tokens refill at `rate` per second up to `burst`.
+    """
+
+    def __init__(self, backend, rate, burst, key_header="X-API-Key", trust_forwarded=False, enabled=True):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.key_header = key_header
+        self.trust_forwarded = trust_forwarded
+        self.enabled = enabled
+
+    def client_key(self, request: Request) -> str:
+        api_key = request.headers.get(self.key_header)
+        if api_key:
+            # Keys are never kept in clear, in memory or in the shared store
+            return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:24]
+        forwarded = request.headers.get("X-Forwarded-For") if self.trust_forwarded else None
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+        return "ip:" + (request.client.host if request.client else "unknown")
+
+    async def admit(self, request: Request, cost=1):
+        """
+        Take `cost` tokens for the caller.
+        Returns the client key, or a 429 JSONResponse when over the limit.
+        """
+        client = self.client_key(request)
+        if not self.enabled:
+            return client
+        try:
+            if self.backend.blocking:
+                decision = await anyio.to_thread.run_sync(self.backend.take, client, self.rate, self.burst, cost)
+            else:
+                decision = self.backend.take(client, self.rate, self.burst, cost)
+        except Exception as e:
+            # An unavailable shared store must not take the API down with it
+            print(f"Rate limit backend error, admitting request: {str(e)}")
+            return client
+        if decision.allowed:
+            return client
+        if cost > self.burst:
+            message = f"Request needs {cost} tokens, more than the burst of {self.burst:g}"
+        else:
+            message = "Rate limit exceeded"
+        return JSONResponse(
+            status_code=429,
+            content={"error": message, "retry_after": round(decision.retry_after, 3)},
+            headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))}
+        )
+
+
+def build_rate_limiter(env) -> RateLimiter:
+    """Rate limiter from the RATE_LIMIT_* variables"""
+    backend_name = env.get("RATE_LIMIT_BACKEND", "memory")
+    if backend_name == "redis":
+        backend = RedisBackend(env.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    else:
+        backend = MemoryBackend()
+    return RateLimiter(
+        backend,
+        rate=float(env.get("RATE_LIMIT_RATE", "5")),
+        burst=float(env.get("RATE_LIMIT_BURST", "20")),
+        key_header=env.get("RATE_LIMIT_KEY_HEADER", "X-API-Key"),
+        trust_forwarded=env.get("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes"),
+        enabled=env.get("RATE_LIMIT_ENABLED", "false").lower() in ("1", "true", "yes"),
+    )
@@ -0,0 +1,171 @@
+import os
+import stat
+import hashlib
+import threading
+from typing import Optional
+
+import anyio
+from PIL import Image
+from fastapi import HTTPException
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+# Output encodings: name -> (Pillow format, media type, file extension)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "jpg": ("JPEG", "image/jpeg", "jpg"),
+    "png": ("PNG", "image/png", "png"),
+}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+class RenditionError(ValueError):
+    pass
+
+
+class RenditionCache:
+    """
+    Resized / re-encoded copies of stored images, generated on first request
+    and kept on disk next to each other under `cache_dir`. A rendition is
+    regenerated when its source is newer. Only the configured widths and
+    formats are accepted, so the cache cannot be filled with arbitrary sizes.
+    """
+
+    def __init__(self, cache_dir, widths, formats, quality=80):
+        self.cache_dir = cache_dir
+        self.widths = sorted(widths)
+        self.formats = [f for f in formats if f in FORMATS]
+        self.quality = quality
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        self.etags = {}
+
+    def validate(self, width: Optional[int], fmt: Optional[str]):
+        """Normalized (width, format) of a request, raising RenditionError when not allowed"""
+        if width is not None and width not in self.widths:
+            raise RenditionError(f"Unsupported width {width}, allowed: {', '.join(map(str, self.widths))}")
+        if fmt is not None:
+            fmt = fmt.lower()
+            if fmt not in self.formats:
+                raise RenditionError(f"Unsupported format '{fmt}', allowed: {', '.join(self.formats)}")
+        return width, fmt
+
+    def query(self, width: Optional[int], fmt: Optional[str]) -> str:
+        """Query string selecting a rendition on a static URL ('' for the original)"""
+        params = []
+        if width is not None:
+            params.append(f"w={width}")
+        if fmt is not None:
+            params.append(f"format={fmt}")
+        return f"?{'&'.join(params)}" if params else ""
+
+    def path_for(self, relative_path, width, fmt):
+        stem, ext = os.path.splitext(relative_path)
+        extension = FORMATS[fmt][2] if fmt else ext.lstrip(".").lower()
+        return os.path.join(self.cache_dir, f"{stem}.w{width or 'orig'}.{extension}")
+
+    def _lock(self, key):
+        with self.locks_lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def get(self, source_path, relative_path, width, fmt):
+        """Path of the rendition, generating it if missing or stale (blocking)"""
+        target = self.path_for(relative_path, width, fmt)
+        with self._lock(target):
+            source_mtime = os.stat(source_path).st_mtime_ns
+            try:
+                if os.stat(target).st_mtime_ns >= source_mtime:
+                    return target
+            except FileNotFoundError:
+                pass
+            self._render(source_path, target, width, fmt)
+        return target
+
+    def _render(self, source_path, target, width, fmt):
+        with Image.open(source_path) as image:
+            pil_format = FORMATS[fmt][0] if fmt else image.format
+            if width is not None and width < image.width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Write aside and rename, concurrent readers never see a partial file
+            tmp_path = f"{target}.{threading.get_ident()}.tmp"
+            options = {"quality": self.quality} if pil_format in ("JPEG", "WEBP") else {"optimize": True}
+            image.save(tmp_path, format=pil_format, **options)
+        os.replace(tmp_path, target)
+
+    def etag(self, path, stat_result):
+        """Strong ETag: content hash, memoized per file version"""
+        key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+        etag = self.etags.get(key)
+        if etag is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            etag = f'"{digest.hexdigest()[:32]}"'
+            if len(self.etags) > 10000:
+                self.etags.clear()
+            self.etags[key] = etag
+        return etag
+
+
+class RenditionStaticFiles(StaticFiles):
+    """
+    StaticFiles serving stored files with long-lived caching headers, plus
+    on-demand renditions of images selected with `?w=<width>&format=<fmt>`.
+    Stored files never change once written (UUID names), so they are
+    served as immutable.
+    """
+
+    def __init__(self, *args, renditions: RenditionCache, max_age=31536000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.renditions = renditions
+        self.cache_control = f"public, max-age={max_age}, immutable"
+
+    async def get_response(self, path, scope):
+        params = QueryParams(scope.get("query_string", b""))
+        if "w" not in params and "format" not in params:
+            return await super().get_response(path, scope)
+
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+        try:
+            width = int(params["w"]) if "w" in params else None
+            width, fmt = self.renditions.validate(width, params.get("format"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS:
+            raise HTTPException(status_code=404)
+
+        try:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        except (OSError, ValueError):
+            raise HTTPException(status_code=404)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+
+        def render():
+            rendition_path = self.renditions.get(full_path, path, width, fmt)
+            rendition_stat = os.stat(rendition_path)
+            return rendition_path, rendition_stat, self.renditions.etag(rendition_path, rendition_stat)
+
+        rendition_path, rendition_stat, etag = await anyio.to_thread.run_sync(render)
+        media_type = FORMATS[fmt][1] if fmt else None
+        return self.file_response(rendition_path, rendition_stat, scope, media_type=media_type, etag=etag)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200, media_type=None, etag=None):
+        # Originals keep the stat based ETag, renditions get a content hash
+        headers = {"Cache-Control": self.cache_control}
+        if etag is not None:
+            headers["ETag"] = etag
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                headers=headers, media_type=media_type)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
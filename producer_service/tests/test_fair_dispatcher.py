@@ -0,0 +1,84 @@
+import asyncio
+
+from fair_dispatcher import FairDispatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_slots_go_round_robin_between_clients():
+    async def scenario():
+        dispatcher = FairDispatcher(max_in_flight=1)
+        order = []
+
+        async def request(client, n):
+            await dispatcher.acquire(client)
+            order.append(f"{client}{n}")
+            await asyncio.sleep(0)
+            dispatcher.release()
+
+        await dispatcher.acquire("busy")
+        tasks = [asyncio.create_task(request("a", n)) for n in range(3)]
+        tasks.append(asyncio.create_task(request("b", 0)))
+        await settle()
+        assert dispatcher.queued == 4
+        dispatcher.release()
+        await asyncio.gather(*tasks)
+        assert dispatcher.in_flight == 0
+        return order
+
+    assert run(scenario()) == ["a0", "b0", "a1", "a2"]
+
+
+def test_cancelled_wait_gives_up_without_a_slot():
+    async def scenario():
+        dispatcher = FairDispatcher(max_in_flight=1)
+        await dispatcher.acquire("a")
+        cancelled = asyncio.Event()
+        waiting = asyncio.create_task(dispatcher.acquire("b", cancelled))
+        await settle()
+        cancelled.set()
+        assert await waiting is False
+        assert dispatcher.queued == 0
+        dispatcher.release()
+        assert dispatcher.in_flight == 0
+
+    run(scenario())
+
+
+def test_abandoned_task_leaves_the_line():
+    async def scenario():
+        dispatcher = FairDispatcher(max_in_flight=1)
+        await dispatcher.acquire("a")
+        waiting = asyncio.create_task(dispatcher.acquire("b"))
+        await settle()
+        waiting.cancel()
+        await settle()
+        assert dispatcher.queued == 0
+        dispatcher.release()
+        assert dispatcher.in_flight == 0
+
+    run(scenario())
+
+
+def test_slot_handed_over_to_a_cancelled_task_is_passed_on():
+    async def scenario():
+        dispatcher = FairDispatcher(max_in_flight=1)
+        await dispatcher.acquire("a")
+        giving_up = asyncio.create_task(dispatcher.acquire("b"))
+        next_in_line = asyncio.create_task(dispatcher.acquire("c"))
+        await settle()
+        # The slot reaches b in the same step as its cancellation
+        dispatcher.release()
+        giving_up.cancel()
+        assert await next_in_line is True
+        assert giving_up.cancelled()
+        assert dispatcher.in_flight == 1
+
+    run(scenario())
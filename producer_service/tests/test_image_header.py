@@ -0,0 +1,86 @@
+import io
+
+import pytest
+from PIL import Image
+
+from utils.image_header import ImageHeaderError, read_image_header
+
+
+def encode(fmt, size=(200, 120), **kwargs):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (120, 80, 40)).save(buf, fmt, **kwargs)
+    return buf.getvalue()
+
+
+def jpeg_with_orientation(orientation, size=(200, 120)):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    return encode("JPEG", size, exif=exif.tobytes())
+
+
+def test_jpeg_dimensions():
+    header = read_image_header(encode("JPEG"))
+    assert (header.format, header.width, header.height, header.orientation) == ("jpeg", 200, 120, 1)
+
+
+def test_progressive_jpeg():
+    header = read_image_header(encode("JPEG", progressive=True))
+    assert (header.width, header.height) == (200, 120)
+
+
+@pytest.mark.parametrize("orientation, display_size", [(1, (200, 120)), (3, (200, 120)), (6, (120, 200)), (8, (120, 200))])
+def test_exif_orientation_swaps_display_size(orientation, display_size):
+    header = read_image_header(jpeg_with_orientation(orientation))
+    assert header.orientation == orientation
+    assert header.display_size == display_size
+
+
+def test_jpeg_with_trailer_after_eoi_is_accepted():
+    # Samsung SEF / Motion Photo style data appended after the end of the image
+    data = encode("JPEG", (200, 200)) + b"SEFH" + bytes(range(256)) * 4 + b"SEFT"
+    header = read_image_header(data)
+    assert (header.width, header.height) == (200, 200)
+
+
+def test_jpeg_with_trailing_padding_is_accepted():
+    header = read_image_header(encode("JPEG") + b"\x00" * 64)
+    assert header.width == 200
+
+
+def test_truncated_jpeg_is_rejected():
+    data = encode("JPEG", (200, 200))
+    with pytest.raises(ImageHeaderError, match="Truncated JPEG"):
+        read_image_header(data[:len(data) // 2])
+
+
+def test_jpeg_cut_inside_the_headers_is_rejected():
+    data = encode("JPEG")
+    with pytest.raises(ImageHeaderError):
+        read_image_header(data[:100])
+
+
+def test_jpeg_without_scan_is_rejected():
+    data = encode("JPEG")
+    # Keep the headers up to the start of scan, then only an EOI
+    with pytest.raises(ImageHeaderError, match="Truncated JPEG"):
+        read_image_header(data[:data.index(b"\xff\xda")] + b"\xff\xd9")
+
+
+def test_png_dimensions():
+    header = read_image_header(encode("PNG", (64, 32)))
+    assert (header.format, header.width, header.height) == ("png", 64, 32)
+
+
+def test_png_with_trailer_is_accepted():
+    assert read_image_header(encode("PNG") + b"trailer").width == 200
+
+
+def test_truncated_png_is_rejected():
+    data = encode("PNG")
+    with pytest.raises(ImageHeaderError, match="Truncated PNG"):
+        read_image_header(data[:-6])
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ImageHeaderError, match="Unrecognized"):
+        read_image_header(b"GIF89a" + b"\x00" * 32)
@@ -0,0 +1,40 @@
+from job_store import JobStore
+
+
+def test_job_lifecycle():
+    store = JobStore()
+    job = store.create()
+    assert store.get(job.job_id).status == "queued"
+
+    store.start(job.job_id)
+    store.add_event(job.job_id, {"check": "detect_face", "passed": True, "message": "ok"})
+    store.finish(job.job_id, {"OK": True})
+
+    payload = store.get(job.job_id).to_dict()
+    assert payload["status"] == "done"
+    assert payload["result"] == {"OK": True}
+    assert [event["check"] for event in payload["events"]] == ["detect_face"]
+
+
+def test_failed_job_keeps_the_error():
+    store = JobStore()
+    job = store.create("fixed-id")
+    store.fail("fixed-id", "Timeout")
+    assert store.get("fixed-id").to_dict()["status"] == "failed"
+    assert job.error == "Timeout"
+
+
+def test_only_finished_jobs_expire():
+    store = JobStore(ttl=10)
+    running, finished = store.create(), store.create()
+    store.start(running.job_id)
+    store.finish(finished.job_id, {"OK": False})
+    finished.finished_at -= 11
+
+    store.create()  # expiry runs on create
+    assert store.get(finished.job_id) is None
+    assert store.get(running.job_id) is running
+
+
+def test_unknown_job_is_none():
+    assert JobStore().get("missing") is None
@@ -0,0 +1,69 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from rabbitmq_client import RabbitMQClient, VerificationCancelled
+from utils.serialization import decode, encode
+
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, properties, body):
+        self.published.append((routing_key, properties, body))
+
+
+class FakeConnection:
+    """Delivers `replies` (type, payload) to the client, one per process_data_events call"""
+
+    def __init__(self, client, replies=()):
+        self.client = client
+        self.replies = list(replies)
+        self.is_closed = False
+        self.waits = 0
+
+    def process_data_events(self, time_limit=0):
+        self.waits += 1
+        if self.replies:
+            kind, payload = self.replies.pop(0)
+            props = SimpleNamespace(correlation_id=self.client.corr_id, type=kind, content_type="application/json")
+            self.client.on_response(None, None, props, encode(payload, "application/json"))
+
+
+def client(replies=()):
+    client = RabbitMQClient("face", "amqp://unused", content_type="application/json")
+    client.connection = FakeConnection(client, replies)
+    client.channel = FakeChannel()
+    client.callback_queue = "amq.gen-reply"
+    return client
+
+
+def test_call_returns_the_reply_and_streams_progress():
+    c = client([("progress", {"check": "check_eye"}), (None, {"ok": True})])
+    events = []
+    assert c.call({"image": "a"}, {"request_id": "r1"}, on_progress=events.append) == {"ok": True}
+    assert events == [{"check": "check_eye"}]
+    [(queue, props, body)] = c.channel.published
+    assert queue == "face"
+    assert props.reply_to == "amq.gen-reply"
+    assert props.headers == {"request_id": "r1", "progress": True}
+    assert decode(body, props.content_type) == {"image": "a"}
+
+
+def test_replies_to_an_earlier_request_are_ignored():
+    c = client()
+    c.corr_id = "current"
+    props = SimpleNamespace(correlation_id="stale", type=None, content_type="application/json")
+    c.on_response(None, None, props, encode({"ok": False}, "application/json"))
+    assert c.response is None
+
+
+def test_cancelled_wait_raises_and_marks_the_request():
+    c = client()
+    cancel = threading.Event()
+    c.connection.process_data_events = lambda time_limit=0: cancel.set()
+    with pytest.raises(VerificationCancelled):
+        c.call({"image": "a"}, {"request_id": "r1"}, cancel=cancel)
+    assert c.channel.published[0][1].headers["cancellable"] is True
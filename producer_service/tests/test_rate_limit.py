@@ -0,0 +1,130 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import rate_limit
+from rate_limit import MemoryBackend, build_rate_limiter
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_then_refill(clock):
+    backend = MemoryBackend()
+    assert all(backend.take("a", rate=2, burst=3).allowed for _ in range(3))
+    denied = backend.take("a", rate=2, burst=3)
+    assert not denied.allowed
+    assert denied.retry_after == pytest.approx(0.5)
+    # Other clients have their own bucket
+    assert backend.take("b", rate=2, burst=3).allowed
+    clock.now += 0.5
+    assert backend.take("a", rate=2, burst=3).allowed
+
+
+def test_cost_above_the_burst_is_never_allowed(clock):
+    backend = MemoryBackend()
+    clock.now += 3600
+    assert not backend.take("a", rate=1, burst=5, cost=6).allowed
+
+
+def test_full_buckets_are_pruned_at_the_key_limit(clock):
+    backend = MemoryBackend(max_keys=2)
+    backend.take("a", rate=1, burst=2)
+    clock.now += 10
+    backend.take("b", rate=1, burst=2)
+    backend.take("c", rate=1, burst=2)
+    assert set(backend.buckets) == {"b", "c"}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The producer app; uploads land in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    import main
+    return main, TestClient(main.app)
+
+
+def limit(api, monkeypatch, **env):
+    main, client = api
+    monkeypatch.setattr(main, "rate_limiter", build_rate_limiter({"RATE_LIMIT_ENABLED": "true", **env}))
+    return client
+
+
+# Admitted uploads stop at validation (400): no broker is needed to see the limiter's verdict
+NOT_AN_IMAGE = ("notes.txt", b"hello", "text/plain")
+
+
+def test_shipped_defaults_admit_every_request(api):
+    _, client = api
+    statuses = {client.post("/api/v1/face/verification", files={"file": NOT_AN_IMAGE}).status_code for _ in range(30)}
+    assert statuses == {400}
+
+
+def test_requests_over_the_burst_get_429_with_retry_after(api, monkeypatch):
+    client = limit(api, monkeypatch, RATE_LIMIT_RATE="0.5", RATE_LIMIT_BURST="2")
+    assert [client.post("/api/v1/face/verification", files={"file": NOT_AN_IMAGE}).status_code
+            for _ in range(3)] == [400, 400, 429]
+    response = client.post("/api/v1/face/verification", files={"file": NOT_AN_IMAGE})
+    assert response.json()["error"] == "Rate limit exceeded"
+    assert response.headers["Retry-After"] == "2"
+
+
+def test_each_api_key_has_its_own_bucket(api, monkeypatch):
+    client = limit(api, monkeypatch, RATE_LIMIT_RATE="0.01", RATE_LIMIT_BURST="1")
+    post = lambda key: client.post("/api/v1/face/verification", files={"file": NOT_AN_IMAGE},
+                                   headers={"X-API-Key": key}).status_code
+    assert [post("a"), post("a"), post("b")] == [400, 429, 400]
+
+
+def test_forwarded_address_is_only_trusted_when_configured(api, monkeypatch):
+    client = limit(api, monkeypatch, RATE_LIMIT_RATE="0.01", RATE_LIMIT_BURST="1")
+    post = lambda address: client.post("/api/v1/face/verification", files={"file": NOT_AN_IMAGE},
+                                       headers={"X-Forwarded-For": address}).status_code
+    # Forged headers do not buy a fresh bucket
+    assert [post("1.2.3.4"), post("5.6.7.8")] == [400, 429]
+
+    client = limit(api, monkeypatch, RATE_LIMIT_RATE="0.01", RATE_LIMIT_BURST="1", RATE_LIMIT_TRUST_FORWARDED="true")
+    assert [post("1.2.3.4, 10.0.0.1"), post("5.6.7.8"), post("1.2.3.4")] == [400, 400, 429]
+
+
+def test_a_batch_costs_one_token_per_file(api, monkeypatch):
+    client = limit(api, monkeypatch, RATE_LIMIT_RATE="0.01", RATE_LIMIT_BURST="3")
+    files = [("files", NOT_AN_IMAGE)] * 4
+    response = client.post("/api/v1/face/verification/batch", files=files)
+    assert response.status_code == 429
+    assert response.json()["error"] == "Request needs 4 tokens, more than the burst of 3"
+    assert client.post("/api/v1/face/verification/batch", files=files[:3]).status_code == 200
+    assert client.post("/api/v1/face/verification", files={"file": NOT_AN_IMAGE}).status_code == 429
+
+
+def test_backend_errors_admit_the_request(api, monkeypatch):
+    class Broken:
+        blocking = False
+
+        def take(self, *args):
+            raise ConnectionError("store down")
+
+    client = limit(api, monkeypatch, RATE_LIMIT_BURST="1")
+    api[0].rate_limiter.backend = Broken()
+    assert [client.post("/api/v1/face/verification", files={"file": NOT_AN_IMAGE}).status_code
+            for _ in range(3)] == [400, 400, 400]
+
+
+def test_client_keys_never_hold_the_api_key():
+    limiter = build_rate_limiter({})
+    request = Request({"type": "http", "method": "POST", "path": "/", "client": ("10.0.0.1", 50000),
+                       "headers": [(b"x-api-key", b"secret")]})
+    key = limiter.client_key(request)
+    assert key.startswith("key:") and "secret" not in key
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from renditions import RenditionCache, RenditionError, RenditionStaticFiles
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    directory = tmp_path / "uploads"
+    directory.mkdir()
+    Image.new("RGB", (800, 600), (10, 120, 200)).save(directory / "face.png")
+    return directory
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RenditionCache(str(tmp_path / "renditions"), widths=[128, 512], formats=["webp", "jpeg", "gif"])
+
+
+def test_only_configured_widths_and_formats(cache):
+    assert cache.formats == ["webp", "jpeg"]
+    assert cache.validate(128, "WEBP") == (128, "webp")
+    with pytest.raises(RenditionError):
+        cache.validate(300, None)
+    with pytest.raises(RenditionError):
+        cache.validate(None, "gif")
+
+
+def test_query_string(cache):
+    assert cache.query(None, None) == ""
+    assert cache.query(128, "webp") == "?w=128&format=webp"
+
+
+def test_rendition_is_resized_and_reused(cache, uploads):
+    source = str(uploads / "face.png")
+    path = cache.get(source, "face.png", 128, "jpeg")
+    with Image.open(path) as image:
+        assert (image.format, image.size) == ("JPEG", (128, 96))
+    mtime = os.stat(path).st_mtime_ns
+    assert cache.get(source, "face.png", 128, "jpeg") == path
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_stale_rendition_is_regenerated(cache, uploads):
+    source = str(uploads / "face.png")
+    path = cache.get(source, "face.png", 128, None)
+    os.utime(path, ns=(0, 0))
+    cache.get(source, "face.png", 128, None)
+    assert os.stat(path).st_mtime_ns > 0
+
+
+def test_never_upscaled(cache, uploads):
+    Image.new("RGB", (64, 64)).save(uploads / "small.png")
+    path = cache.get(str(uploads / "small.png"), "small.png", 512, None)
+    with Image.open(path) as image:
+        assert image.size == (64, 64)
+
+
+def test_etag_follows_content(cache, uploads):
+    path = cache.get(str(uploads / "face.png"), "face.png", 128, "webp")
+    etag = cache.etag(path, os.stat(path))
+    assert etag == cache.etag(path, os.stat(path))
+    assert etag.startswith('"') and len(etag) == 34
+
+
+@pytest.fixture
+def client(cache, uploads):
+    app = FastAPI()
+    app.mount("/uploads", RenditionStaticFiles(directory=str(uploads), renditions=cache))
+    return TestClient(app)
+
+
+def test_rendition_served_with_immutable_caching(client):
+    response = client.get("/uploads/face.png?w=128&format=webp")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "immutable" in response.headers["cache-control"]
+
+    revalidated = client.get("/uploads/face.png?w=128&format=webp",
+                             headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_original_served_without_query(client):
+    response = client.get("/uploads/face.png")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+
+
+@pytest.mark.parametrize("url, status", [
+    ("/uploads/face.png?w=300", 400),
+    ("/uploads/face.png?w=abc", 400),
+    ("/uploads/missing.png?w=128", 404),
+])
+def test_bad_rendition_requests(client, url, status):
+    assert client.get(url).status_code == status
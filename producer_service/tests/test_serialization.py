@@ -0,0 +1,20 @@
+import pytest
+
+from utils.serialization import (
+    CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK, decode, encode, supported_content_types
+)
+
+
+def test_requests_are_sent_as_msgpack_when_installed():
+    assert supported_content_types()[0] == CONTENT_TYPE_MSGPACK
+
+
+@pytest.mark.parametrize("content_type", [CONTENT_TYPE_MSGPACK, CONTENT_TYPE_JSON])
+def test_encode_decode_round_trip(content_type):
+    payload = {"image_path": "/uploads/a.jpg", "request_id": "a", "progress": True}
+    assert decode(encode(payload, content_type), content_type) == payload
+
+
+def test_reply_without_content_type_is_json():
+    # Consumers that predate negotiation reply with plain JSON and no header
+    assert decode(b'{"OK": true}', None) == {"OK": True}
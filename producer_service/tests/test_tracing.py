@@ -0,0 +1,16 @@
+from utils.tracing import Tracer, parse_traceparent
+
+
+def test_request_trace_propagates_its_current_span():
+    trace = Tracer("producer", sample_rate=1.0).start_trace("POST /verification")
+    with trace.span("rpc") as rpc:
+        trace_id, parent_id, sampled = parse_traceparent(trace.traceparent())
+    assert (trace_id, parent_id, sampled) == (trace.trace_id, rpc.span_id, True)
+
+
+def test_incoming_traceparent_is_continued():
+    incoming = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00"
+    trace = Tracer("producer", sample_rate=1.0).start_trace("POST /verification", traceparent=incoming)
+    assert trace.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert trace.root.parent_id == "00f067aa0ba902b7"
+    assert not trace.sampled  # the caller's decision wins over sample_rate
@@ -0,0 +1,121 @@
+import struct
+from dataclasses import dataclass
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+# JPEG start-of-frame markers carrying the image dimensions (DHT/JPG/DAC excluded)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+
+
+class ImageHeaderError(ValueError):
+    """The bytes are not a complete PNG/JPEG image"""
+
+
+@dataclass
+class ImageHeader:
+    format: str
+    width: int
+    height: int
+    orientation: int = 1
+
+    @property
+    def display_size(self):
+        """(width, height) after applying the EXIF orientation"""
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+
+def read_image_header(data: bytes) -> ImageHeader:
+    """
+    Parse format, dimensions and EXIF orientation from the header of a PNG or
+    JPEG file without decoding any pixels. Also checks that the file is not
+    truncated: a PNG must reach IEND, and a JPEG must reach its scan with an
+    EOI marker after it. Bytes after the end of the image (camera trailers,
+    appended thumbnails, MPF data) are allowed.
+    Raises ImageHeaderError when the bytes are not a usable image.
+    """
+    if data.startswith(PNG_SIGNATURE):
+        return _read_png(data)
+    if data.startswith(b"\xff\xd8"):
+        return _read_jpeg(data)
+    raise ImageHeaderError("Unrecognized image format")
+
+
+def _read_png(data: bytes) -> ImageHeader:
+    if len(data) < 33 or data[12:16] != b"IHDR":
+        raise ImageHeaderError("Corrupt PNG header")
+    width, height = struct.unpack(">II", data[16:24])
+
+    # Walk the chunk headers: every length must fit and the last chunk must be IEND
+    offset = 8
+    while True:
+        if offset + 8 > len(data):
+            raise ImageHeaderError("Truncated PNG file")
+        length, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        offset += 12 + length
+        if chunk_type == b"IEND":
+            break
+    if offset > len(data) or not data[:offset].endswith(PNG_IEND):
+        raise ImageHeaderError("Truncated PNG file")
+
+    return ImageHeader("png", width, height)
+
+
+def _read_jpeg(data: bytes) -> ImageHeader:
+    width = height = None
+    scan = None
+    orientation = 1
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            raise ImageHeaderError("Corrupt JPEG marker")
+        marker = data[offset + 1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            offset += 2
+            continue
+
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        segment = data[offset + 4:offset + 2 + length]
+        if length < 2 or len(segment) != length - 2:
+            raise ImageHeaderError("Truncated JPEG segment")
+
+        if marker == 0xE1 and segment.startswith(b"Exif\x00\x00"):
+            orientation = _exif_orientation(segment[6:])
+        elif marker in JPEG_SOF_MARKERS:
+            if len(segment) < 5:
+                raise ImageHeaderError("Corrupt JPEG frame header")
+            height, width = struct.unpack(">HH", segment[1:5])
+        elif marker == 0xDA:  # start of scan: entropy-coded data follows
+            scan = offset + 2 + length
+            break
+        offset += 2 + length
+
+    if width is None:
+        raise ImageHeaderError("JPEG frame header not found")
+    # Only an EOI after the scan counts: an embedded EXIF thumbnail has its own
+    if scan is None or data.find(b"\xff\xd9", scan) < 0:
+        raise ImageHeaderError("Truncated JPEG file")
+    return ImageHeader("jpeg", width, height, orientation)
+
+
+def _exif_orientation(tiff: bytes) -> int:
+    """Orientation tag (0x0112) from the first IFD of an EXIF TIFF block, 1 if absent"""
+    try:
+        endian = {b"II": "<", b"MM": ">"}[tiff[:2]]
+        ifd_offset = struct.unpack(endian + "I", tiff[4:8])[0]
+        entries = struct.unpack(endian + "H", tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(entries):
+            entry = ifd_offset + 2 + i * 12
+            tag, _, _, value = struct.unpack(endian + "HHIH", tiff[entry:entry + 10])
+            if tag == 0x0112:
+                return value if 1 <= value <= 8 else 1
+    except (KeyError, struct.error):
+        pass
+    return 1
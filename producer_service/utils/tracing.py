@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import queue
+import random
+import atexit
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+# Span currently open in this thread/context, as (trace, span_id)
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+def parse_traceparent(value: Optional[str]):
+    """
+    W3C traceparent ("00-<trace_id>-<parent_span_id>-<flags>").
+    Returns (trace_id, parent_span_id, sampled) or None when missing/invalid.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start", "end", "attributes", "error")
+
+    def __init__(self, name, parent_id=None, start=None, attributes=None):
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def to_otlp(self, trace_id):
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(self.start * 1e9)),
+            "endTimeUnixNano": str(int((self.end or self.start) * 1e9)),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Trace:
+    """
+    Spans of one request inside this process. The root span is a child of the
+    remote parent from the incoming traceparent, if any; spans opened with
+    `span()` nest under whatever span is open in the calling context and fall
+    back to the root (e.g. on other threads).
+    """
+
+    def __init__(self, tracer, name, trace_id=None, parent_id=None, sampled=False, start=None, attributes=None):
+        self.tracer = tracer
+        self.trace_id = trace_id or _new_id(16)
+        self.sampled = sampled
+        self.root = Span(name, parent_id=parent_id, start=start, attributes=attributes)
+        self.spans = [self.root]
+        self.lock = threading.Lock()
+        self.finished = False
+
+    def _parent_id(self):
+        current = _current.get()
+        if current is not None and current[0] is self:
+            return current[1]
+        return self.root.span_id
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self.add_span(name, attributes=attributes)
+        token = _current.set((self, span.span_id))
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            _current.reset(token)
+            span.end = time.time()
+
+    def add_span(self, name, start=None, end=None, parent_id=None, attributes=None):
+        """Record a span, closed if `end` is given (for stages timed elsewhere)"""
+        span = Span(name, parent_id=parent_id or self._parent_id(), start=start, attributes=attributes)
+        span.end = end
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def traceparent(self, span: Optional[Span] = None) -> str:
+        """Header value making `span` (default: the current one) the parent of the next hop"""
+        span_id = span.span_id if span is not None else self._parent_id()
+        return format_traceparent(self.trace_id, span_id, self.sampled)
+
+    def finish(self, error=None, **attributes):
+        if self.finished:
+            return
+        self.finished = True
+        self.root.end = time.time()
+        self.root.attributes.update(attributes)
+        if error:
+            self.root.error = str(error)
+        self.tracer.submit(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.root.end or time.time()) - self.root.start) * 1000
+
+
+def stage(trace: Optional[Trace], name, **attributes):
+    """`trace.span(...)`, or a no-op context when the request is not traced"""
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, **attributes)
+
+
+class FileExporter:
+    """Appends one OTLP/JSON document per trace to a JSON-lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, payload):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(payload) + "\n")
+
+
+class OtlpHttpExporter:
+    """POSTs OTLP/JSON to a collector's /v1/traces endpoint"""
+
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint.rstrip("/")
+        if not self.endpoint.endswith("/v1/traces"):
+            self.endpoint += "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, payload):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    """
+    Creates traces and exports the ones worth keeping from a background thread.
+
+    A trace is kept when the caller upstream sampled it (traceparent flag), when
+    it failed, or when its local root span took at least `slow_threshold_ms`,
+    so slow requests are always captured regardless of `sample_rate`.
+    """
+
+    def __init__(self, service_name, exporter=None, sample_rate=0.0, slow_threshold_ms=None):
+        self.service_name = service_name
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+        self.pending = queue.Queue(maxsize=10000)
+        self.worker = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def start_trace(self, name, traceparent=None, start=None, **attributes) -> Trace:
+        remote = parse_traceparent(traceparent)
+        if remote is None:
+            return Trace(self, name, sampled=random.random() < self.sample_rate, start=start, attributes=attributes)
+        trace_id, parent_id, sampled = remote
+        return Trace(self, name, trace_id=trace_id, parent_id=parent_id, sampled=sampled, start=start, attributes=attributes)
+
+    def keep(self, trace: Trace) -> bool:
+        if trace.sampled or trace.root.error:
+            return True
+        return self.slow_threshold_ms is not None and trace.duration_ms >= self.slow_threshold_ms
+
+    def submit(self, trace: Trace):
+        if not self.enabled or not self.keep(trace):
+            return
+        self._ensure_worker()
+        try:
+            self.pending.put_nowait(trace)
+        except queue.Full:
+            pass  # never let tracing back-pressure the request path
+
+    def _ensure_worker(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            trace = self.pending.get()
+            try:
+                self.exporter.export(self.to_otlp(trace))
+            except Exception as e:
+                print(f"Trace export failed: {e}")
+            finally:
+                self.pending.task_done()
+
+    def flush(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.pending.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def to_otlp(self, trace: Trace) -> dict:
+        with trace.lock:
+            spans = [span.to_otlp(trace.trace_id) for span in trace.spans]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "face-verification"}, "spans": spans}],
+            }]
+        }
+
+
+def build_tracer(service_name: str) -> Tracer:
+    """Tracer configured from TRACING_* environment variables; exports nothing when disabled"""
+    exporter = None
+    if os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes"):
+        kind = os.getenv("TRACING_EXPORTER", "file")
+        if kind == "otlp":
+            exporter = OtlpHttpExporter(os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318"))
+        else:
+            exporter = FileExporter(os.getenv("TRACING_FILE", "traces/traces.jsonl"))
+        print(f"Exporting traces of {service_name} ({kind})")
+    slow_threshold_ms = os.getenv("TRACING_SLOW_MS")
+    return Tracer(
+        service_name,
+        exporter=exporter,
+        sample_rate=float(os.getenv("TRACING_SAMPLE_RATE", "0")),
+        slow_threshold_ms=float(slow_threshold_ms) if slow_threshold_ms else None,
+    )
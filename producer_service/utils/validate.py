@@ -2,6 +2,12 @@ from fastapi.responses import JSONResponse
 from typing import Union
 import os
 
+from utils.image_header import ImageHeader, ImageHeaderError, read_image_header
+
+MIN_IMAGE_DIMENSION = int(os.getenv("MIN_IMAGE_DIMENSION", "64"))
+MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "8192"))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))
+
 async def validate_file_extension(filename: str) -> Union[JSONResponse, None]:
     """Validate file extension."""
     if filename.split('.')[-1].lower() not in ['jpg', 'jpeg', 'png']:
@@ -20,6 +26,28 @@ async def validate_file_size(contents: bytes) -> Union[JSONResponse, None]:
         }, status_code=400)
     return None
 
+async def validate_image_header(contents: bytes) -> Union[JSONResponse, ImageHeader]:
+    """Validate the image header (format, completeness, dimensions) without decoding pixels."""
+    try:
+        header = read_image_header(contents)
+    except ImageHeaderError as e:
+        return JSONResponse(content={
+            'status': 'error',
+            'message': f"Invalid image file: {e}"
+        }, status_code=400)
+
+    if min(header.width, header.height) < MIN_IMAGE_DIMENSION:
+        return JSONResponse(content={
+            'status': 'error',
+            'message': f"Image too small. Minimum dimension is {MIN_IMAGE_DIMENSION}px"
+        }, status_code=400)
+    if max(header.width, header.height) > MAX_IMAGE_DIMENSION or header.width * header.height > MAX_IMAGE_PIXELS:
+        return JSONResponse(content={
+            'status': 'error',
+            'message': f"Image too large. Maximum dimension is {MAX_IMAGE_DIMENSION}px"
+        }, status_code=400)
+    return header
+
 async def save_image(UPLOAD_DIR: str, contents: bytes, user_id: str, file_name: str) -> None:
     """Save image to disk."""
     image_path = UPLOAD_DIR / user_id / file_name